@@ -0,0 +1,117 @@
+"""
+Chain validation benchmark: the original list-based validate_log_chain
+against the streaming scan and the parallel segment scan.
+
+    python benchmarks/chain_validate.py --rows 1000000 10000000 --workers 4
+
+Each row count gets its own SQLite file under --dir (reused across runs
+when the row count matches), filled with a valid chain of narrow records.
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _db_path(directory: str, rows: int) -> str:
+    return os.path.join(directory, f"chain_bench_{rows}.db")
+
+
+def _fill(engine, rows: int, batch: int = 50_000):
+    from sqlalchemy import func, insert
+    from sqlalchemy.orm import Session
+    from models.tables import Base, AuditLog
+    from crypto.validate_chain import GENESIS_HASH, ChainRow, _chain_hash
+
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        existing = db.query(func.count(AuditLog.id)).scalar()
+    if existing == rows:
+        return
+    if existing:
+        raise SystemExit(f"{engine.url} holds {existing} rows, expected {rows}; delete it first")
+
+    base = datetime.datetime(2024, 1, 1)
+    prev_hash = GENESIS_HASH
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for lo in range(1, rows + 1, batch):
+            values = []
+            for log_id in range(lo, min(lo + batch, rows + 1)):
+                row = ChainRow(
+                    log_id, f"doc{log_id % 50}", f"p{log_id % 5000}", "CREATE",
+                    base + datetime.timedelta(seconds=log_id), prev_hash,
+                )
+                values.append(row._asdict())
+                prev_hash = _chain_hash(row)
+            conn.execute(insert(AuditLog), values)
+    print(f"  filled {rows:,} rows in {time.perf_counter() - started:.1f}s")
+
+
+def _timed(label: str, fn):
+    started = time.perf_counter()
+    valid, count = fn()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<24} {elapsed:8.2f}s  {count / elapsed:>12,.0f} rows/s  valid={valid}")
+    return elapsed
+
+
+def run(rows: int, workers: int, directory: str, legacy: bool):
+    os.environ["DATABASE_URL"] = f"sqlite:///{_db_path(directory, rows)}"
+    # db.session reads DATABASE_URL at import, so each row count runs in a
+    # fresh interpreter (see main)
+    from sqlalchemy.orm import Session
+    from db.session import engine
+    from models.tables import AuditLog
+    from crypto import parallel_chain
+    from crypto.validate_chain import validate_log_chain
+
+    print(f"{rows:,} rows")
+    _fill(engine, rows)
+
+    with Session(engine) as db:
+        if legacy:
+            def list_based():
+                valid, _ = validate_log_chain(db.query(AuditLog).all())
+                return valid, rows
+            _timed("validate_log_chain", list_based)
+            db.expunge_all()
+
+        def streaming():
+            scan = parallel_chain.scan_chain(db, workers=1)
+            return scan.is_valid, scan.count
+        base = _timed("streaming scan", streaming)
+
+        def parallel():
+            scan = parallel_chain.scan_chain(db, workers=workers)
+            return scan.is_valid, scan.count
+        par = _timed(f"parallel x{workers}", parallel)
+        print(f"  speedup over streaming: {base / par:.2f}x")
+    parallel_chain.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--dir", default=os.getenv("TMPDIR", "/tmp"))
+    parser.add_argument("--skip-legacy", action="store_true",
+                        help="skip validate_log_chain, which loads every row as an ORM object")
+    args = parser.parse_args()
+
+    if len(args.rows) == 1:
+        run(args.rows[0], args.workers, args.dir, not args.skip_legacy)
+        return
+    import subprocess
+    for rows in args.rows:
+        cmd = [sys.executable, __file__, "--rows", str(rows), "--workers", str(args.workers), "--dir", args.dir]
+        if args.skip_legacy:
+            cmd.append("--skip-legacy")
+        subprocess.run(cmd, check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Minimal OpenAI-compatible chat completions server for exercising /chat and
+/chat/stream without calling the real API.
+
+    FAKE_OPENAI_TTFT=0.5 FAKE_OPENAI_TOKEN_DELAY=0.02 \\
+        uvicorn benchmarks.fake_openai:app --port 8765
+    OPENAI_API_KEY=fake OPENAI_BASE_URL=http://127.0.0.1:8765/v1 uvicorn main:app
+
+FAKE_OPENAI_TTFT delays the first token, FAKE_OPENAI_TOKEN_DELAY spaces the
+rest, FAKE_OPENAI_FAIL=1 answers every request with a 500.
+"""
+import asyncio
+import json
+import os
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="Fake OpenAI")
+
+ANSWER = "Here is a summary of the records you asked about. Everything looks consistent."
+
+
+def _settings():
+    return (
+        float(os.getenv("FAKE_OPENAI_TTFT", "0.05")),
+        float(os.getenv("FAKE_OPENAI_TOKEN_DELAY", "0.005")),
+        os.getenv("FAKE_OPENAI_FAIL") == "1",
+    )
+
+
+def _chunk(model, content=None, finish=None):
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "delta": {"content": content} if content is not None else {},
+            "finish_reason": finish,
+        }],
+    }
+
+
+@app.post("/v1/chat/completions")
+async def completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "fake")
+    ttft, token_delay, fail = _settings()
+    if fail:
+        return JSONResponse({"error": {"message": "fake failure", "type": "server_error"}}, status_code=500)
+
+    if not body.get("stream"):
+        await asyncio.sleep(ttft)
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": ANSWER}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    async def events():
+        await asyncio.sleep(ttft)
+        for i, word in enumerate(ANSWER.split(" ")):
+            if i:
+                await asyncio.sleep(token_delay)
+            yield f"data: {json.dumps(_chunk(model, word if i == 0 else ' ' + word))}\n\n"
+        yield f"data: {json.dumps(_chunk(model, finish='stop'))}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
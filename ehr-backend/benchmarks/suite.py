@@ -0,0 +1,513 @@
+"""
+Benchmark suite for the audit backend hot paths.
+
+    python benchmarks/suite.py run --out results.json
+    python benchmarks/suite.py run --only chain,crypto --rows 10000 100000 1000000
+    python benchmarks/suite.py run --only decrypt --decrypt-workers 1 2 4 8 16
+    python benchmarks/suite.py run --only listing --listing-rows 100000
+    python benchmarks/suite.py compare baseline.json results.json --threshold 0.15
+
+`run` works offline against a throwaway SQLite file by default. Pass
+--database-url to use a local Postgres instead: the database must hold no
+audit logs, and everything the suite writes is removed afterwards.
+
+`compare` matches benchmarks by name and flags any whose p50 grew by more
+than --threshold (exit code 1 when something regressed).
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+GROUPS = ("crypto", "chain", "decrypt", "api", "chat", "auth", "listing")
+BENCH_PREFIX = "bench-"
+DOCTORS = [f"{BENCH_PREFIX}doc{i}" for i in range(5)]
+
+
+# ─── Timing ──────────────────────────────────────────────────────────────────
+
+def _percentile(ordered, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(times, ops_per_call: int = 1) -> dict:
+    """Per-call latency stats in seconds; ops_per_sec counts inner operations."""
+    ordered = sorted(times)
+    total = sum(ordered)
+    return {
+        "n": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": statistics.median(ordered),
+        "p95": _percentile(ordered, 0.95),
+        "p99": _percentile(ordered, 0.99),
+        "min": ordered[0],
+        "max": ordered[-1],
+        "ops_per_sec": (len(ordered) * ops_per_call / total) if total else None,
+    }
+
+
+def measure(fn, n: int, warmup: int = 1, ops_per_call: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(n):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return summarize(times, ops_per_call)
+
+
+def _ok(resp):
+    """A failing endpoint would otherwise show up as a very fast benchmark."""
+    if resp.status_code >= 400:
+        raise SystemExit(f"{resp.request.method} {resp.request.url.path} -> {resp.status_code}: {resp.text[:200]}")
+    return resp
+
+
+def _entry(i: int, doctor: str = None) -> dict:
+    return {
+        "user_id": doctor or DOCTORS[i % len(DOCTORS)],
+        "patient_id": f"{BENCH_PREFIX}p{i % 200}",
+        "patient_name": f"Patient {i % 200}",
+        "action": "CREATE",
+        "data": f"benchmark record {i}",
+        "age": 30 + i % 50,
+        "gender": "F" if i % 2 else "M",
+        "diagnosis": ("Flu", "Asthma", "Migraine", "Hypertension")[i % 4],
+        "medication": ("Tamiflu", "Albuterol", "Sumatriptan", "Lisinopril")[i % 4],
+        "notes": "Routine follow-up; patient stable.",
+    }
+
+
+# ─── Benchmarks ──────────────────────────────────────────────────────────────
+
+def bench_crypto(ctx, results):
+    from crypto import secure_log
+    from crypto.decrypt_log import decrypt_log
+
+    entry = _entry(0)
+    for label, envelope in (("envelope", True), ("rsa", False)):
+        secure_log.ENVELOPE_ENCRYPTION = envelope
+        results[f"crypto.encrypt_log.{label}"] = measure(lambda: secure_log.encrypt_log(entry), ctx.n(300))
+        blob = secure_log.encrypt_log(entry)
+        results[f"crypto.decrypt_log.{label}"] = measure(
+            lambda: decrypt_log(
+                blob["encrypted_data"], blob["encrypted_aes_key"], blob["nonce"], blob["tag"],
+                entry["user_id"], blob["enc_version"], blob["data_key_id"],
+            ),
+            ctx.n(300),
+        )
+    secure_log.ENVELOPE_ENCRYPTION = True
+
+
+def _chain_rows(count: int):
+    from crypto.validate_chain import GENESIS_HASH, ChainRow, _chain_hash
+
+    base = datetime.datetime(2024, 1, 1)
+    rows, prev = [], GENESIS_HASH
+    for log_id in range(1, count + 1):
+        row = ChainRow(log_id, "doc", f"p{log_id % 500}", "CREATE", base + datetime.timedelta(seconds=log_id), prev)
+        rows.append(row)
+        prev = _chain_hash(row)
+    return rows
+
+
+def bench_chain(ctx, results):
+    from crypto.validate_chain import _chain_hash, validate_log_chain
+
+    sample = _chain_rows(10_000)
+    results["chain.chain_hash"] = measure(
+        lambda: [_chain_hash(r) for r in sample], ctx.n(10), ops_per_call=len(sample)
+    )
+    for count in ctx.rows:
+        rows = sample if count == len(sample) else _chain_rows(count)
+        results[f"chain.validate_log_chain.{count}"] = measure(
+            lambda: validate_log_chain(rows), 3 if count <= 100_000 else 1, warmup=0, ops_per_call=count
+        )
+        del rows
+
+
+def _encrypted_rows(count: int, envelope: bool):
+    """AuditLog-shaped rows for crypto.bulk_decrypt, spread over the bench doctors."""
+    from types import SimpleNamespace
+    from crypto import secure_log
+
+    secure_log.ENVELOPE_ENCRYPTION = envelope
+    rows = []
+    try:
+        for i in range(count):
+            entry = _entry(i)
+            blob = secure_log.encrypt_log(entry)
+            rows.append(SimpleNamespace(
+                id=i + 1, user_id=entry["user_id"], enc_version=blob.get("enc_version"),
+                data_key_id=blob.get("data_key_id"), encrypted_aes_key=blob["encrypted_aes_key"],
+                nonce=blob["nonce"], tag=blob["tag"], encrypted_data=blob["encrypted_data"],
+            ))
+    finally:
+        secure_log.ENVELOPE_ENCRYPTION = True
+    return rows
+
+
+def bench_decrypt(ctx, results):
+    """
+    Decrypt-pool scaling: the same rows through decrypt_logs with
+    DECRYPT_WORKERS = each of --decrypt-workers (1 decrypts inline, as the
+    API does). ops_per_sec is rows/s; speedup is relative to the first
+    worker count.
+    """
+    from crypto import bulk_decrypt
+
+    saved = bulk_decrypt.DECRYPT_WORKERS
+    # RSA rows pay a private-key operation each, envelope rows only AES
+    for label, envelope, count in (("envelope", True, ctx.n(20_000)), ("rsa", False, ctx.n(2_000))):
+        rows = _encrypted_rows(count, envelope)
+        base = None
+        for workers in ctx.decrypt_workers:
+            bulk_decrypt.shutdown()
+            bulk_decrypt.DECRYPT_WORKERS = workers
+            try:
+                # warmup starts the pool's processes outside the timing
+                stats = measure(lambda: bulk_decrypt.decrypt_logs(rows), 3, ops_per_call=len(rows))
+            finally:
+                bulk_decrypt.shutdown()
+            base = base or stats["ops_per_sec"]
+            stats.update(workers=workers, rows=len(rows), speedup=stats["ops_per_sec"] / base)
+            results[f"decrypt.bulk.{label}.workers{workers}"] = stats
+            print(
+                f"[bench] decrypt {label:<8} workers={workers:<3} "
+                f"{stats['ops_per_sec']:>10.0f} rows/s  {stats['speedup']:.2f}x",
+                file=sys.stderr,
+            )
+    bulk_decrypt.DECRYPT_WORKERS = saved
+
+
+def bench_api(ctx, results):
+    c = ctx.client
+    results["api.add_log"] = measure(lambda: _ok(c.post("/api/audit/add-log", json=_entry(ctx.next_id()))), ctx.n(200))
+
+    doctor, patient = DOCTORS[0], f"{BENCH_PREFIX}p1"
+    views = {
+        "doctor": {"role": "doctor", "user_id": doctor},
+        "patient": {"role": "patient", "user_id": patient},
+        "auditor": {"role": "auditor"},
+    }
+    for role, params in views.items():
+        results[f"api.get_logs.{role}.page100"] = measure(
+            lambda: _ok(c.get("/api/audit/logs", params={**params, "limit": 100})), ctx.n(50)
+        )
+        results[f"api.get_logs.{role}.all"] = measure(
+            lambda: _ok(c.get("/api/audit/logs", params=params)), ctx.n(10)
+        )
+
+    results["api.validate.full"] = measure(lambda: _ok(c.get("/api/audit/validate", params={"full": True})), ctx.n(5))
+    results["api.rechain"] = measure(lambda: _ok(c.post("/api/audit/rechain")), ctx.n(5))
+
+
+def bench_chat(ctx, results):
+    from routers import audit
+    from utils import answer_cache
+
+    saved = audit.client, audit.aclient
+    audit.client = audit.aclient = None   # keyword fallback only — never the network
+    body = {"user_id": DOCTORS[0], "role": "doctor", "question": "Summarize recent visits", "limit": 20}
+    try:
+        def uncached():
+            answer_cache.clear()
+            _ok(ctx.client.post("/api/audit/chat", json=body))
+        results["chat.keyword_fallback"] = measure(uncached, ctx.n(100))
+        results["chat.keyword_fallback.cached"] = measure(
+            lambda: _ok(ctx.client.post("/api/audit/chat", json=body)), ctx.n(100)
+        )
+    finally:
+        audit.client, audit.aclient = saved
+
+
+def bench_auth(ctx, results):
+    from crypto.generate_keys import generate_keys
+    from utils.crypto import hash_password, verify_password
+
+    counter = iter(range(10 ** 6))
+    # The key pool isn't started here, so this is the synchronous keygen path
+    results["auth.generate_keys"] = measure(lambda: generate_keys(f"{BENCH_PREFIX}gen{next(counter)}"), ctx.n(5))
+    results["auth.bcrypt.hash"] = measure(lambda: hash_password("correct horse battery"), ctx.n(10))
+    hashed = hash_password("correct horse battery")
+    results["auth.bcrypt.verify"] = measure(lambda: verify_password("correct horse battery", hashed), ctx.n(10))
+
+
+def _value_bytes(value) -> int:
+    """Rough wire size of one fetched column value."""
+    if value is None:
+        return 0
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode())
+    return 8   # integers and timestamps
+
+
+def bench_listing(ctx, results):
+    """
+    GET /logs?role=auditor over --listing-rows records. Besides the route
+    itself, its handler path (LIST_COLUMNS projection, orjson) is timed in
+    process against loading full entities, payload columns included, and
+    serializing through jsonable_encoder + json — what /logs did before.
+    bytes_per_row is the size of the column values fetched from the DB.
+    """
+    from fastapi.encoders import jsonable_encoder
+    from sqlalchemy import func
+    from sqlalchemy.orm import undefer_group
+    from models.database import SessionLocal
+    from models.tables import AuditLog
+    from routers.audit import _log_to_dict, _project, _scoped_logs_query
+    from utils.fast_json import dumps
+
+    with SessionLocal() as db:
+        have = db.query(func.count(AuditLog.id)).scalar()
+    _seed(ctx.client, max(0, ctx.listing_rows - have), start=have)
+    columns = list(AuditLog.__table__.columns.keys())
+
+    def projected():
+        with SessionLocal() as db:
+            rows = _project(_scoped_logs_query(db, "auditor", None, None, None)).all()
+            dumps({"logs": [_log_to_dict(r) for r in rows], "next_cursor": None})
+            return [tuple(r) for r in rows]
+
+    def full_entities():
+        with SessionLocal() as db:
+            logs = _scoped_logs_query(db, "auditor", None, None, None).options(undefer_group("payload")).all()
+            json.dumps(jsonable_encoder({"logs": [_log_to_dict(log) for log in logs], "next_cursor": None}))
+            return [tuple(getattr(log, c) for c in columns) for log in logs]
+
+    listed = None
+    for label, fn in (("projected", projected), ("full_entity", full_entities)):
+        rows = fn()
+        listed = len(rows)
+        stats = measure(fn, ctx.n(10), warmup=0)
+        stats.update(
+            rows=listed,
+            columns=len(rows[0]) if rows else 0,
+            bytes_per_row=sum(_value_bytes(v) for row in rows for v in row) / max(listed, 1),
+        )
+        results[f"listing.auditor.{label}"] = stats
+        del rows
+
+    results["listing.auditor.http"] = measure(
+        lambda: _ok(ctx.client.get("/api/audit/logs", params={"role": "auditor"})), ctx.n(10), warmup=0
+    )
+    results["listing.auditor.http"]["rows"] = listed
+
+    proj, full = results["listing.auditor.projected"], results["listing.auditor.full_entity"]
+    for name, stats in (("projected", proj), ("full_entity", full), ("http", results["listing.auditor.http"])):
+        extra = f"  {stats['bytes_per_row']:.0f} B/row" if "bytes_per_row" in stats else ""
+        print(
+            f"[bench] listing {name:<11} {listed} rows  p50 {_fmt_seconds(stats['p50'])}  "
+            f"p99 {_fmt_seconds(stats['p99'])}{extra}",
+            file=sys.stderr,
+        )
+    print(
+        f"[bench] listing projection: {full['bytes_per_row'] / proj['bytes_per_row']:.1f}x fewer bytes, "
+        f"p99 {full['p99'] / proj['p99']:.1f}x lower",
+        file=sys.stderr,
+    )
+
+
+BENCHMARKS = {
+    "crypto": bench_crypto,
+    "chain": bench_chain,
+    "decrypt": bench_decrypt,
+    "api": bench_api,
+    "chat": bench_chat,
+    "auth": bench_auth,
+    "listing": bench_listing,
+}
+
+
+# ─── Runner ──────────────────────────────────────────────────────────────────
+
+class Context:
+    def __init__(self, client, rows, scale, decrypt_workers=(1,), listing_rows=100_000):
+        self.client = client
+        self.rows = rows
+        self.scale = scale
+        self.decrypt_workers = decrypt_workers
+        self.listing_rows = listing_rows
+        self._ids = iter(range(10 ** 9))
+
+    def n(self, default: int) -> int:
+        return max(1, int(default * self.scale))
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+
+def _seed(client, count: int, batch: int = 500, start: int = 0):
+    for lo in range(start, start + count, batch):
+        _ok(client.post("/api/audit/add-logs", json=[_entry(i) for i in range(lo, min(lo + batch, start + count))]))
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def run(args) -> dict:
+    tmpdir = tempfile.mkdtemp(prefix="ehr-bench-")
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    # Bench users' keypairs go to a scratch keystore (KEYSTORE_BACKEND=db
+    # puts them in user_keys, which is emptied below with the other tables)
+    os.environ["KEYSTORE_PATH"] = os.path.join(tmpdir, "keystore.db")
+
+    # Imported after DATABASE_URL is set; db.session reads it at import time
+    from fastapi.testclient import TestClient
+    from sqlalchemy import text
+    import main
+    from db.session import engine
+    from models.tables import Base
+
+    groups = args.only.split(",") if args.only else list(GROUPS)
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        raise SystemExit(f"Unknown benchmark group(s): {', '.join(sorted(unknown))}")
+
+    with engine.connect() as conn:
+        if conn.execute(text("SELECT COUNT(*) FROM audit_logs")).scalar():
+            raise SystemExit("Refusing to run: audit_logs is not empty — point --database-url at a scratch database")
+
+    results = {}
+    try:
+        client = TestClient(main.app)
+        if {"api", "chat"} & set(groups):
+            _seed(client, args.seed)
+        ctx = Context(client, args.rows, args.scale, args.decrypt_workers, args.listing_rows)
+        for group in groups:
+            print(f"[bench] {group}", file=sys.stderr)
+            BENCHMARKS[group](ctx, results)
+    finally:
+        if args.database_url:
+            # Leave the scratch database as empty as we found it
+            with engine.begin() as conn:
+                for table in reversed(Base.metadata.sorted_tables):
+                    if table.name != "users":
+                        conn.execute(table.delete())
+        engine.dispose()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "database": engine.dialect.name,
+            "seed_records": args.seed,
+            "scale": args.scale,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float, metric: str = "p50"):
+    """Return (rows, regressed) comparing `metric` per benchmark."""
+    rows, regressed = [], False
+    base, cur = baseline["results"], current["results"]
+    for name in sorted(set(base) | set(cur)):
+        if name not in base or name not in cur:
+            rows.append((name, base.get(name, {}).get(metric), cur.get(name, {}).get(metric), None, "new" if name in cur else "missing"))
+            continue
+        before, after = base[name][metric], cur[name][metric]
+        change = (after - before) / before if before else 0.0
+        status = "ok"
+        if change > threshold:
+            status, regressed = "REGRESSION", True
+        elif change < -threshold:
+            status = "improved"
+        rows.append((name, before, after, change, status))
+    return rows, regressed
+
+
+def _fmt_seconds(v):
+    if v is None:
+        return "—"
+    if v < 1e-3:
+        return f"{v * 1e6:.1f}µs"
+    if v < 1:
+        return f"{v * 1e3:.2f}ms"
+    return f"{v:.2f}s"
+
+
+def _default_decrypt_workers():
+    """1, 2, 4, ... up to and including the core count."""
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 < cores:
+        counts.append(counts[-1] * 2)
+    return counts + [cores] if cores > 1 else counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="run the benchmarks and write JSON results")
+    p_run.add_argument("--only", help=f"comma-separated groups: {','.join(GROUPS)}")
+    p_run.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                       help="chain sizes for validate_log_chain")
+    p_run.add_argument("--decrypt-workers", type=int, nargs="+", default=_default_decrypt_workers(),
+                       help="DECRYPT_WORKERS values for the decrypt scaling benchmark")
+    p_run.add_argument("--listing-rows", type=int, default=100_000,
+                       help="records behind the auditor listing benchmark (seeded as needed)")
+    p_run.add_argument("--seed", type=int, default=2000, help="records seeded for the API/chat benchmarks")
+    p_run.add_argument("--scale", type=float, default=1.0, help="multiply iteration counts (e.g. 0.1 for a quick run)")
+    p_run.add_argument("--database-url", help="scratch database to use instead of a temporary SQLite file")
+    p_run.add_argument("--out", help="write results here (default: stdout)")
+
+    p_cmp = sub.add_parser("compare", help="flag regressions against a baseline")
+    p_cmp.add_argument("baseline")
+    p_cmp.add_argument("current")
+    p_cmp.add_argument("--threshold", type=float, default=0.10, help="allowed p50 slowdown (0.10 = 10%%)")
+    p_cmp.add_argument("--metric", default="p50", choices=("p50", "p95", "p99", "mean", "min"))
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = json.dumps(run(args), indent=2)
+        if args.out:
+            with open(args.out, "w") as f:
+                f.write(report + "\n")
+            print(f"[bench] wrote {args.out}", file=sys.stderr)
+        else:
+            print(report)
+        # Pool workers and the TestClient's threads shouldn't hold the exit
+        os._exit(0)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows, regressed = compare(baseline, current, args.threshold, args.metric)
+    width = max((len(r[0]) for r in rows), default=10)
+    print(f"{'benchmark':<{width}}  {'baseline':>10}  {'current':>10}  {'change':>8}  status")
+    for name, before, after, change, status in rows:
+        pct = f"{change * 100:+.1f}%" if change is not None else "—"
+        print(f"{name:<{width}}  {_fmt_seconds(before):>10}  {_fmt_seconds(after):>10}  {pct:>8}  {status}")
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
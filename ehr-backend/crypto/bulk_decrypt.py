@@ -0,0 +1,110 @@
+import json
+import os
+from base64 import b64decode
+from concurrent.futures import ProcessPoolExecutor
+from Crypto.Cipher import AES, PKCS1_OAEP
+from Crypto.PublicKey import RSA
+from crypto import key_cache, data_keys
+from utils.metrics import timed
+
+# Bulk decryption for auditor reads/exports. The parent process resolves
+# each key once (one data-key unwrap per epoch, one private key per legacy
+# recipient); workers do the per-record AES-EAX decrypt_and_verify (and the
+# RSA unwrap for legacy rows) chunk by chunk.
+DECRYPT_WORKERS = int(os.getenv("DECRYPT_WORKERS", str(os.cpu_count() or 1)))
+CHUNK_SIZE = int(os.getenv("DECRYPT_CHUNK_SIZE", "256"))
+
+_executor = None
+_worker_rsa_keys = {}   # per worker process: private PEM -> RsaKey
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=DECRYPT_WORKERS)
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _decrypt_chunk(keys: dict, rows: list) -> list:
+    """
+    Runs in a worker. keys maps a key ref to ("envelope", data_key) or
+    ("rsa", private_pem); rows are (log_id, key_ref, encrypted_aes_key,
+    nonce_b64, tag_b64, ciphertext). Returns (log_id, payload, error) per row.
+    """
+    out = []
+    for log_id, ref, encrypted_aes_key, nonce_b64, tag_b64, ciphertext in rows:
+        try:
+            kind, material = keys[ref]
+            nonce = b64decode(nonce_b64)
+            if kind == "envelope":
+                aes_key = data_keys.derive_record_key(material, nonce)
+            else:
+                rsa_key = _worker_rsa_keys.get(material)
+                if rsa_key is None:
+                    rsa_key = _worker_rsa_keys[material] = RSA.import_key(material)
+                aes_key = PKCS1_OAEP.new(rsa_key).decrypt(encrypted_aes_key)
+            cipher = AES.new(aes_key, AES.MODE_EAX, nonce=nonce)
+            plaintext = cipher.decrypt_and_verify(ciphertext, b64decode(tag_b64))
+            out.append((log_id, json.loads(plaintext.decode()), None))
+        except Exception as e:
+            out.append((log_id, None, f"{type(e).__name__}: {e}" if str(e) else type(e).__name__))
+    return out
+
+
+def _resolve_keys(logs, keys: dict, failed: dict) -> list:
+    """Turn AuditLog rows into chunk tuples, resolving each key only once."""
+    rows = []
+    for log in logs:
+        if log.enc_version == data_keys.ENC_VERSION_ENVELOPE:
+            ref = ("dk", log.data_key_id)
+        else:
+            ref = ("rsa", log.user_id)
+        if ref not in keys and ref not in failed:
+            try:
+                if ref[0] == "dk":
+                    keys[ref] = ("envelope", data_keys.unwrap_data_key(log.data_key_id, log.user_id))
+                else:
+                    keys[ref] = ("rsa", key_cache.get_private_key(log.user_id).export_key())
+            except Exception as e:
+                failed[ref] = f"{type(e).__name__}: {e}"
+        rows.append((log.id, ref, log.encrypted_aes_key, log.nonce, log.tag, log.encrypted_data))
+    return rows
+
+
+@timed("bulk_decrypt")
+def decrypt_logs(logs) -> dict:
+    """
+    Decrypt a batch of AuditLog rows. Returns {log_id: (payload, error)};
+    rows that fail key lookup or AEAD verification carry an error string.
+    Small batches are decrypted inline — the pool only pays off past a chunk.
+    """
+    keys, failed = {}, {}
+    rows = _resolve_keys(logs, keys, failed)
+
+    results = {}
+    pending = []
+    for row in rows:
+        if row[1] in failed:
+            results[row[0]] = (None, failed[row[1]])
+        else:
+            pending.append(row)
+
+    if len(pending) <= CHUNK_SIZE or DECRYPT_WORKERS <= 1:
+        chunks_out = [_decrypt_chunk(keys, pending)]
+    else:
+        chunks = [pending[i:i + CHUNK_SIZE] for i in range(0, len(pending), CHUNK_SIZE)]
+        # Ship each chunk only the keys it references
+        chunk_keys = [{row[1]: keys[row[1]] for row in chunk} for chunk in chunks]
+        chunks_out = _get_executor().map(_decrypt_chunk, chunk_keys, chunks)
+
+    for chunk in chunks_out:
+        for log_id, payload, error in chunk:
+            results[log_id] = (payload, error)
+    return results
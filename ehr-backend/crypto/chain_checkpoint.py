@@ -0,0 +1,116 @@
+import datetime
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models.tables import AuditLog, ChainCheckpoint
+from crypto.validate_chain import _chain_hash, before_position
+from crypto.parallel_chain import scan_chain
+
+_CHECKPOINT_ID = 1
+
+
+def load_checkpoint(db: Session):
+    return db.get(ChainCheckpoint, _CHECKPOINT_ID)
+
+
+def _move_checkpoint(db: Session, log, verified_count: int):
+    cp = load_checkpoint(db)
+    if cp is None:
+        cp = ChainCheckpoint(id=_CHECKPOINT_ID)
+        db.add(cp)
+    cp.last_log_id = log.id
+    cp.last_timestamp = log.timestamp
+    cp.last_hash = _chain_hash(log)
+    cp.verified_count = verified_count
+    cp.updated_at = datetime.datetime.utcnow()
+
+
+def reset_checkpoint(db: Session):
+    """Forget the checkpoint so the next validation re-scans from genesis."""
+    db.query(ChainCheckpoint).filter(ChainCheckpoint.id == _CHECKPOINT_ID).delete()
+
+
+def rewind_checkpoint(db: Session, log: AuditLog):
+    """
+    Call BEFORE modifying or deleting `log`. If the record sits at or before
+    the checkpoint, pull the checkpoint back to the record just before it so
+    the next incremental validation re-checks everything the write affects.
+    """
+    cp = load_checkpoint(db)
+    if cp is None:
+        return
+    if (log.timestamp, log.id) > (cp.last_timestamp, cp.last_log_id):
+        return
+
+    prev = (
+        db.query(AuditLog)
+        .filter(before_position(log.timestamp, log.id))
+        .order_by(AuditLog.timestamp.desc(), AuditLog.id.desc())
+        .first()
+    )
+    if prev is None:
+        reset_checkpoint(db)
+        return
+    count = (
+        db.query(func.count(AuditLog.id))
+        .filter(before_position(log.timestamp, log.id))
+        .scalar()
+    )
+    _move_checkpoint(db, prev, count)
+
+
+def _checkpoint_key(cp):
+    return None if cp is None else (cp.last_log_id, cp.last_hash, cp.updated_at)
+
+
+def validate_incremental(db: Session, full: bool = False, read_db: Session = None) -> dict:
+    """
+    Validate the chain from the checkpoint onward (or from genesis when
+    `full` is set or no checkpoint exists) and advance the checkpoint over
+    the valid prefix of what was checked. Commits the checkpoint update.
+
+    Rows are streamed through a ChainScan, so memory stays flat however
+    many records have to be checked; ranges longer than one segment are
+    hashed across the validation worker pool.
+
+    With `read_db` (a replica session) the rows are scanned there, but only
+    if the replica already shows the primary's checkpoint: writes rewind the
+    checkpoint in the same transaction, so that proves the replica has
+    replayed every change the checkpoint accounts for.
+    """
+    primary_cp = load_checkpoint(db)
+    cp = None if full else primary_cp
+
+    reader = db
+    if read_db is not None and read_db is not db:
+        if _checkpoint_key(load_checkpoint(read_db)) == _checkpoint_key(primary_cp):
+            reader = read_db
+        else:
+            read_db.rollback()
+
+    if cp is None:
+        verified = 0
+        # The genesis record has nothing to link to
+        scan = scan_chain(reader)
+    else:
+        verified = cp.verified_count
+        # The first new record must link to the last verified one
+        scan = scan_chain(reader, after=(cp.last_timestamp, cp.last_log_id), prev_hash=cp.last_hash)
+
+    if reader is not db:
+        # End the read transaction before writing (SQLite would block on it)
+        reader.rollback()
+
+    # Only the prefix before the first break becomes verified history
+    if scan.valid_last is not None:
+        _move_checkpoint(db, scan.valid_last, verified + scan.valid_count)
+        db.commit()
+    elif full and scan.count == 0:
+        reset_checkpoint(db)
+        db.commit()
+
+    return {
+        "valid": scan.is_valid,
+        "invalid_log_ids": scan.broken_ids,
+        "invalid_count": scan.broken_count,
+        "total_records": verified + scan.count,
+    }
@@ -0,0 +1,120 @@
+import datetime
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from models.tables import AuditLog, ChainHead
+from crypto.validate_chain import GENESIS_HASH, _chain_hash
+from utils.metrics import observe, span
+
+# Appends must be serialized: two writers that read the same tail would both
+# link to it and fork the chain. Inside one process a lock is enough; across
+# uvicorn workers the database lock is taken too — a transaction-scoped
+# advisory lock on Postgres, BEGIN IMMEDIATE (the write lock) on SQLite.
+# The chain_head row is the authoritative tail: it is read under those locks
+# on every append (one primary-key lookup) and never cached in-process.
+_HEAD_ID = 1
+_ADVISORY_LOCK_KEY = 0x45485243  # "EHRC"
+
+_lock = threading.Lock()
+
+
+class HeadState:
+    """The chain tail as seen by the writer currently holding the lock."""
+
+    def __init__(self, log_id=None, timestamp=None, hash=None):
+        self.log_id = log_id
+        self.timestamp = timestamp
+        self.hash = hash
+
+    @property
+    def is_empty(self) -> bool:
+        return self.log_id is None
+
+    def next_timestamp(self) -> datetime.datetime:
+        # Never go backwards, or (timestamp, id) order would disagree with
+        # the order records were linked in
+        now = datetime.datetime.utcnow()
+        if self.timestamp is not None and now < self.timestamp:
+            return self.timestamp
+        return now
+
+    def link(self, log: AuditLog):
+        """Point `log` at the current tail."""
+        log.record_hash = GENESIS_HASH if self.is_empty else self.hash
+
+    def advance(self, log: AuditLog):
+        """Make `log` (already flushed, so it has an id) the new tail."""
+        self.log_id = log.id
+        self.timestamp = log.timestamp
+        self.hash = _chain_hash(log)
+
+    def reload(self, db: Session):
+        """Recompute the tail from audit_logs, e.g. after deleting it."""
+        tail = (
+            db.query(AuditLog)
+            .order_by(AuditLog.timestamp.desc(), AuditLog.id.desc())
+            .first()
+        )
+        if tail is None:
+            self.log_id = self.timestamp = self.hash = None
+        else:
+            self.advance(tail)
+
+
+def _acquire_db_lock(db: Session):
+    """Take the database-wide append lock that other processes also honour."""
+    bind = db.get_bind()
+    if bind.dialect.name == "postgresql":
+        db.execute(select(func.pg_advisory_xact_lock(_ADVISORY_LOCK_KEY)))
+    elif bind.dialect.name == "sqlite":
+        conn = db.connection().connection.driver_connection
+        # pysqlite only opens a transaction at the first write, so the head
+        # would otherwise be read without any lock. A transaction that has
+        # already written holds the write lock.
+        if not conn.in_transaction:
+            db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def _load_head(db: Session) -> HeadState:
+    row = db.get(ChainHead, _HEAD_ID, populate_existing=True)
+    if row is not None:
+        return HeadState(row.last_log_id, row.last_timestamp, row.last_hash)
+
+    head = HeadState()
+    head.reload(db)
+    return head
+
+
+def _save_head(db: Session, head: HeadState):
+    row = db.get(ChainHead, _HEAD_ID)
+    if row is None:
+        row = ChainHead(id=_HEAD_ID)
+        db.add(row)
+    row.last_log_id = head.log_id
+    row.last_timestamp = head.timestamp
+    row.last_hash = head.hash
+
+
+@contextmanager
+def locked_head(db: Session):
+    """
+    Hold the chain append lock for one transaction and yield the current
+    head, read from the chain_head row under the lock. On a clean exit the
+    row is updated and the session committed; on error everything is rolled
+    back.
+    """
+    started = time.perf_counter()
+    with _lock:
+        try:
+            _acquire_db_lock(db)
+            observe("chain.head_lock_wait", time.perf_counter() - started)
+            with span("chain.head_load"):
+                head = _load_head(db)
+            yield head
+            _save_head(db, head)
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
@@ -0,0 +1,129 @@
+import datetime
+import os
+import threading
+import time
+from collections import OrderedDict
+from Crypto.Cipher import PKCS1_OAEP
+from Crypto.Hash import SHA256
+from Crypto.Protocol.KDF import HKDF
+from Crypto.Random import get_random_bytes
+from crypto import key_cache
+from models.tables import DataKey
+
+# Encryption format versions stored in AuditLog.enc_version
+ENC_VERSION_RSA = 1        # fresh AES key per record, RSA-OAEP wrapped per record
+ENC_VERSION_ENVELOPE = 2   # AES key = HKDF(epoch data key, record nonce)
+
+DATA_KEY_MAX_AGE = int(os.getenv("DATA_KEY_MAX_AGE_SECONDS", str(24 * 3600)))
+DATA_KEY_MAX_RECORDS = int(os.getenv("DATA_KEY_MAX_RECORDS", "100000"))
+UNWRAPPED_CACHE_SIZE = int(os.getenv("DATA_KEY_CACHE_SIZE", "1024"))
+
+_HKDF_CONTEXT = b"ehr-audit-log/v2"
+
+# _lock guards the dicts below and is only ever held briefly; starting an
+# epoch (RSA wrap + a DB commit) runs under that recipient's own lock, so
+# one rotation never stalls encrypts and unwraps for everyone else
+_lock = threading.Lock()
+_epochs = {}                 # recipient -> [data_key_id, key, started (monotonic), records]
+_rotation_locks = {}         # recipient -> Lock held while its next epoch is built
+_unwrapped = OrderedDict()   # data_key_id -> key
+
+
+def _session():
+    # Imported lazily: models.database pulls in the engine at import time
+    from models.database import SessionLocal
+    return SessionLocal()
+
+
+def derive_record_key(data_key: bytes, nonce: bytes) -> bytes:
+    """Per-record AES-128 key; the record's random nonce is the HKDF salt."""
+    return HKDF(data_key, 16, nonce, SHA256, context=_HKDF_CONTEXT)
+
+
+def _remember(data_key_id: int, key: bytes):
+    _unwrapped[data_key_id] = key
+    _unwrapped.move_to_end(data_key_id)
+    while len(_unwrapped) > UNWRAPPED_CACHE_SIZE:
+        _unwrapped.popitem(last=False)
+
+
+def _new_epoch(recipient: str, public_key):
+    key = get_random_bytes(32)
+    wrapped = PKCS1_OAEP.new(public_key).encrypt(key)
+    # Committed on its own so a rolled-back log insert can't orphan the key
+    # that later records reference
+    with _session() as db:
+        row = DataKey(recipient=recipient, wrapped_key=wrapped, created_at=datetime.datetime.utcnow())
+        db.add(row)
+        db.commit()
+        data_key_id = row.id
+    return [data_key_id, key, time.monotonic(), 0]
+
+
+def _usable(epoch) -> bool:
+    return (
+        epoch is not None
+        and time.monotonic() - epoch[2] < DATA_KEY_MAX_AGE
+        and epoch[3] < DATA_KEY_MAX_RECORDS
+    )
+
+
+def _take(epoch):
+    epoch[3] += 1
+    return epoch[0], epoch[1]
+
+
+def current_data_key(recipient: str, public_key):
+    """
+    Return (data_key_id, data_key) for encrypting the next record to
+    `recipient`, starting a new epoch when the current one is too old or has
+    covered too many records.
+    """
+    with _lock:
+        epoch = _epochs.get(recipient)
+        if _usable(epoch):
+            return _take(epoch)
+        rotation = _rotation_locks.setdefault(recipient, threading.Lock())
+
+    with rotation:
+        # Whoever held the rotation lock before us may have started one
+        with _lock:
+            epoch = _epochs.get(recipient)
+            if _usable(epoch):
+                return _take(epoch)
+        epoch = _new_epoch(recipient, public_key)
+        with _lock:
+            _epochs[recipient] = epoch
+            _remember(epoch[0], epoch[1])
+            return _take(epoch)
+
+
+def unwrap_data_key(data_key_id: int, recipient: str) -> bytes:
+    """Unwrap a stored data key with the recipient's private key (cached)."""
+    with _lock:
+        key = _unwrapped.get(data_key_id)
+        if key is not None:
+            _unwrapped.move_to_end(data_key_id)
+            return key
+
+    with _session() as db:
+        row = db.get(DataKey, data_key_id)
+        if row is None:
+            raise KeyError(f"Data key {data_key_id} not found")
+        if row.recipient != recipient:
+            raise ValueError(f"Data key {data_key_id} does not belong to '{recipient}'")
+        wrapped = row.wrapped_key
+    key = PKCS1_OAEP.new(key_cache.get_private_key(recipient)).decrypt(wrapped)
+
+    with _lock:
+        _remember(data_key_id, key)
+    return key
+
+
+def rotate(recipient: str = None):
+    """End the current epoch for one recipient (or all) so the next record starts a new one."""
+    with _lock:
+        if recipient is None:
+            _epochs.clear()
+        else:
+            _epochs.pop(recipient, None)
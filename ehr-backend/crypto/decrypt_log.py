@@ -1,39 +1,38 @@
-import os
 import json
 from base64 import b64decode
 from Crypto.Cipher import AES, PKCS1_OAEP
-from Crypto.PublicKey import RSA
-
-_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-
-
-def _private_key_path(user_id: str) -> str:
-    return os.path.join(_BACKEND_DIR, "keys", f"{user_id}_private.pem")
+from crypto import key_cache, data_keys
+from utils.metrics import timed
 
 
+@timed("decrypt_log")
 def decrypt_log(
     encrypted_data: bytes,
     encrypted_aes_key: bytes,
     nonce_b64: str,
     tag_b64: str,
     user_id: str,
+    enc_version: int = None,
+    data_key_id: int = None,
 ) -> dict:
     """
     Decrypt a log entry using the user's RSA private key.
-    Pass user_id (the doctor who created the log) — key is loaded from disk.
+    Pass user_id (the doctor who created the log) — the parsed key comes from
+    the shared key cache, which reads the keystore only on a miss.
+    Reads both formats: enc_version 2 derives the AES key from the unwrapped
+    epoch data key; anything else is the original per-record RSA format.
     """
-    key_path = _private_key_path(user_id)
-    if not os.path.exists(key_path):
-        raise FileNotFoundError(f"Private key for '{user_id}' not found at {key_path}")
-
-    with open(key_path, "rb") as f:
-        private_key = RSA.import_key(f.read())
+    nonce = b64decode(nonce_b64)
 
-    # Decrypt the AES session key
-    aes_key = PKCS1_OAEP.new(private_key).decrypt(encrypted_aes_key)
+    if enc_version == data_keys.ENC_VERSION_ENVELOPE:
+        data_key = data_keys.unwrap_data_key(data_key_id, user_id)
+        aes_key = data_keys.derive_record_key(data_key, nonce)
+    else:
+        private_key = key_cache.get_private_key(user_id)
+        # Decrypt the AES session key
+        aes_key = PKCS1_OAEP.new(private_key).decrypt(encrypted_aes_key)
 
     # AES-EAX decryption
-    nonce = b64decode(nonce_b64)
     tag = b64decode(tag_b64)
     cipher_aes = AES.new(aes_key, AES.MODE_EAX, nonce=nonce)
     decrypted = cipher_aes.decrypt_and_verify(encrypted_data, tag)
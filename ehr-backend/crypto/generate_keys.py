@@ -1,26 +1,20 @@
-import os
-from Crypto.PublicKey import RSA
+from crypto import key_pool, keystore
 
-# Resolve paths relative to THIS file, not the CWD — fixes breakage when
-# uvicorn is run from a different working directory
-_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+def generate_keys(user_id: str) -> bool:
+    """
+    Store a new RSA keypair for user_id. A user who already has one keeps
+    it — their records and data keys are wrapped with it. Returns whether a
+    keypair was created.
+    """
+    if keystore.get_keystore().get(user_id) is not None:
+        return False
 
-def generate_keys(user_id: str):
-    keys_dir = os.path.join(_BACKEND_DIR, "keys")
-    pub_dir = os.path.join(_BACKEND_DIR, "public_keys")
-    os.makedirs(keys_dir, exist_ok=True)
-    os.makedirs(pub_dir, exist_ok=True)
+    # Pre-generated by the key pool's background worker when one is ready;
+    # generated inline only if the pool has run dry
+    private_key, public_key = key_pool.take_keypair()
 
-    key = RSA.generate(2048)
-    private_key = key.export_key()
-    public_key = key.publickey().export_key()
-
-    with open(os.path.join(keys_dir, f"{user_id}_private.pem"), "wb") as f:
-        f.write(private_key)
-    with open(os.path.join(keys_dir, f"{user_id}_public.pem"), "wb") as f:
-        f.write(public_key)
-    with open(os.path.join(pub_dir, f"{user_id}.pem"), "wb") as f:
-        f.write(public_key)
-
-    print(f"[+] RSA keys generated for '{user_id}'")
\ No newline at end of file
+    if not keystore.add(user_id, public_key, private_key):
+        return False   # stored concurrently by another writer
+    print(f"[+] RSA keys generated for '{user_id}'")
+    return True
@@ -0,0 +1,58 @@
+import os
+import threading
+from collections import OrderedDict
+from Crypto.PublicKey import RSA
+from crypto import keystore
+from utils.metrics import span
+
+# Parsing a PEM with RSA.import_key is the most expensive step on the add-log
+# path, so parsed keys are kept in a bounded in-process LRU. Stored keypairs
+# never change (crypto.keystore), so a cached key is served without going
+# back to the store.
+MAX_KEYS = int(os.getenv("KEY_CACHE_SIZE", "1024"))
+
+_lock = threading.Lock()
+_cache = OrderedDict()   # (user_id, kind) -> RsaKey
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+_PEM_INDEX = {"public": 0, "private": 1}
+
+
+def _load(user_id: str, kind: str):
+    key = (user_id, kind)
+    with _lock:
+        rsa_key = _cache.get(key)
+        if rsa_key is not None:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            return rsa_key
+        _stats["misses"] += 1
+
+    # Fetch and parse outside the lock — a duplicate parse on a cold key is
+    # harmless. Raises keystore.KeyNotFound.
+    pem = keystore.load(user_id)[_PEM_INDEX[kind]]
+    with span("key_cache.pem_parse"):
+        rsa_key = RSA.import_key(pem)
+
+    with _lock:
+        _cache[key] = rsa_key
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_KEYS:
+            _cache.popitem(last=False)
+            _stats["evictions"] += 1
+    return rsa_key
+
+
+def get_public_key(user_id: str):
+    """Return the parsed RSA public key for user_id (cached)."""
+    return _load(user_id, "public")
+
+
+def get_private_key(user_id: str):
+    """Return the parsed RSA private key for user_id (cached)."""
+    return _load(user_id, "private")
+
+
+def stats() -> dict:
+    with _lock:
+        return {**_stats, "size": len(_cache), "max_size": MAX_KEYS}
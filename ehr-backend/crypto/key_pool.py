@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from Crypto.PublicKey import RSA
+
+# RSA.generate(2048) is hundreds of milliseconds of pure CPU. A background
+# thread keeps a few keypairs ready so registration (and encrypt_log's
+# first-sight keygen) can take one in O(1) instead of generating inline.
+KEY_BITS = 2048
+LOW_WATERMARK = int(os.getenv("KEY_POOL_LOW_WATERMARK", "2"))
+HIGH_WATERMARK = int(os.getenv("KEY_POOL_HIGH_WATERMARK", "8"))
+WORKERS = int(os.getenv("KEY_POOL_WORKERS", "1"))
+
+
+def _generate_pem():
+    """Generate one keypair as (private_pem, public_pem). Runs in a worker process."""
+    key = RSA.generate(KEY_BITS)
+    return key.export_key(), key.publickey().export_key()
+
+
+class KeyPool:
+    def __init__(self, low: int = LOW_WATERMARK, high: int = HIGH_WATERMARK, workers: int = WORKERS):
+        self.low = low
+        self.high = max(high, low)
+        self.workers = workers
+        self._keys = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._executor = None
+        self._stats = {
+            "taken": 0,
+            "misses": 0,             # pool was empty, generated synchronously
+            "generated": 0,          # keypairs produced by the refill worker
+            "refills": 0,            # refill runs triggered by the low watermark
+            "refill_seconds": 0.0,
+        }
+
+    def start(self):
+        if self._thread is not None:
+            return
+        try:
+            # A separate process keeps keygen off the API's GIL
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        except (OSError, NotImplementedError) as e:
+            print(f"[!] Key pool falling back to in-thread generation: {e}")
+            self._executor = None
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._refill_loop, name="key-pool-refill", daemon=True)
+        self._thread.start()
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def take(self):
+        """Return a fresh (private_pem, public_pem), never handing one out twice."""
+        with self._lock:
+            pair = self._keys.popleft() if self._keys else None
+            remaining = len(self._keys)
+            self._stats["taken"] += 1
+            if pair is None:
+                self._stats["misses"] += 1
+        if remaining < self.low:
+            self._wake.set()
+        if pair is None:
+            pair = _generate_pem()
+        return pair
+
+    def _generate_batch(self, n: int):
+        if self._executor is None:
+            return [_generate_pem() for _ in range(n)]
+        futures = [self._executor.submit(_generate_pem) for _ in range(n)]
+        return [f.result() for f in futures]
+
+    def _refill_loop(self):
+        while not self._stopping.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            if self._stopping.is_set():
+                break
+            with self._lock:
+                missing = self.high - len(self._keys)
+            if missing <= 0:
+                continue
+            started = time.perf_counter()
+            try:
+                while missing > 0 and not self._stopping.is_set():
+                    batch = self._generate_batch(min(missing, self.workers))
+                    with self._lock:
+                        self._keys.extend(batch)
+                        self._stats["generated"] += len(batch)
+                        missing = self.high - len(self._keys)
+            except Exception as e:
+                print(f"[!] Key pool refill failed: {e}")
+            with self._lock:
+                self._stats["refills"] += 1
+                self._stats["refill_seconds"] += time.perf_counter() - started
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "available": len(self._keys),
+                "low_watermark": self.low,
+                "high_watermark": self.high,
+            }
+
+
+pool = KeyPool()
+
+
+def start():
+    pool.start()
+
+
+def stop():
+    pool.stop()
+
+
+def take_keypair():
+    return pool.take()
+
+
+def stats() -> dict:
+    return pool.stats()
@@ -0,0 +1,324 @@
+import datetime
+import os
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+from sqlalchemy.exc import IntegrityError
+
+# Where RSA keypairs live. Lookups used to stat and read PEM files under
+# keys/ and public_keys/: one directory entry per user per file, a syscall
+# round per record, and keys lost whenever an ephemeral container was
+# replaced. Keypairs are now rows in a store, selected by KEYSTORE_BACKEND:
+#
+#   sqlite  one embedded SQLite file (KEYSTORE_PATH), WAL mode, read via mmap
+#   db      the user_keys table in the main database (survives redeploys)
+#
+# A stored keypair is never replaced — records and data keys stay wrapped
+# with it — so crypto.key_cache can keep parsed keys without re-checking.
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+KEYSTORE_BACKEND = os.getenv("KEYSTORE_BACKEND", "sqlite")
+KEYSTORE_PATH = os.getenv("KEYSTORE_PATH", os.path.join(_BACKEND_DIR, "keys", "keystore.db"))
+LEGACY_KEYS_DIR = os.path.join(_BACKEND_DIR, "keys")
+LEGACY_PUBLIC_DIR = os.path.join(_BACKEND_DIR, "public_keys")
+KEYSTORE_MMAP_BYTES = int(os.getenv("KEYSTORE_MMAP_BYTES", str(256 * 1024 * 1024)))
+IMPORT_CHUNK_SIZE = 1000
+
+
+class KeyNotFound(LookupError):
+    """No keypair is stored for the user."""
+
+
+class KeyStore(ABC):
+    """Keypairs by user id. PEMs go in and come out as bytes."""
+
+    name = ""
+
+    @abstractmethod
+    def get(self, user_id: str):
+        """(public_pem, private_pem), or None when the user has no keys."""
+
+    @abstractmethod
+    def add_many(self, rows) -> int:
+        """Store (user_id, public_pem, private_pem) rows; existing users are skipped. Returns rows added."""
+
+    @abstractmethod
+    def delete(self, user_ids):
+        """Remove the keypairs of these users."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored keypairs."""
+
+    def add(self, user_id: str, public_pem: bytes, private_pem: bytes) -> bool:
+        """False when the user already had a keypair (which is kept)."""
+        return self.add_many([(user_id, public_pem, private_pem)]) == 1
+
+
+class SqliteKeyStore(KeyStore):
+    """Single-file embedded store; one connection per thread (and per process)."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = KEYSTORE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        new = not os.path.exists(self.path)
+        conn = sqlite3.connect(self.path, timeout=30)
+        if new:
+            # Private keys: owner-only, like the PEM files were meant to be
+            os.chmod(self.path, 0o600)
+            # A keypair is ~2.5 KB; 16 KB pages keep it off overflow pages
+            conn.execute("PRAGMA page_size=16384")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={KEYSTORE_MMAP_BYTES}")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS keypairs ("
+            "user_id TEXT PRIMARY KEY, public_pem BLOB NOT NULL, private_pem BLOB NOT NULL, "
+            "created_at TEXT NOT NULL)"
+        )
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, user_id):
+        row = self._conn().execute(
+            "SELECT public_pem, private_pem FROM keypairs WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return (bytes(row[0]), bytes(row[1])) if row else None
+
+    def add_many(self, rows) -> int:
+        conn = self._conn()
+        now = datetime.datetime.utcnow().isoformat()
+        before = conn.total_changes
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO keypairs (user_id, public_pem, private_pem, created_at) VALUES (?, ?, ?, ?)",
+                [(u, pub, priv, now) for u, pub, priv in rows],
+            )
+        return conn.total_changes - before
+
+    def delete(self, user_ids):
+        conn = self._conn()
+        with conn:
+            conn.executemany("DELETE FROM keypairs WHERE user_id = ?", [(u,) for u in user_ids])
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM keypairs").fetchone()[0]
+
+
+class DatabaseKeyStore(KeyStore):
+    """The user_keys table in the main database."""
+
+    name = "db"
+
+    def _session(self):
+        # Imported lazily: models.database pulls in the engine at import time
+        from models.database import SessionLocal
+        return SessionLocal()
+
+    def get(self, user_id):
+        from models.tables import UserKey
+        with self._session() as db:
+            row = db.get(UserKey, user_id)
+            return (row.public_pem, row.private_pem) if row else None
+
+    def add_many(self, rows) -> int:
+        from models.tables import UserKey
+        rows = {u: (pub, priv) for u, pub, priv in rows}
+        if not rows:
+            return 0
+        with self._session() as db:
+            existing = {u for (u,) in db.query(UserKey.user_id).filter(UserKey.user_id.in_(list(rows)))}
+            now = datetime.datetime.utcnow()
+            new = [
+                {"user_id": u, "public_pem": pub, "private_pem": priv, "created_at": now}
+                for u, (pub, priv) in rows.items() if u not in existing
+            ]
+            try:
+                db.bulk_insert_mappings(UserKey, new)
+                db.commit()
+                return len(new)
+            except IntegrityError:
+                # Another process stored one of them first; theirs is kept
+                db.rollback()
+        added = 0
+        for u, (pub, priv) in rows.items():
+            with self._session() as db:
+                if db.get(UserKey, u) is None:
+                    try:
+                        db.add(UserKey(user_id=u, public_pem=pub, private_pem=priv))
+                        db.commit()
+                        added += 1
+                    except IntegrityError:
+                        db.rollback()
+        return added
+
+    def delete(self, user_ids):
+        from models.tables import UserKey
+        with self._session() as db:
+            db.query(UserKey).filter(UserKey.user_id.in_(list(user_ids))).delete(synchronize_session=False)
+            db.commit()
+
+    def count(self) -> int:
+        from models.tables import UserKey
+        with self._session() as db:
+            return db.query(UserKey).count()
+
+
+_BACKENDS = {"sqlite": SqliteKeyStore, "db": DatabaseKeyStore}
+
+_store = None
+_store_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"lookups": 0, "not_found": 0, "added": 0, "legacy_imports": 0}
+
+
+def _count(name: str, n: int = 1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def get_keystore() -> KeyStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            if KEYSTORE_BACKEND not in _BACKENDS:
+                raise ValueError(f"Unknown KEYSTORE_BACKEND '{KEYSTORE_BACKEND}' (expected sqlite or db)")
+            _store = _BACKENDS[KEYSTORE_BACKEND]()
+        return _store
+
+
+def load(user_id: str):
+    """(public_pem, private_pem) for user_id; raises KeyNotFound."""
+    _count("lookups")
+    pems = get_keystore().get(user_id)
+    if pems is None:
+        pems = _import_legacy(user_id)
+    if pems is None:
+        _count("not_found")
+        raise KeyNotFound(f"No keypair stored for '{user_id}'")
+    return pems
+
+
+def add(user_id: str, public_pem: bytes, private_pem: bytes) -> bool:
+    added = get_keystore().add(user_id, public_pem, private_pem)
+    _count("added", int(added))
+    return added
+
+
+# ─── PEM import ──────────────────────────────────────────────────────────────
+
+def _read(path: str):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _legacy_pems(user_id: str, keys_dir: str, public_dir: str):
+    private_pem = _read(os.path.join(keys_dir, f"{user_id}_private.pem"))
+    if private_pem is None:
+        return None
+    public_pem = _read(os.path.join(public_dir, f"{user_id}.pem")) or _read(
+        os.path.join(keys_dir, f"{user_id}_public.pem")
+    )
+    return (public_pem, private_pem) if public_pem else None
+
+
+def _import_legacy(user_id: str):
+    # A key file the bulk import hasn't picked up yet must win over
+    # generating a new keypair, or the user's existing records become
+    # undecryptable
+    pems = _legacy_pems(user_id, LEGACY_KEYS_DIR, LEGACY_PUBLIC_DIR)
+    if pems is None:
+        return None
+    get_keystore().add(user_id, *pems)
+    _count("legacy_imports")
+    return get_keystore().get(user_id)
+
+
+def import_pem_dirs(keys_dir: str = LEGACY_KEYS_DIR, public_dir: str = LEGACY_PUBLIC_DIR) -> dict:
+    """
+    Bulk-load <user>_private.pem / <user>.pem pairs into the keystore.
+    Users that already have a stored keypair are left alone; the files are
+    not touched.
+    """
+    store = get_keystore()
+    found = imported = incomplete = 0
+    batch = []
+
+    def _flush():
+        nonlocal imported
+        imported += store.add_many(batch)
+        batch.clear()
+
+    if os.path.isdir(keys_dir):
+        with os.scandir(keys_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith("_private.pem"):
+                    continue
+                found += 1
+                user_id = entry.name[: -len("_private.pem")]
+                pems = _legacy_pems(user_id, keys_dir, public_dir)
+                if pems is None:
+                    incomplete += 1
+                    continue
+                batch.append((user_id, *pems))
+                if len(batch) >= IMPORT_CHUNK_SIZE:
+                    _flush()
+    _flush()
+    return {"found": found, "imported": imported, "skipped": found - imported - incomplete, "incomplete": incomplete}
+
+
+def ensure_keystore():
+    """Import the PEM directories once, the first time an empty store starts up."""
+    store = get_keystore()
+    if store.count() or not os.path.isdir(LEGACY_KEYS_DIR):
+        return
+    if not any(name.endswith("_private.pem") for name in os.listdir(LEGACY_KEYS_DIR)):
+        return
+    print(f"[keystore] importing PEM key files into the {store.name} keystore")
+    print(f"[keystore] {import_pem_dirs()}")
+
+
+def stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _main(argv=None) -> int:
+    """python -m crypto.keystore import [--keys-dir DIR] [--public-dir DIR]"""
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Manage the RSA keystore.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="bulk-load PEM files from the key directories")
+    imp.add_argument("--keys-dir", default=LEGACY_KEYS_DIR, help="directory of <user>_private.pem files")
+    imp.add_argument("--public-dir", default=LEGACY_PUBLIC_DIR, help="directory of <user>.pem public keys")
+    sub.add_parser("count", help="number of stored keypairs")
+    args = parser.parse_args(argv)
+
+    if KEYSTORE_BACKEND == "db":
+        from models.database import engine
+        from models.migrations import upgrade
+        upgrade(engine)   # creates user_keys on a database that predates it
+
+    if args.command == "import":
+        result = import_pem_dirs(args.keys_dir, args.public_dir)
+    else:
+        result = {"count": get_keystore().count()}
+    print(json.dumps({"backend": get_keystore().name, **result}))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main())
@@ -0,0 +1,190 @@
+import hashlib
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+from models.tables import AuditLog, MerkleNode
+from crypto.validate_chain import CHAIN_COLUMNS, chain_order, chain_preimage
+
+# Append-only Merkle mountain range over the audit log. Every append adds a
+# leaf committing to the record's stable fields (the same ones _chain_hash
+# covers) and merges equal-sized subtrees into a new peak, so an append
+# touches O(log n) nodes and one record can be proven against the root with
+# O(log n) hashes instead of re-walking the chain.
+#
+#   leaf  = sha256(0x00 || "id|user_id|patient_id|action|timestamp")
+#   node  = sha256(0x01 || left || right)
+#   root  = peaks bagged right to left: node(p0, node(p1, ... node(pk-1, pk)))
+#
+# Records are append-only (models.versions): a modify or delete appends a
+# MODIFY/DELETE entry, which gets its own leaf like any other append, and
+# the leaves of earlier versions keep proving those entries. Each entry has
+# exactly one leaf, except in trees grown before versioning, where an
+# in-place modify re-leafed the record; proofs use its latest leaf.
+EMPTY_ROOT = hashlib.sha256(b"").hexdigest()
+
+
+def leaf_hash(log) -> str:
+    return hashlib.sha256(b"\x00" + chain_preimage(log).encode()).hexdigest()
+
+
+def node_hash(left: str, right: str) -> str:
+    return hashlib.sha256(b"\x01" + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+def bag_peaks(peaks: List[str]) -> str:
+    if not peaks:
+        return EMPTY_ROOT
+    acc = peaks[-1]
+    for peak in reversed(peaks[:-1]):
+        acc = node_hash(peak, acc)
+    return acc
+
+
+def peak_positions(size: int) -> List[Tuple[int, int]]:
+    """(level, position) of every peak for `size` leaves, left to right."""
+    peaks = []
+    covered = 0
+    for level in range(size.bit_length() - 1, -1, -1):
+        if size & (1 << level):
+            peaks.append((level, covered >> level))
+            covered += 1 << level
+    return peaks
+
+
+def leaf_count(db: Session) -> int:
+    last = db.query(func.max(MerkleNode.position)).filter(MerkleNode.level == 0).scalar()
+    return 0 if last is None else last + 1
+
+
+def _node_hashes(db: Session, positions) -> Dict[Tuple[int, int], str]:
+    positions = list(positions)
+    if not positions:
+        return {}
+    rows = db.query(MerkleNode.level, MerkleNode.position, MerkleNode.hash).filter(
+        tuple_(MerkleNode.level, MerkleNode.position).in_(positions)
+    )
+    return {(level, position): h for level, position, h in rows}
+
+
+class MerkleAppender:
+    """Current peaks of the tree; turns appended records into new nodes."""
+
+    def __init__(self, size: int, peaks: Dict[int, Tuple[int, str]]):
+        self.size = size
+        self.peaks = peaks   # level -> (position, hash); at most one per level
+
+    @classmethod
+    def load(cls, db: Session) -> "MerkleAppender":
+        size = leaf_count(db)
+        positions = peak_positions(size)
+        hashes = _node_hashes(db, positions)
+        return cls(size, {level: (pos, hashes[(level, pos)]) for level, pos in positions})
+
+    def append(self, log) -> List[MerkleNode]:
+        level, position, h = 0, self.size, leaf_hash(log)
+        nodes = [MerkleNode(level=0, position=position, hash=h, log_id=log.id)]
+        # Like a binary counter: a right child completes its parent
+        while position & 1:
+            _, left = self.peaks.pop(level)
+            h = node_hash(left, h)
+            level, position = level + 1, position >> 1
+            nodes.append(MerkleNode(level=level, position=position, hash=h))
+        self.peaks[level] = (position, h)
+        self.size += 1
+        return nodes
+
+    @property
+    def root(self) -> str:
+        return bag_peaks([self.peaks[level][1] for level in sorted(self.peaks, reverse=True)])
+
+
+def append_leaves(db: Session, logs) -> None:
+    """
+    Add leaves for `logs` (flushed, so they have ids) in chain order. Must run
+    under the chain append lock, in the same transaction as the append.
+    """
+    appender = MerkleAppender.load(db)
+    for log in logs:
+        db.add_all(appender.append(log))
+
+
+def current_root(db: Session) -> dict:
+    size = leaf_count(db)
+    positions = peak_positions(size)
+    hashes = _node_hashes(db, positions)
+    return {"root": bag_peaks([hashes[p] for p in positions]), "size": size}
+
+
+def inclusion_proof(db: Session, log_id: int) -> Optional[dict]:
+    """
+    Proof that the leaf for `log_id` is in the current tree: the sibling
+    path up to its peak, plus every peak so the root can be rebuilt. None if
+    the entry has no leaf.
+    """
+    leaf = (
+        db.query(MerkleNode)
+        .filter(MerkleNode.level == 0, MerkleNode.log_id == log_id)
+        # Only pre-versioning trees hold more than one leaf per entry
+        .order_by(MerkleNode.position.desc())
+        .first()
+    )
+    if leaf is None:
+        return None
+
+    size = leaf_count(db)
+    peaks = peak_positions(size)
+    index = leaf.position
+    for peak_index, (height, peak_pos) in enumerate(peaks):
+        if peak_pos == index >> height:
+            break
+
+    siblings = [(level, (index >> level) ^ 1) for level in range(height)]
+    hashes = _node_hashes(db, siblings + peaks)
+    path = [
+        # Odd positions are right children, so their sibling sits on the left
+        {"side": "left" if (index >> level) & 1 else "right", "hash": hashes[(level, pos)]}
+        for level, pos in siblings
+    ]
+    peak_hashes = [hashes[p] for p in peaks]
+    return {
+        "leaf_index": index,
+        "leaf_hash": leaf.hash,
+        "path": path,
+        "peak_index": peak_index,
+        "peaks": peak_hashes,
+        "root": bag_peaks(peak_hashes),
+        "size": size,
+    }
+
+
+def verify_proof(leaf: str, proof: dict) -> bool:
+    """Check a proof from inclusion_proof() against its leaf hash and root."""
+    h = leaf
+    for step in proof["path"]:
+        h = node_hash(step["hash"], h) if step["side"] == "left" else node_hash(h, step["hash"])
+    peaks = list(proof["peaks"])
+    if peaks[proof["peak_index"]] != h:
+        return False
+    return bag_peaks(peaks) == proof["root"]
+
+
+def rebuild_tree(db: Session, chunk_size: int = 5000):
+    """Build the tree from existing audit_logs in chain order (backfill)."""
+    db.query(MerkleNode).delete()
+    appender = MerkleAppender(0, {})
+    pending = []
+    for row in db.query(*CHAIN_COLUMNS).order_by(*chain_order()).yield_per(chunk_size):
+        pending.extend(appender.append(row))
+        if len(pending) >= chunk_size:
+            db.add_all(pending)
+            db.flush()
+            pending = []
+    db.add_all(pending)
+    db.commit()
+
+
+def ensure_tree(db: Session):
+    """Backfill the tree once for databases that predate it."""
+    if db.query(MerkleNode.id).first() is None and db.query(AuditLog.id).first() is not None:
+        print("[merkle] building Merkle index from existing audit logs")
+        rebuild_tree(db)
@@ -0,0 +1,159 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models.tables import AuditLog
+from utils.metrics import timed
+from crypto.validate_chain import (
+    ChainRow,
+    ChainScan,
+    CHAIN_COLUMNS,
+    _chain_hash,
+    after_position,
+    before_position,
+    chain_order,
+    stream_chain_rows,
+    STREAM_CHUNK_SIZE,
+)
+
+# Each link check needs only the previous record's stable fields, so the
+# chain splits into segments that can be hashed independently: segment i is
+# seeded with the chain hash of the last record of segment i-1 and the
+# results are merged back in order. Processes rather than threads — the
+# hashed strings are ~100 bytes, well under the size where hashlib drops
+# the GIL.
+VALIDATE_WORKERS = int(os.getenv("CHAIN_VALIDATE_WORKERS", str(os.cpu_count() or 1)))
+SEGMENT_SIZE = int(os.getenv("CHAIN_SEGMENT_SIZE", "100000"))
+
+_executor = None
+
+
+def _init_worker():
+    # A forked worker inherits the parent's pooled connections; never reuse them
+    from db.session import dispose_all
+    dispose_all(close=False)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=VALIDATE_WORKERS, initializer=_init_worker)
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def segment_starts(db: Session, after: Optional[Tuple] = None, segment_size: int = SEGMENT_SIZE) -> List[Tuple]:
+    """
+    (timestamp, id) of the first record of every segment after the first,
+    taken every `segment_size` rows in chain order by a window function over
+    the (timestamp, id) index.
+    """
+    rn = func.row_number().over(order_by=chain_order()).label("rn")
+    q = db.query(AuditLog.timestamp, AuditLog.id, rn)
+    if after is not None:
+        q = q.filter(after_position(*after))
+    numbered = q.subquery()
+    rows = (
+        db.query(numbered.c.timestamp, numbered.c.id)
+        .filter(numbered.c.rn > 1, (numbered.c.rn - 1) % segment_size == 0)
+        .order_by(numbered.c.rn)
+    )
+    return [(ts, log_id) for ts, log_id in rows]
+
+
+def _scan_segment(
+    after: Optional[Tuple],
+    start: Optional[Tuple],
+    stop: Optional[Tuple],
+    prev_hash: Optional[str],
+    bind: str = "primary",
+) -> ChainScan:
+    """
+    Runs in a worker with its own session on the caller's database (`bind`
+    is "primary" or "replica"). Scans records after `after` or from `start`
+    (inclusive) up to `stop` (exclusive). A segment with a `start` links to
+    the record just before it, which the worker looks up itself; otherwise
+    it links to `prev_hash`.
+    """
+    from db.session import get_engine
+
+    with Session(get_engine(bind)) as db:
+        q = db.query(*CHAIN_COLUMNS).order_by(*chain_order())
+        if after is not None:
+            q = q.filter(after_position(*after))
+        if start is not None:
+            q = q.filter(~before_position(*start))
+            prev = (
+                db.query(*CHAIN_COLUMNS)
+                .filter(before_position(*start))
+                .order_by(AuditLog.timestamp.desc(), AuditLog.id.desc())
+                .first()
+            )
+            prev_hash = _chain_hash(prev) if prev is not None else None
+        if stop is not None:
+            q = q.filter(before_position(*stop))
+
+        scan = ChainScan(prev_hash=prev_hash)
+        for _ in scan.run(q.yield_per(STREAM_CHUNK_SIZE)):
+            pass
+
+    # SQLAlchemy rows don't travel back across the process boundary
+    if scan.valid_last is not None:
+        scan.valid_last = ChainRow(*scan.valid_last)
+    return scan
+
+
+@timed("chain.scan")
+def scan_chain(
+    db: Session,
+    after: Optional[Tuple] = None,
+    prev_hash: Optional[str] = None,
+    workers: Optional[int] = None,
+    segment_size: Optional[int] = None,
+) -> ChainScan:
+    """
+    Scan the chain after the (timestamp, id) position `after` (from genesis
+    when None), linking the first record to `prev_hash`. Returns a merged
+    ChainScan identical to one sequential pass, which is what runs when
+    there is a single worker or the range fits in one segment.
+    """
+    workers = VALIDATE_WORKERS if workers is None else workers
+    segment_size = segment_size or SEGMENT_SIZE
+    starts = segment_starts(db, after, segment_size) if workers > 1 else []
+
+    if not starts:
+        scan = ChainScan(prev_hash=prev_hash)
+        for _ in scan.run(stream_chain_rows(db, after=after)):
+            pass
+        return scan
+
+    # Segment 0 keeps the caller's `after` bound and seed; the rest start at
+    # a boundary row and find their own predecessor
+    from db.session import bind_name
+    bind = bind_name(db)
+    bounds = [None] + starts + [None]
+    jobs = [
+        (after, None, bounds[1], prev_hash, bind) if i == 0 else (None, bounds[i], bounds[i + 1], None, bind)
+        for i in range(len(bounds) - 1)
+    ]
+
+    if workers == VALIDATE_WORKERS:
+        executor = _get_executor()
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    try:
+        futures = [executor.submit(_scan_segment, *job) for job in jobs]
+        merged = futures[0].result()
+        for f in futures[1:]:
+            merged.merge(f.result())
+    finally:
+        if executor is not _executor:
+            executor.shutdown()
+    return merged
@@ -0,0 +1,180 @@
+import datetime
+import os
+import threading
+from typing import Optional
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from models.tables import AuditLog, RechainJob
+from crypto.chain_head import locked_head
+from crypto.chain_checkpoint import rewind_checkpoint
+from crypto.validate_chain import (
+    CHAIN_COLUMNS,
+    GENESIS_HASH,
+    _chain_hash,
+    after_position,
+    before_position,
+    chain_order,
+)
+
+# Rechain reads only the chain columns, a chunk at a time, and writes each
+# chunk's changed hashes with one executemany UPDATE in its own short
+# transaction under the append lock — appends interleave between chunks.
+# record_hash never feeds into _chain_hash, so rewriting it can't disturb
+# the tail that concurrent appends link to.
+CHUNK_SIZE = int(os.getenv("RECHAIN_CHUNK_SIZE", "5000"))
+
+_run_lock = threading.Lock()   # one rechain at a time per process
+
+
+class RechainBusy(Exception):
+    pass
+
+
+def _session():
+    # Imported lazily: models.database imports this package at startup
+    from models.database import SessionLocal
+    return SessionLocal()
+
+
+def create_job(db: Session, from_id: Optional[int] = None) -> RechainJob:
+    """Record a new job starting at record `from_id` (inclusive), or at genesis."""
+    job = RechainJob(status="pending", from_log_id=from_id, processed=0, rewritten=0)
+    q = db.query(func.count(AuditLog.id))
+    if from_id is not None:
+        start = db.query(AuditLog.timestamp).filter(AuditLog.id == from_id).first()
+        if start is None:
+            raise LookupError(f"Log {from_id} not found")
+        job.from_timestamp = start.timestamp
+        q = q.filter(~before_position(start.timestamp, from_id))
+    job.total = q.scalar()
+    db.add(job)
+    db.commit()
+    return job
+
+
+def latest_job(db: Session, unfinished: bool = False) -> Optional[RechainJob]:
+    """
+    The newest job. With unfinished=True, None unless that job has yet to
+    complete: an older failed run was superseded by whatever ran after it,
+    and resuming it would replay repairs from a stale cursor.
+    """
+    job = db.query(RechainJob).order_by(RechainJob.id.desc()).first()
+    if unfinished and job is not None and job.status == "completed":
+        return None
+    return job
+
+
+def job_to_dict(job: RechainJob) -> dict:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "from_log_id": job.from_log_id,
+        "last_log_id": job.last_log_id,
+        "total": job.total,
+        "processed": job.processed,
+        "rewritten": job.rewritten,
+        "error": job.error,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "active": job.status == "running" and _run_lock.locked(),
+    }
+
+
+def _next_chunk(db: Session, job: RechainJob, chunk_size: int):
+    q = db.query(*CHAIN_COLUMNS).order_by(*chain_order())
+    if job.last_log_id is not None:
+        q = q.filter(after_position(job.last_timestamp, job.last_log_id))
+    elif job.from_log_id is not None:
+        q = q.filter(~before_position(job.from_timestamp, job.from_log_id))
+    return q.limit(chunk_size).all()
+
+
+def _rechain_chunk(db: Session, job: RechainJob, chunk_size: int) -> bool:
+    """Rewrite one chunk and move the cursor past it. False once nothing is left."""
+    rows = _next_chunk(db, job, chunk_size)
+    now = datetime.datetime.utcnow()
+    if not rows:
+        job.status = "completed"
+        job.updated_at = job.finished_at = now
+        return False
+
+    first = rows[0]
+    if job.processed == 0:
+        # Everything from here on may change, so it has to be re-validated
+        rewind_checkpoint(db, first)
+    # Seed from whatever precedes the chunk now — it may have been deleted
+    # or modified away since the previous chunk
+    prev = (
+        db.query(*CHAIN_COLUMNS)
+        .filter(before_position(first.timestamp, first.id))
+        .order_by(AuditLog.timestamp.desc(), AuditLog.id.desc())
+        .first()
+    )
+    expected = GENESIS_HASH if prev is None else _chain_hash(prev)
+
+    changes = []
+    for row in rows:
+        if row.record_hash != expected:
+            changes.append({"id": row.id, "record_hash": expected})
+        expected = _chain_hash(row)
+    if changes:
+        db.execute(update(AuditLog), changes)
+
+    job.processed += len(rows)
+    job.rewritten += len(changes)
+    job.last_log_id = rows[-1].id
+    job.last_timestamp = rows[-1].timestamp
+    job.updated_at = now
+    return True
+
+
+def _run(job_id: int, chunk_size: int):
+    db = _session()
+    try:
+        job = db.get(RechainJob, job_id)
+        job.status = "running"
+        job.error = None
+        db.commit()
+        more = True
+        while more:
+            with locked_head(db):
+                more = _rechain_chunk(db, job, chunk_size)
+        return job_to_dict(job)
+    except Exception as e:
+        db.rollback()
+        job = db.get(RechainJob, job_id)
+        if job is not None:
+            job.status = "failed"
+            job.error = str(e)
+            job.updated_at = datetime.datetime.utcnow()
+            db.commit()
+        raise
+    finally:
+        db.close()
+
+
+def run_job(job_id: int, chunk_size: int = None) -> dict:
+    """Run (or resume) a job to completion in the calling thread."""
+    if not _run_lock.acquire(blocking=False):
+        raise RechainBusy()
+    try:
+        return _run(job_id, chunk_size or CHUNK_SIZE)
+    finally:
+        _run_lock.release()
+
+
+def start_job_thread(job_id: int, chunk_size: int = None):
+    """Run a job in a background thread; progress is in rechain_jobs."""
+    if not _run_lock.acquire(blocking=False):
+        raise RechainBusy()
+
+    def target():
+        try:
+            _run(job_id, chunk_size or CHUNK_SIZE)
+        except Exception as e:
+            print(f"[!] Rechain job {job_id} failed: {e}")
+        finally:
+            _run_lock.release()
+
+    threading.Thread(target=target, name=f"rechain-{job_id}", daemon=True).start()
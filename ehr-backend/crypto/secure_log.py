@@ -1,45 +1,79 @@
-import os
 import json
 import hashlib
+import os
+import threading
 from base64 import b64encode
 from datetime import datetime
 from Crypto.Cipher import AES, PKCS1_OAEP
-from Crypto.PublicKey import RSA
 from Crypto.Random import get_random_bytes
 from crypto.generate_keys import generate_keys
+from crypto import key_cache, data_keys
+from crypto.keystore import KeyNotFound
+from utils.metrics import span, timed
+
+# Envelope format (v2) by default; set ENVELOPE_ENCRYPTION=0 to write the
+# original per-record RSA format
+ENVELOPE_ENCRYPTION = os.getenv("ENVELOPE_ENCRYPTION", "1") != "0"
 
-_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_keygen_lock = threading.Lock()
 
 
-def _public_key_path(user_id: str) -> str:
-    return os.path.join(_BACKEND_DIR, "public_keys", f"{user_id}.pem")
+def _recipient_public_key(recipient: str):
+    try:
+        return key_cache.get_public_key(recipient)
+    except KeyNotFound:
+        pass
+    # Serialize first-time generation so parallel encrypts (e.g. /add-logs)
+    # can't each write a different keypair for the same recipient
+    with _keygen_lock:
+        try:
+            return key_cache.get_public_key(recipient)
+        except KeyNotFound:
+            print(f"[!] Public key for '{recipient}' not found — generating...")
+            generate_keys(recipient)
+    return key_cache.get_public_key(recipient)
 
 
+@timed("encrypt_log")
 def encrypt_log(log_data: dict, recipient_user_id: str = None) -> dict:
     """
     Hybrid RSA-AES encryption of log_data.
     recipient_user_id defaults to the doctor (user_id) so the doctor's public
     key is used — meaning only the doctor's private key can decrypt their logs.
+
+    In the envelope format the AES key is derived from the recipient's
+    current epoch data key and the record nonce, so no RSA operation runs per
+    record and encrypted_aes_key is left empty.
     """
     recipient = recipient_user_id or log_data.get("user_id")
-    pubkey_path = _public_key_path(recipient)
 
     # Auto-generate keys if this is the first time we've seen this user
-    if not os.path.exists(pubkey_path):
-        print(f"[!] Public key for '{recipient}' not found — generating...")
-        generate_keys(recipient)
+    with span("encrypt.public_key"):
+        pubkey = _recipient_public_key(recipient)
 
-    log_json = json.dumps(log_data, default=str)
+    with span("encrypt.serialize"):
+        log_json = json.dumps(log_data, default=str)
 
-    # AES-128 EAX mode encryption
-    aes_key = get_random_bytes(16)
-    cipher_aes = AES.new(aes_key, AES.MODE_EAX)
-    ciphertext, tag = cipher_aes.encrypt_and_digest(log_json.encode())
+    if ENVELOPE_ENCRYPTION:
+        with span("encrypt.data_key"):
+            data_key_id, data_key = data_keys.current_data_key(recipient, pubkey)
+        nonce = get_random_bytes(16)
+        aes_key = data_keys.derive_record_key(data_key, nonce)
+        cipher_aes = AES.new(aes_key, AES.MODE_EAX, nonce=nonce)
+        encrypted_aes_key = None
+        enc_version = data_keys.ENC_VERSION_ENVELOPE
+    else:
+        aes_key = get_random_bytes(16)
+        cipher_aes = AES.new(aes_key, AES.MODE_EAX)
+        # RSA-encrypt the AES key with recipient's public key
+        with span("encrypt.rsa_wrap"):
+            encrypted_aes_key = PKCS1_OAEP.new(pubkey).encrypt(aes_key)
+        data_key_id = None
+        enc_version = data_keys.ENC_VERSION_RSA
 
-    # RSA-encrypt the AES key with recipient's public key
-    with open(pubkey_path, "rb") as f:
-        pubkey = RSA.import_key(f.read())
-    encrypted_aes_key = PKCS1_OAEP.new(pubkey).encrypt(aes_key)
+    # AES-128 EAX mode encryption
+    with span("encrypt.aes"):
+        ciphertext, tag = cipher_aes.encrypt_and_digest(log_json.encode())
 
     # SHA-256 integrity hash (used for the audit chain)
     record_hash = hashlib.sha256(
@@ -52,4 +86,6 @@ def encrypt_log(log_data: dict, recipient_user_id: str = None) -> dict:
         "nonce": b64encode(cipher_aes.nonce).decode(),
         "tag": b64encode(tag).decode(),
         "record_hash": record_hash,
+        "enc_version": enc_version,
+        "data_key_id": data_key_id,
     }
\ No newline at end of file
@@ -1,6 +1,59 @@
 import hashlib
-from typing import List, Tuple
+import os
+from collections import namedtuple
+from typing import Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
 from models.tables import AuditLog
+from utils.metrics import timed
+
+# record_hash of the first record in the chain
+GENESIS_HASH = hashlib.sha256(b"GENESIS").hexdigest()
+
+STREAM_CHUNK_SIZE = int(os.getenv("CHAIN_STREAM_CHUNK_SIZE", "5000"))
+# Cap on broken ids kept for the response so a badly damaged chain can't
+# grow memory with table size; the full count is still reported.
+MAX_REPORTED_BROKEN = int(os.getenv("CHAIN_MAX_REPORTED_BROKEN", "1000"))
+
+# Everything _chain_hash and the link check need — never the encrypted blobs
+CHAIN_COLUMNS = (
+    AuditLog.id,
+    AuditLog.user_id,
+    AuditLog.patient_id,
+    AuditLog.action,
+    AuditLog.timestamp,
+    AuditLog.record_hash,
+)
+
+
+# Plain, picklable stand-in for a CHAIN_COLUMNS row
+ChainRow = namedtuple("ChainRow", "id user_id patient_id action timestamp record_hash")
+
+
+def chain_order():
+    """ORDER BY clause for walking the chain from genesis to tail."""
+    return (AuditLog.timestamp, AuditLog.id)
+
+
+def after_position(timestamp, log_id):
+    """Filter for records strictly after (timestamp, id) in chain order."""
+    return or_(
+        AuditLog.timestamp > timestamp,
+        and_(AuditLog.timestamp == timestamp, AuditLog.id > log_id),
+    )
+
+
+def before_position(timestamp, log_id):
+    """Filter for records strictly before (timestamp, id) in chain order."""
+    return or_(
+        AuditLog.timestamp < timestamp,
+        and_(AuditLog.timestamp == timestamp, AuditLog.id < log_id),
+    )
+
+
+def chain_preimage(log) -> str:
+    """The stable fields of a log that the chain (and the Merkle index) commit to."""
+    return f"{log.id}|{log.user_id}|{log.patient_id}|{log.action}|{log.timestamp.isoformat()}"
 
 
 def _chain_hash(log: AuditLog) -> str:
@@ -8,10 +61,77 @@ def _chain_hash(log: AuditLog) -> str:
     Compute a deterministic hash of a log's stable fields.
     This is what gets stored as the NEXT log's record_hash to form the chain.
     """
-    raw = f"{log.id}|{log.user_id}|{log.patient_id}|{log.action}|{log.timestamp.isoformat()}"
-    return hashlib.sha256(raw.encode()).hexdigest()
+    return hashlib.sha256(chain_preimage(log).encode()).hexdigest()
+
 
+def stream_chain_rows(db: Session, after: Optional[Tuple] = None, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Yield the chain columns of every record in chain order, optionally only
+    those after a (timestamp, id) position. Rows are fetched in chunks through
+    a server-side cursor where the driver supports one, so memory stays flat.
+    """
+    q = db.query(*CHAIN_COLUMNS).order_by(*chain_order())
+    if after is not None:
+        q = q.filter(after_position(*after))
+    return q.yield_per(chunk_size)
 
+
+class ChainScan:
+    """
+    Running state of a single pass over the chain. Feed it records in chain
+    order; it only ever holds the previous record's chain hash.
+    """
+
+    def __init__(self, prev_hash: Optional[str] = None):
+        # None means "start of the chain" — the genesis record isn't checked
+        self.expected = prev_hash
+        self.count = 0
+        self.broken_count = 0
+        self.broken_ids: List[int] = []
+        # Last record of the unbroken prefix, and how many records it spans
+        self.valid_last = None
+        self.valid_count = 0
+
+    def feed(self, log) -> bool:
+        """Check one record against its predecessor. Returns True if broken."""
+        broken = self.expected is not None and log.record_hash != self.expected
+        if broken:
+            self.broken_count += 1
+            if len(self.broken_ids) < MAX_REPORTED_BROKEN:
+                self.broken_ids.append(log.id)
+        elif self.broken_count == 0:
+            self.valid_last = log
+            self.valid_count = self.count + 1
+        self.count += 1
+        self.expected = _chain_hash(log)
+        return broken
+
+    def merge(self, part: "ChainScan") -> None:
+        """
+        Append the result of scanning the segment that directly follows this
+        one. `part` must have been seeded with this scan's final chain hash.
+        """
+        if self.broken_count == 0 and part.valid_count:
+            self.valid_last = part.valid_last
+            self.valid_count = self.count + part.valid_count
+        self.broken_count += part.broken_count
+        room = MAX_REPORTED_BROKEN - len(self.broken_ids)
+        self.broken_ids.extend(part.broken_ids[:max(room, 0)])
+        self.count += part.count
+        self.expected = part.expected
+
+    def run(self, logs: Iterable) -> Iterator[int]:
+        """Consume `logs`, yielding each broken record id as it is found."""
+        for log in logs:
+            if self.feed(log):
+                yield log.id
+
+    @property
+    def is_valid(self) -> bool:
+        return self.broken_count == 0
+
+
+@timed("validate_log_chain")
 def validate_log_chain(logs: List[AuditLog]) -> Tuple[bool, List[int]]:
     """
     Validates the blockchain-style hash chain across all logs.
@@ -26,13 +146,49 @@ def validate_log_chain(logs: List[AuditLog]) -> Tuple[bool, List[int]]:
 
     # Sort by timestamp then id to get deterministic chain order
     sorted_logs = sorted(logs, key=lambda l: (l.timestamp, l.id))
-    broken_ids = []
+    broken_ids = list(ChainScan().run(sorted_logs))
+    return len(broken_ids) == 0, broken_ids
+
+def _main(argv=None) -> int:
+    """python -m crypto.validate_chain [--workers N] [--segment-size N] [--incremental]"""
+    import argparse
+    import json
+    import time
+
+    parser = argparse.ArgumentParser(description="Validate the audit log hash chain.")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CHAIN_VALIDATE_WORKERS)")
+    parser.add_argument("--segment-size", type=int, default=None, help="records per worker segment")
+    parser.add_argument("--incremental", action="store_true", help="start at the checkpoint and advance it")
+    args = parser.parse_args(argv)
+
+    # Imported here so `python -m` doesn't load this module twice at import time
+    from models.database import SessionLocal
+    from crypto import parallel_chain
+    from crypto.chain_checkpoint import validate_incremental
+
+    if args.workers is not None:
+        parallel_chain.VALIDATE_WORKERS = args.workers
+    if args.segment_size is not None:
+        parallel_chain.SEGMENT_SIZE = args.segment_size
+
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        if args.incremental:
+            result = validate_incremental(db)
+        else:
+            # Read-only full scan; the checkpoint is left alone
+            scan = parallel_chain.scan_chain(db)
+            result = {
+                "valid": scan.is_valid,
+                "invalid_log_ids": scan.broken_ids,
+                "invalid_count": scan.broken_count,
+                "total_records": scan.count,
+            }
+    parallel_chain.shutdown()
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    print(json.dumps(result))
+    return 0 if result["valid"] else 1
 
-    for i in range(1, len(sorted_logs)):
-        prev = sorted_logs[i - 1]
-        curr = sorted_logs[i]
-        expected = _chain_hash(prev)
-        if curr.record_hash != expected:
-            broken_ids.append(curr.id)
 
-    return len(broken_ids) == 0, broken_ids
\ No newline at end of file
+if __name__ == "__main__":
+    raise SystemExit(_main())
@@ -1,7 +1,12 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import threading
+import time
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 from dotenv import load_dotenv
+from utils import metrics
 
 # Load environment variables from .env (for local dev)
 load_dotenv()
@@ -11,5 +16,207 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("❌ DATABASE_URL is not set. Please check your .env file or environment variables.")
 
-engine = create_engine(DATABASE_URL)
+# Optional streaming replica for the heavy read-only routes (/logs, /export,
+# /validate, /chat, /faq-query). Reads fall back to the primary while the
+# replica is unreachable or lagging more than REPLICA_MAX_LAG_SECONDS.
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") != "0"
+STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))   # 0 = no limit
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "10"))
+REPLICA_CHECK_SECONDS = float(os.getenv("DB_REPLICA_CHECK_SECONDS", "5"))
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    label = "primary"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe(f"db.pool_checkout.{self.label}", time.perf_counter() - started)
+
+    def recreate(self):
+        # dispose() swaps in a fresh pool; keep its label
+        pool = super().recreate()
+        pool.label = self.label
+        return pool
+
+
+def create_db_engine(url: str, label: str = "primary"):
+    """Engine with pool, pre-ping, recycle and statement timeout from the environment."""
+    parsed = make_url(url)
+    kwargs = {"pool_pre_ping": POOL_PRE_PING}
+    # In-memory SQLite lives in one connection; leave its pool alone
+    if not (parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")):
+        kwargs.update(
+            poolclass=TimedQueuePool,
+            pool_size=POOL_SIZE,
+            max_overflow=POOL_MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+            pool_recycle=POOL_RECYCLE,
+        )
+    if parsed.get_backend_name() == "postgresql" and STATEMENT_TIMEOUT_MS:
+        kwargs["connect_args"] = {"options": f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"}
+
+    new_engine = create_engine(url, **kwargs)
+    if isinstance(new_engine.pool, TimedQueuePool):
+        new_engine.pool.label = label
+    metrics.instrument_engine(new_engine)
+    return new_engine
+
+
+engine = create_db_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+replica_engine = create_db_engine(DATABASE_REPLICA_URL, "replica") if DATABASE_REPLICA_URL else None
+ReplicaSessionLocal = (
+    sessionmaker(autocommit=False, autoflush=False, bind=replica_engine) if replica_engine is not None else None
+)
+
+metrics.instrument_sessions(Session)
+
+_ENGINES = {"primary": engine, "replica": replica_engine}
+
+
+def get_engine(name: str = "primary"):
+    """Engine by name, for worker processes that rebuild their own sessions."""
+    return _ENGINES.get(name) or engine
+
+
+def bind_name(db: Session) -> str:
+    return "replica" if replica_engine is not None and db.get_bind() is replica_engine else "primary"
+
+
+def dispose_all(close: bool = True):
+    for e in _ENGINES.values():
+        if e is not None:
+            e.dispose(close=close)
+
+
+# ─── Replica health ──────────────────────────────────────────────────────────
+
+# Caught up when everything received has been replayed; otherwise the age
+# of the last replayed transaction. A primary reports zero.
+_PG_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+_replica_lock = threading.Lock()
+_replica_state = {"healthy": None, "lag_seconds": None, "checked_at": 0.0, "error": None}
+_read_stats = {"replica_reads": 0, "primary_fallbacks": 0, "health_checks": 0, "marked_down": 0}
+
+
+def _probe_replica():
+    with replica_engine.connect() as conn:
+        if replica_engine.dialect.name == "postgresql":
+            return float(conn.execute(_PG_LAG_SQL).scalar() or 0)
+        conn.execute(text("SELECT 1"))
+        return 0.0
+
+
+def replica_healthy() -> bool:
+    """Reachable and within the lag budget; re-probed every REPLICA_CHECK_SECONDS."""
+    if replica_engine is None:
+        return False
+    now = time.monotonic()
+    with _replica_lock:
+        if _replica_state["healthy"] is not None and now - _replica_state["checked_at"] < REPLICA_CHECK_SECONDS:
+            return _replica_state["healthy"]
+        # Claim this probe so concurrent requests keep using the last answer
+        _replica_state["checked_at"] = now
+        _read_stats["health_checks"] += 1
+        was = _replica_state["healthy"]
+
+    try:
+        lag, error = _probe_replica(), None
+        healthy = lag <= REPLICA_MAX_LAG_SECONDS
+        if not healthy:
+            error = f"lag {lag:.1f}s exceeds {REPLICA_MAX_LAG_SECONDS:g}s"
+    except Exception as e:
+        lag, error, healthy = None, str(e).splitlines()[0], False
+
+    with _replica_lock:
+        _replica_state.update(healthy=healthy, lag_seconds=lag, error=error)
+    if healthy != was:
+        print(f"[!] Read replica {'available' if healthy else 'unavailable'}" + (f": {error}" if error else ""))
+    return healthy
+
+
+def _mark_replica_down(context):
+    # A dropped connection mid-request: stop routing reads there until the
+    # next probe succeeds instead of failing every request until then
+    if context.is_disconnect:
+        with _replica_lock:
+            if _replica_state["healthy"]:
+                _read_stats["marked_down"] += 1
+                print("[!] Read replica connection lost — reading from primary")
+            _replica_state.update(healthy=False, checked_at=time.monotonic(), error="disconnected")
+
+
+if replica_engine is not None:
+    event.listen(replica_engine, "handle_error", _mark_replica_down)
+
+
+def read_session() -> Session:
+    """A session for read-only work: the replica when healthy, else the primary."""
+    if replica_healthy():
+        with _replica_lock:
+            _read_stats["replica_reads"] += 1
+        return ReplicaSessionLocal()
+    if replica_engine is not None:
+        with _replica_lock:
+            _read_stats["primary_fallbacks"] += 1
+    return SessionLocal()
+
+
+# ─── FastAPI dependencies ────────────────────────────────────────────────────
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db():
+    """Like get_db, but routed to the read replica when one is usable."""
+    db = read_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _pool_stats(e) -> dict:
+    pool = e.pool
+    if not isinstance(pool, QueuePool):
+        return {}
+    return {"size": pool.size(), "checked_out": pool.checkedout(), "overflow": max(0, pool.overflow())}
+
+
+def stats() -> dict:
+    with _replica_lock:
+        replica = {
+            "configured": replica_engine is not None,
+            "healthy": bool(_replica_state["healthy"]),
+            "lag_seconds": _replica_state["lag_seconds"] or 0.0,
+            "max_lag_seconds": REPLICA_MAX_LAG_SECONDS,
+            **_read_stats,
+        }
+    out = {"pool": _pool_stats(engine), "replica": replica}
+    if replica_engine is not None:
+        out["replica_pool"] = _pool_stats(replica_engine)
+    return out
@@ -1,18 +1,41 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from sqlalchemy.orm import Session
 from models.database import init_db, get_db
 from models.tables import User
 from models.schemas import RegisterUser, LoginUser
-from utils.crypto import verify_password, hash_password
+from utils.crypto import (
+    verify_password_async,
+    hash_password_async,
+    shutdown_password_pool,
+    PasswordPoolBusy,
+    password_pool_stats,
+)
+from utils import answer_cache, llm_gate, metrics
 from crypto.generate_keys import generate_keys
+from crypto import key_cache, key_pool, keystore, bulk_decrypt, parallel_chain
+from db import session as db_session
 from routers import audit
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI(title="Secure EHR API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep RSA keypairs ready so /api/register doesn't block on keygen
+    key_pool.start()
+    yield
+    key_pool.stop()
+    shutdown_password_pool()
+    bulk_decrypt.shutdown()
+    parallel_chain.shutdown()
+
+
+app = FastAPI(title="Secure EHR API", version="1.0.0", lifespan=lifespan)
 
 _base_origins = [
     "http://localhost:3000",
@@ -29,8 +52,19 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so route latency includes CORS handling
+app.add_middleware(metrics.MetricsMiddleware)
+
+metrics.register_collector("db", db_session.stats)
+metrics.register_collector("key_cache", key_cache.stats)
+metrics.register_collector("keystore", keystore.stats)
+metrics.register_collector("key_pool", key_pool.stats)
+metrics.register_collector("password_pool", password_pool_stats)
+metrics.register_collector("chat_cache", answer_cache.stats)
+metrics.register_collector("chat_llm", llm_gate.stats)
 
 init_db()
+keystore.ensure_keystore()
 app.include_router(audit.router, prefix="/api/audit")
 
 
@@ -39,31 +73,61 @@ def index():
     return {"message": "Secure EHR API is running."}
 
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+async def _password_job(coro):
+    try:
+        return await coro
+    except PasswordPoolBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy — please try again shortly",
+            headers={"Retry-After": "1"},
+        )
+
+
+# Async handlers: bcrypt runs in the password process pool and the DB work in
+# the threadpool, so neither blocks the event loop.
 @app.post("/api/register")
-def register_user(user: RegisterUser, db: Session = Depends(get_db)):
-    existing = db.query(User).filter(User.user_id == user.user_id).first()
+async def register_user(user: RegisterUser, db: Session = Depends(get_db)):
+    existing = await run_in_threadpool(
+        lambda: db.query(User).filter(User.user_id == user.user_id).first()
+    )
     if existing:
         raise HTTPException(status_code=400, detail="User ID already taken")
 
-    hashed_pw = hash_password(user.password)
-    new_user = User(user_id=user.user_id, password=hashed_pw, role=user.role)
-    db.add(new_user)
-    db.commit()
+    with metrics.span("password.hash"):
+        hashed_pw = await _password_job(hash_password_async(user.password))
 
-    # Generate RSA keys for every user — patients are encryption recipients too
-    generate_keys(user.user_id)
+    def _create():
+        new_user = User(user_id=user.user_id, password=hashed_pw, role=user.role)
+        db.add(new_user)
+        db.commit()
 
+        # Generate RSA keys for every user — patients are encryption recipients too
+        generate_keys(user.user_id)
+
+    await run_in_threadpool(_create)
     return {"message": f"User {user.user_id} registered successfully."}
 
 
 @app.post("/api/login")
-def login_user(user: LoginUser, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(
-        User.user_id == user.user_id,
-        User.role == user.role
-    ).first()
-
-    if not db_user or not verify_password(user.password, db_user.password):
+async def login_user(user: LoginUser, db: Session = Depends(get_db)):
+    db_user = await run_in_threadpool(
+        lambda: db.query(User).filter(
+            User.user_id == user.user_id,
+            User.role == user.role
+        ).first()
+    )
+
+    valid = False
+    if db_user:
+        with metrics.span("password.verify"):
+            valid = await _password_job(verify_password_async(user.password, db_user.password))
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials or role mismatch")
 
     # Frontend checks res.data.user_id to confirm login — must return it
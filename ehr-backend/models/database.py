@@ -1,16 +1,18 @@
-from db.session import engine
-from sqlalchemy.orm import sessionmaker
-from models.tables import Base
-
-# ✅ Define SessionLocal
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+from db.session import engine, SessionLocal, get_db, get_read_db, read_session   # one engine, one SessionLocal
+from models.migrations import upgrade
+from models.rollups import ensure_rollups
+from models.search import ensure_search
+from models.patients import ensure_patients
+from models.versions import ensure_current_records
+from crypto.merkle import ensure_tree
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    # create_all plus the columns/indexes it can't add to existing tables
+    upgrade(engine)
+    with SessionLocal() as db:
+        ensure_patients(db)
+        # Before the rollups and search index, which only cover current records
+        ensure_current_records(db)
+        ensure_rollups(db)
+        ensure_tree(db)
+        ensure_search(db)
@@ -0,0 +1,98 @@
+import warnings
+from sqlalchemy import exc, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex
+from models.tables import Base
+
+
+def _add_missing_columns(engine: Engine, insp):
+    # Only additive, nullable columns are handled — anything else needs a
+    # hand-written migration
+    for table in Base.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or column.primary_key:
+                continue
+            col_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {col_type}'))
+            print(f"[migrate] added column {table.name}.{column.name}")
+
+
+def _index_names(engine: Engine, insp, table_name: str) -> set:
+    if engine.dialect.name == "sqlite":
+        # The SQLite reflector skips expression indexes
+        with engine.connect() as conn:
+            rows = conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :t"),
+                {"t": table_name},
+            )
+            return {r[0] for r in rows}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", exc.SAWarning)
+        return {ix["name"] for ix in insp.get_indexes(table_name)}
+
+
+def _create_missing_indexes(engine: Engine, insp):
+    postgres = engine.dialect.name == "postgresql"
+    for table in Base.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        existing = _index_names(engine, insp, table.name)
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            ddl = str(CreateIndex(index).compile(dialect=engine.dialect))
+            ddl = ddl.replace("INDEX ", "INDEX IF NOT EXISTS ", 1)
+            if postgres:
+                # Build without blocking writes on a live table; CONCURRENTLY
+                # can't run inside a transaction block
+                ddl = ddl.replace("INDEX ", "INDEX CONCURRENTLY ", 1)
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    conn.execute(text(ddl))
+            else:
+                with engine.begin() as conn:
+                    conn.execute(text(ddl))
+            print(f"[migrate] created index {index.name}")
+
+
+# Indexes the models no longer declare; nothing reads through them any more,
+# so they only cost writes. Patient reads go through patient_ref (see
+# models.patients) instead of lower(patient_name).
+RETIRED_INDEXES = {
+    "audit_logs": ("ix_audit_logs_patient_name_lower",),
+}
+
+
+def _drop_retired_indexes(engine: Engine, insp):
+    postgres = engine.dialect.name == "postgresql"
+    for table_name, names in RETIRED_INDEXES.items():
+        if not insp.has_table(table_name):
+            continue
+        existing = _index_names(engine, insp, table_name)
+        for name in names:
+            if name not in existing:
+                continue
+            if postgres:
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            else:
+                with engine.begin() as conn:
+                    conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            print(f"[migrate] dropped index {name}")
+
+
+def upgrade(engine: Engine):
+    """
+    Bring an existing database up to the current models. create_all() only
+    creates missing tables, so new columns and indexes on tables that already
+    exist are added here, and retired indexes dropped. Safe to run on every
+    startup.
+    """
+    Base.metadata.create_all(bind=engine)
+    insp = inspect(engine)
+    _add_missing_columns(engine, insp)
+    _create_missing_indexes(engine, insp)
+    _drop_retired_indexes(engine, insp)
@@ -0,0 +1,149 @@
+from types import SimpleNamespace
+from sqlalchemy import false, func, or_, select, text
+from sqlalchemy.orm import Session
+from models.tables import AuditLog, Patient, PatientAlias
+
+# Patient identity. Each distinct patient_id gets a row in `patients`, every
+# name it was recorded under an alias, and every audit log the integer key of
+# its patient. A patient-scoped read used to filter
+#   patient_id = :u OR lower(patient_name) = lower(:u)
+# which no single index serves; now it resolves :u against the two small
+# indexed tables first and reads audit_logs by (patient_ref, timestamp).
+
+
+def normalize_name(name) -> str:
+    return (name or "").strip().lower()
+
+
+# ─── Maintenance ─────────────────────────────────────────────────────────────
+
+def link_patients(db: Session, logs):
+    """
+    Point each log at its patient, creating the patient and name aliases on
+    first sight. Call inside the writing transaction, before the logs are
+    flushed (the chain append lock already serializes writers).
+    """
+    logs = [log for log in logs if log.patient_id]
+    if not logs:
+        return
+    ids = {log.patient_id for log in logs}
+    patients = {p.patient_id: p for p in db.query(Patient).filter(Patient.patient_id.in_(ids))}
+    for log in logs:
+        patient = patients.get(log.patient_id)
+        if patient is None:
+            patient = patients[log.patient_id] = Patient(patient_id=log.patient_id)
+            db.add(patient)
+        if normalize_name(log.patient_name):
+            patient.name = log.patient_name.strip()
+    db.flush()   # ids for new patients
+
+    wanted = {
+        (normalize_name(log.patient_name), patients[log.patient_id].id)
+        for log in logs if normalize_name(log.patient_name)
+    }
+    if wanted:
+        known = set(
+            db.query(PatientAlias.alias, PatientAlias.patient_ref).filter(
+                PatientAlias.patient_ref.in_({ref for _, ref in wanted}),
+                PatientAlias.alias.in_({alias for alias, _ in wanted}),
+            )
+        )
+        db.add_all(PatientAlias(alias=alias, patient_ref=ref) for alias, ref in wanted - known)
+
+    for log in logs:
+        log.patient_ref = patients[log.patient_id].id
+
+
+def backfill_patients(db: Session, chunk_size: int = 5000) -> int:
+    """
+    Create patients/aliases for every audit log without a patient_ref and
+    fill the column in, committing per id range. Safe to re-run; an
+    interrupted run carries on with the rows still missing it.
+    """
+    pending = AuditLog.patient_ref.is_(None) & AuditLog.patient_id.isnot(None) & (AuditLog.patient_id != "")
+
+    # Oldest name first, so a patient ends up with the latest one
+    pairs = (
+        db.query(AuditLog.patient_id, AuditLog.patient_name, func.max(AuditLog.timestamp).label("seen"))
+        .filter(pending)
+        .group_by(AuditLog.patient_id, AuditLog.patient_name)
+        .order_by("seen")
+        .all()
+    )
+    for start in range(0, len(pairs), chunk_size):
+        chunk = pairs[start:start + chunk_size]
+        link_patients(db, [SimpleNamespace(patient_id=pid, patient_name=name) for pid, name, _ in chunk])
+        db.commit()
+
+    lo, hi = db.query(func.min(AuditLog.id), func.max(AuditLog.id)).filter(pending).one()
+    if lo is None:
+        return 0
+    updated = 0
+    ref = select(Patient.id).where(Patient.patient_id == AuditLog.patient_id).scalar_subquery()
+    for start in range(lo, hi + 1, chunk_size):
+        updated += (
+            db.query(AuditLog)
+            .filter(pending, AuditLog.id >= start, AuditLog.id < start + chunk_size)
+            .update({AuditLog.patient_ref: ref}, synchronize_session=False)
+        )
+        db.commit()
+    return updated
+
+
+def ensure_patients(db: Session):
+    """Backfill patient_ref once for databases that predate it."""
+    missing = db.execute(text(
+        "SELECT 1 FROM audit_logs WHERE patient_ref IS NULL "
+        "AND patient_id IS NOT NULL AND patient_id != '' LIMIT 1"
+    )).first()
+    if missing is not None:
+        print("[patients] linking existing audit logs to patients")
+        backfill_patients(db)
+
+
+# ─── Lookup ──────────────────────────────────────────────────────────────────
+
+def find_patients(db: Session, patient_id: str = None, name: str = None):
+    """Patients whose canonical id is `patient_id` or who were recorded under `name`."""
+    conditions = []
+    if patient_id:
+        conditions.append(Patient.patient_id == patient_id)
+    if normalize_name(name):
+        conditions.append(Patient.id.in_(
+            select(PatientAlias.patient_ref).where(PatientAlias.alias == normalize_name(name))
+        ))
+    if not conditions:
+        return []
+    return db.query(Patient).filter(or_(*conditions)).order_by(Patient.id).all()
+
+
+def patient_filter(refs):
+    """AuditLog criterion for the given patient keys; matches nothing when empty."""
+    refs = list(refs)
+    if not refs:
+        return false()
+    if len(refs) == 1:
+        return AuditLog.patient_ref == refs[0]
+    return AuditLog.patient_ref.in_(refs)
+
+
+def _main(argv=None) -> int:
+    """python -m models.patients [--chunk-size N]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Link existing audit logs to the patients table.")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="rows per committed chunk")
+    args = parser.parse_args(argv)
+
+    from models.database import SessionLocal, engine
+    from models.migrations import upgrade
+
+    upgrade(engine)
+    with SessionLocal() as db:
+        updated = backfill_patients(db, args.chunk_size)
+    print(f"[patients] linked {updated} audit log(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main())
@@ -0,0 +1,174 @@
+import datetime
+from collections import Counter, namedtuple
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from models.tables import AuditLog, CurrentRecord, DashboardRollup
+
+# Only the fields the dashboard counts — taken before a modify mutates a row
+RollupView = namedtuple("RollupView", "user_id patient_id timestamp diagnosis medication")
+
+_SCALAR = ""
+
+
+def snapshot(log) -> RollupView:
+    return RollupView(
+        log.user_id, log.patient_id,
+        log.timestamp, log.diagnosis, log.medication,
+    )
+
+
+def week_start(ts: datetime.datetime) -> datetime.date:
+    """Sunday that starts ts's week — the same weeks Dashboard.js draws."""
+    day = ts.date()
+    return day - datetime.timedelta(days=(day.weekday() + 1) % 7)
+
+
+def _scopes(log):
+    return ["all", f"doctor:{log.user_id}", f"patient:{log.patient_id}"]
+
+
+def _keys(log):
+    diagnosis = (log.diagnosis or "").strip()
+    medication = (log.medication or "").strip()
+    for scope in _scopes(log):
+        yield scope, "records", _SCALAR
+        yield scope, "patient", log.patient_id or _SCALAR
+        if log.timestamp is not None:
+            yield scope, "week", week_start(log.timestamp).isoformat()
+        if diagnosis:
+            yield scope, "diagnosis", diagnosis
+        if medication:
+            yield scope, "medication", medication
+
+
+def _apply(db: Session, deltas: Counter):
+    deltas = {k: d for k, d in deltas.items() if d}
+    if not deltas:
+        return
+    rows = {
+        (r.scope, r.metric, r.bucket): r
+        for r in db.query(DashboardRollup).filter(
+            tuple_(DashboardRollup.scope, DashboardRollup.metric, DashboardRollup.bucket).in_(list(deltas))
+        )
+    }
+
+    # "patients" counts distinct patient buckets, so it moves only when a
+    # per-patient count crosses zero
+    patients = Counter()
+    for key, delta in deltas.items():
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = DashboardRollup(scope=key[0], metric=key[1], bucket=key[2], count=0)
+            db.add(row)
+        before = row.count
+        row.count += delta
+        if key[1] == "patient":
+            if before <= 0 < row.count:
+                patients[key[0]] += 1
+            elif row.count <= 0 < before:
+                patients[key[0]] -= 1
+        if row.count <= 0:
+            # Drop empty buckets so top-N and storage only see live values
+            if row in db.new:
+                db.expunge(row)
+            else:
+                db.delete(row)
+
+    if patients:
+        _apply(db, Counter({(scope, "patients", _SCALAR): d for scope, d in patients.items()}))
+
+
+def update_rollups(db: Session, added=(), removed=()):
+    """
+    Fold added/removed records into the counters. Call inside the writing
+    transaction (the chain append lock already serializes writers).
+    """
+    deltas = Counter()
+    for log in added:
+        deltas.update(_keys(log))
+    for log in removed:
+        deltas.subtract(_keys(log))
+    _apply(db, deltas)
+
+
+def rebuild_rollups(db: Session, chunk_size: int = 5000):
+    """Recompute every counter from the current records (backfill for existing data)."""
+    db.query(DashboardRollup).delete()
+    deltas = Counter()
+    cols = (
+        AuditLog.user_id, AuditLog.patient_id,
+        AuditLog.timestamp, AuditLog.diagnosis, AuditLog.medication,
+    )
+    current = db.query(*cols).join(CurrentRecord, CurrentRecord.log_id == AuditLog.id)
+    for row in current.yield_per(chunk_size):
+        deltas.update(_keys(row))
+
+    patients = Counter(scope for (scope, metric, _), n in deltas.items() if metric == "patient" and n > 0)
+    deltas.update({(scope, "patients", _SCALAR): n for scope, n in patients.items()})
+    db.bulk_insert_mappings(
+        DashboardRollup,
+        [{"scope": s, "metric": m, "bucket": b, "count": n} for (s, m, b), n in deltas.items() if n > 0],
+    )
+    db.commit()
+
+
+def ensure_rollups(db: Session):
+    """Backfill the counters once for databases that predate them."""
+    if db.query(DashboardRollup.id).first() is None and db.query(AuditLog.id).first() is not None:
+        print("[rollups] building dashboard rollups from existing audit logs")
+        rebuild_rollups(db)
+
+
+def _scope_rows(db: Session, scopes, metric, buckets=None):
+    q = db.query(DashboardRollup).filter(
+        DashboardRollup.scope.in_(scopes), DashboardRollup.metric == metric
+    )
+    if buckets is not None:
+        q = q.filter(DashboardRollup.bucket.in_(buckets))
+    return q
+
+
+def _combined(db: Session, plus, minus, metric, buckets=None) -> Counter:
+    counts = Counter()
+    for row in _scope_rows(db, plus, metric, buckets):
+        counts[row.bucket] += row.count
+    if minus:
+        for row in _scope_rows(db, minus, metric, buckets):
+            counts[row.bucket] -= row.count
+    return +counts
+
+
+def dashboard_summary(db: Session, plus, minus=(), weeks: int = 8, top: int = 5) -> dict:
+    """
+    Read the dashboard numbers for the union of `plus` scopes, minus the
+    `minus` scopes counted twice. A single scope reads a handful of indexed
+    rows; top-N comes straight off the (scope, metric, count) index.
+    """
+    this_week = week_start(datetime.datetime.utcnow())
+    week_keys = [(this_week - datetime.timedelta(weeks=w)).isoformat() for w in range(weeks - 1, -1, -1)]
+
+    def _top(metric):
+        if len(plus) == 1 and not minus:
+            rows = (
+                _scope_rows(db, plus, metric)
+                .order_by(DashboardRollup.count.desc(), DashboardRollup.bucket)
+                .limit(top)
+            )
+            return [{"label": r.bucket, "count": r.count} for r in rows]
+        counts = _combined(db, plus, minus, metric)
+        return [{"label": b, "count": n} for b, n in sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))[:top]]
+
+    total = sum(_combined(db, plus, minus, "records").values())
+    if len(plus) == 1 and not minus:
+        patients = sum(_combined(db, plus, minus, "patients").values())
+    else:
+        patients = len(_combined(db, plus, minus, "patient"))
+    week_counts = _combined(db, plus, minus, "week", week_keys)
+
+    return {
+        "total_records": total,
+        "unique_patients": patients,
+        "weekly": [{"week_start": w, "count": week_counts.get(w, 0)} for w in week_keys],
+        "top_diagnoses": _top("diagnosis"),
+        "top_medications": _top("medication"),
+    }
@@ -0,0 +1,167 @@
+import os
+import re
+from sqlalchemy import bindparam, column, func, literal_column, table, text
+from sqlalchemy.orm import Query, Session
+from models.tables import AuditLog
+
+# Inverted index over the free-text clinical fields. SQLite gets an FTS5
+# table keyed by the audit log id (rowid); Postgres a side table holding a
+# weighted tsvector per log behind a GIN index. Either way the writers call
+# index_logs()/unindex_logs() inside their transaction, like update_rollups.
+SEARCH_TABLE = "audit_search"
+SEARCH_FIELDS = ("notes", "diagnosis", "medication", "vitals")
+MAX_TERMS = 10
+# Only the newest matches in scope are scored. bm25/ts_rank_cd cost grows
+# with every matching row, so a term that hits half the table would
+# otherwise rank hundreds of thousands of rows per request.
+MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "2000"))
+
+# bm25 column weights, in SEARCH_FIELDS order: a hit in the diagnosis or
+# medication outranks one buried in the notes
+_FTS5_WEIGHTS = "1.0, 4.0, 3.0, 0.5"
+
+_PG_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce({diagnosis}, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce({medication}, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce({notes}, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce({vitals}, '')), 'C')"
+)
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def search_terms(q: str):
+    """Lower-cased word tokens of a user query (punctuation and operators dropped)."""
+    return _TERM.findall((q or "").lower())[:MAX_TERMS]
+
+
+def _match_expression(terms, postgres: bool) -> str:
+    """Every term must match; the last one as a prefix so partial words still hit."""
+    if postgres:
+        return " & ".join(terms[:-1] + [f"{terms[-1]}:*"])
+    return " ".join([f'"{t}"' for t in terms[:-1]] + [f'"{terms[-1]}"*'])
+
+
+# ─── Maintenance ─────────────────────────────────────────────────────────────
+
+def index_logs(db: Session, logs):
+    """(Re)index the searchable fields of flushed logs; safe for existing ids."""
+    rows = [
+        {"id": log.id, **{f: getattr(log, f) for f in SEARCH_FIELDS}}
+        for log in logs
+    ]
+    if not rows:
+        return
+    if _is_postgres(db):
+        document = _PG_DOCUMENT.format(**{f: f"CAST(:{f} AS text)" for f in SEARCH_FIELDS})
+        db.execute(
+            text(
+                f"INSERT INTO {SEARCH_TABLE} (log_id, document) VALUES (:id, {document}) "
+                "ON CONFLICT (log_id) DO UPDATE SET document = EXCLUDED.document"
+            ),
+            rows,
+        )
+        return
+    unindex_logs(db, [r["id"] for r in rows])
+    db.execute(
+        text(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_FIELDS)}) "
+            f"VALUES (:id, {', '.join(':' + f for f in SEARCH_FIELDS)})"
+        ),
+        rows,
+    )
+
+
+def unindex_logs(db: Session, log_ids):
+    log_ids = list(log_ids)
+    if not log_ids:
+        return
+    key = "log_id" if _is_postgres(db) else "rowid"
+    db.execute(
+        text(f"DELETE FROM {SEARCH_TABLE} WHERE {key} IN :ids").bindparams(bindparam("ids", expanding=True)),
+        {"ids": log_ids},
+    )
+
+
+def _create(db: Session):
+    if _is_postgres(db):
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+            "log_id INTEGER PRIMARY KEY REFERENCES audit_logs(id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        ))
+        db.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_document ON {SEARCH_TABLE} USING GIN (document)"
+        ))
+    else:
+        db.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            f"{', '.join(SEARCH_FIELDS)}, tokenize = 'porter unicode61')"
+        ))
+
+
+def rebuild_search(db: Session):
+    """Re-create the index from the current records (backfill for existing data)."""
+    db.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    current = "FROM audit_logs JOIN current_records ON current_records.log_id = audit_logs.id"
+    if _is_postgres(db):
+        db.execute(text(
+            f"INSERT INTO {SEARCH_TABLE} (log_id, document) "
+            f"SELECT id, {_PG_DOCUMENT.format(**{f: f for f in SEARCH_FIELDS})} {current}"
+        ))
+    else:
+        db.execute(text(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_FIELDS)}) "
+            f"SELECT id, {', '.join(SEARCH_FIELDS)} {current}"
+        ))
+    db.commit()
+
+
+def ensure_search(db: Session):
+    """Create the index if missing and backfill it once for databases that predate it."""
+    _create(db)
+    db.commit()
+    indexed = db.execute(text(f"SELECT 1 FROM {SEARCH_TABLE} LIMIT 1")).first()
+    has_logs = db.execute(text("SELECT 1 FROM audit_logs LIMIT 1")).first()
+    if indexed is None and has_logs is not None:
+        print("[search] building full-text index from existing audit logs")
+        rebuild_search(db)
+
+
+# ─── Query ───────────────────────────────────────────────────────────────────
+
+def match_subquery(db: Session, scoped: Query, terms, candidates: int = None):
+    """
+    (log_id, score) of the newest `candidates` logs in `scoped` (an AuditLog
+    query carrying the visibility filters) that match all `terms`; higher
+    score = better. The scope is applied before the cap, so a narrow scope
+    still gets its own best matches.
+    """
+    match = _match_expression(terms, _is_postgres(db))
+    if _is_postgres(db):
+        index = table(SEARCH_TABLE, column("log_id"), column("document"))
+        query = func.to_tsquery("english", match)
+        key = index.c.log_id
+        score = func.ts_rank_cd(index.c.document, query)
+        condition = index.c.document.op("@@")(query)
+    else:
+        index = table(SEARCH_TABLE, column("rowid"))
+        key = index.c.rowid
+        # bm25() is lower-is-better
+        score = literal_column(f"-bm25({SEARCH_TABLE}, {_FTS5_WEIGHTS})")
+        condition = text(f"{SEARCH_TABLE} MATCH :match").bindparams(match=match)
+    return (
+        scoped.order_by(None)
+        .with_entities(AuditLog.id.label("log_id"), score.label("score"))
+        .join(index, key == AuditLog.id)
+        .filter(condition)
+        # by the index key, not audit_logs.id: FTS5 then walks its doclist
+        # newest-first and stops at the limit instead of sorting every match
+        .order_by(key.desc())
+        .limit(candidates or MAX_CANDIDATES)
+        .subquery("matches")
+    )
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, String, Integer, DateTime, LargeBinary
+from sqlalchemy import Column, String, Integer, DateTime, LargeBinary, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 import datetime
+from sqlalchemy.orm import deferred
 
 Base = declarative_base()
 
@@ -11,6 +12,53 @@ class User(Base):
     password = Column(String)
     role = Column(String)
 
+class UserKey(Base):
+    """RSA keypair per user when KEYSTORE_BACKEND=db (see crypto.keystore)."""
+    __tablename__ = "user_keys"
+    user_id = Column(String, primary_key=True)
+    public_pem = Column(LargeBinary, nullable=False)
+    private_pem = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class DataKey(Base):
+    """
+    One RSA-wrapped data key per recipient per epoch. Per-record AES keys are
+    derived from it, so the RSA operation happens once per epoch rather than
+    once per record.
+    """
+    __tablename__ = "data_keys"
+    id = Column(Integer, primary_key=True)
+    recipient = Column(String, nullable=False, index=True)
+    wrapped_key = Column(LargeBinary, nullable=False)   # RSA-OAEP(recipient public key)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class Patient(Base):
+    """
+    One row per patient id seen in audit_logs. Patient-scoped reads resolve
+    the id/name they were given to these integer keys (see models.patients)
+    and then read audit_logs by patient_ref.
+    """
+    __tablename__ = "patients"
+    id = Column(Integer, primary_key=True)
+    patient_id = Column(String, nullable=False, unique=True)   # canonical id, as entered
+    name = Column(String, nullable=True)                       # latest name recorded for the patient
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class PatientAlias(Base):
+    """Normalized names a patient has been recorded under (lower-cased, trimmed)."""
+    __tablename__ = "patient_aliases"
+    id = Column(Integer, primary_key=True)
+    patient_ref = Column(Integer, ForeignKey("patients.id"), nullable=False)
+    alias = Column(String, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("alias", "patient_ref", name="uq_patient_aliases_alias_patient"),
+    )
+
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
     id = Column(Integer, primary_key=True, index=True)
@@ -23,17 +71,138 @@ class AuditLog(Base):
     notes = Column(String, nullable=True)       
 
     action = Column(String)                  
-    encrypted_data = Column(LargeBinary)
-    encrypted_aes_key = Column(LargeBinary)
-    nonce = Column(String)
-    tag = Column(String)
-    signature = Column(String)
+    # Ciphertext and its AEAD/RSA material are only read to decrypt, never
+    # returned as-is, so entity loads leave them out until first touched
+    # (undefer_group("payload") or select the columns when they are needed)
+    encrypted_data = deferred(Column(LargeBinary), group="payload")
+    encrypted_aes_key = deferred(Column(LargeBinary), group="payload")
+    nonce = deferred(Column(String), group="payload")
+    tag = deferred(Column(String), group="payload")
+    signature = deferred(Column(String), group="payload")
     record_hash = Column(String)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
     gender = Column(String, nullable=True)
     visit_date = Column(String, nullable=True)
     vitals = Column(String, nullable=True)
+    # Encryption format: NULL/1 = per-record RSA-wrapped AES key,
+    # 2 = AES key derived from the data key in data_keys (see crypto.data_keys)
+    enc_version = Column(Integer, nullable=True)
+    data_key_id = Column(Integer, ForeignKey("data_keys.id"), nullable=True)
+    # Set when the record is written (or by models.patients.backfill_patients)
+    patient_ref = Column(Integer, ForeignKey("patients.id"), nullable=True)
+    # MODIFY/DELETE entries: id of the CREATE entry of the record they
+    # version (see models.versions). NULL on the CREATE entry itself.
+    original_id = Column(Integer, ForeignKey("audit_logs.id"), nullable=True)
+
+    # Every hot read filters on the owner/patient and orders by time; the
+    # chain walks (timestamp, id). Existing databases pick these up through
+    # models.migrations.upgrade(), since create_all never alters a table.
+    __table_args__ = (
+        Index("ix_audit_logs_user_id_timestamp", "user_id", "timestamp"),
+        Index("ix_audit_logs_patient_id_timestamp", "patient_id", "timestamp"),
+        Index("ix_audit_logs_timestamp_id", "timestamp", "id"),
+        Index("ix_audit_logs_patient_ref_timestamp", "patient_ref", "timestamp"),
+        Index("ix_audit_logs_original_id", "original_id"),
+    )
+
+
+class CurrentRecord(Base):
+    """
+    Entry holding the current state of each live record: the CREATE entry
+    until the record is modified, then its latest MODIFY entry. Deleted
+    records have no row. List reads join through here.
+    """
+    __tablename__ = "current_records"
+    record_id = Column(Integer, ForeignKey("audit_logs.id"), primary_key=True)
+    log_id = Column(Integer, ForeignKey("audit_logs.id"), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("log_id", name="uq_current_records_log_id"),
+    )
+
+
+class ChainCheckpoint(Base):
+    """
+    Last position of the audit chain known to be valid, so /validate only has
+    to re-hash records appended after it. Single row (id = 1).
+    """
+    __tablename__ = "chain_checkpoints"
+    id = Column(Integer, primary_key=True)
+    last_log_id = Column(Integer)
+    last_timestamp = Column(DateTime)
+    last_hash = Column(String)          # _chain_hash of the last verified record
+    verified_count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class ChainHead(Base):
+    """
+    Current tail of the audit chain. Appends read and advance this single row
+    (id = 1) under the append lock instead of running an ORDER BY on
+    audit_logs to find the tail.
+    """
+    __tablename__ = "chain_head"
+    id = Column(Integer, primary_key=True)
+    last_log_id = Column(Integer, nullable=True)
+    last_timestamp = Column(DateTime, nullable=True)
+    last_hash = Column(String, nullable=True)   # _chain_hash of the tail record
+
+
+class DashboardRollup(Base):
+    """
+    Incrementally maintained counters behind /api/audit/dashboard.
+    scope is "all", "doctor:<user_id>" or "patient:<patient_id>".
+    metric is records | patients | patient | week | diagnosis | medication.
+    """
+    __tablename__ = "dashboard_rollups"
+    id = Column(Integer, primary_key=True)
+    scope = Column(String, nullable=False)
+    metric = Column(String, nullable=False)
+    bucket = Column(String, nullable=False, default="")
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("scope", "metric", "bucket", name="uq_dashboard_rollups_key"),
+        Index("ix_dashboard_rollups_top", "scope", "metric", "count"),
+    )
+
 
+class MerkleNode(Base):
+    """
+    Nodes of the Merkle mountain range over audit records (crypto.merkle).
+    Level 0 holds one leaf per append, in append order, with the record it
+    commits to; the node at (level, position) covers leaves
+    [position * 2**level, (position + 1) * 2**level).
+    """
+    __tablename__ = "merkle_nodes"
+    id = Column(Integer, primary_key=True)
+    level = Column(Integer, nullable=False)
+    position = Column(Integer, nullable=False)
+    hash = Column(String, nullable=False)
+    log_id = Column(Integer, nullable=True, index=True)   # leaves only
 
+    __table_args__ = (
+        UniqueConstraint("level", "position", name="uq_merkle_nodes_level_position"),
+    )
 
 
+class RechainJob(Base):
+    """
+    Progress of a chunked /rechain run. Each chunk's hash rewrites and the
+    cursor (last record processed) commit together, so an interrupted run
+    resumes right after the last committed chunk.
+    """
+    __tablename__ = "rechain_jobs"
+    id = Column(Integer, primary_key=True)
+    status = Column(String, nullable=False, default="pending")   # pending | running | completed | failed
+    from_log_id = Column(Integer, nullable=True)        # NULL = from genesis
+    from_timestamp = Column(DateTime, nullable=True)
+    last_log_id = Column(Integer, nullable=True)        # cursor: last record processed
+    last_timestamp = Column(DateTime, nullable=True)
+    total = Column(Integer, default=0)
+    processed = Column(Integer, default=0)
+    rewritten = Column(Integer, default=0)              # records whose record_hash changed
+    error = Column(String, nullable=True)
+    started_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
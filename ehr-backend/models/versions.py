@@ -0,0 +1,100 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from models.tables import AuditLog, CurrentRecord
+
+# Records are append-only. A record is its CREATE entry plus the MODIFY and
+# DELETE entries appended after it, each with original_id pointing back at
+# the CREATE entry. No entry changes once written, so edits extend the hash
+# chain instead of breaking it, and /rechain is only needed for chains that
+# were already damaged. current_records maps every live record to the entry
+# holding its current state.
+VERSION_ACTIONS = ("MODIFY", "DELETE")
+
+# Clinical fields a MODIFY entry carries forward from the version it replaces
+VERSIONED_FIELDS = (
+    "patient_name", "age", "gender", "diagnosis", "medication",
+    "notes", "visit_date", "vitals",
+)
+
+
+def record_id(log) -> int:
+    """Id of the record an entry belongs to (its CREATE entry)."""
+    return log.original_id or log.id
+
+
+def current_version(db: Session, log_id: int):
+    """
+    Current entry of the record that `log_id` (any of its versions) belongs
+    to, or None when there is no such record or it was deleted.
+    """
+    log = db.get(AuditLog, log_id)
+    if log is None:
+        return None
+    current = db.get(CurrentRecord, record_id(log))
+    if current is None:
+        return None
+    return log if current.log_id == log.id else db.get(AuditLog, current.log_id)
+
+
+def add_records(db: Session, logs):
+    """Register flushed CREATE entries as live records."""
+    db.add_all(CurrentRecord(record_id=log.id, log_id=log.id) for log in logs)
+
+
+def set_current(db: Session, rid: int, log):
+    """Point record `rid` at a flushed entry; a DELETE entry removes the record."""
+    current = db.get(CurrentRecord, rid)
+    if log.action == "DELETE":
+        if current is not None:
+            db.delete(current)
+    elif current is None:
+        db.add(CurrentRecord(record_id=rid, log_id=log.id))
+    else:
+        current.log_id = log.id
+
+
+def history(db: Session, rid: int):
+    """Every entry of record `rid`, in chain order."""
+    return (
+        db.query(AuditLog)
+        .filter((AuditLog.id == rid) | (AuditLog.original_id == rid))
+        .order_by(AuditLog.timestamp, AuditLog.id)
+        .all()
+    )
+
+
+# ─── Maintenance ─────────────────────────────────────────────────────────────
+
+def rebuild_current_records(db: Session, chunk_size: int = 5000):
+    """Recompute current_records from audit_logs (backfill for existing data)."""
+    db.query(CurrentRecord).delete()
+    # Every record starts out at its CREATE entry...
+    db.execute(text(
+        "INSERT INTO current_records (record_id, log_id) "
+        "SELECT id, id FROM audit_logs WHERE original_id IS NULL"
+    ))
+    # ...and ends at its last version entry, in chain order
+    latest = {}
+    versions = (
+        db.query(AuditLog.id, AuditLog.original_id, AuditLog.action)
+        .filter(AuditLog.original_id.isnot(None))
+        .order_by(AuditLog.timestamp, AuditLog.id)
+    )
+    for log_id, rid, action in versions.yield_per(chunk_size):
+        latest[rid] = (log_id, action)
+    deleted = [rid for rid, (_, action) in latest.items() if action == "DELETE"]
+    modified = [{"rid": rid, "log_id": log_id} for rid, (log_id, action) in latest.items() if action != "DELETE"]
+    for start in range(0, len(deleted), chunk_size):
+        db.query(CurrentRecord).filter(
+            CurrentRecord.record_id.in_(deleted[start:start + chunk_size])
+        ).delete(synchronize_session=False)
+    if modified:
+        db.execute(text("UPDATE current_records SET log_id = :log_id WHERE record_id = :rid"), modified)
+    db.commit()
+
+
+def ensure_current_records(db: Session):
+    """Backfill current_records once for databases that predate it."""
+    if db.query(CurrentRecord.record_id).first() is None and db.query(AuditLog.id).first() is not None:
+        print("[versions] building current_records from existing audit logs")
+        rebuild_current_records(db)
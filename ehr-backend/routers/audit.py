@@ -1,41 +1,56 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, text
+from sqlalchemy import text
 from models import tables, schemas
-from models.database import get_db       # single source of truth — no local get_db()
-import hashlib
+from models.database import get_db, get_read_db, read_session   # single source of truth — no local get_db()
 from crypto.secure_log import encrypt_log
-from crypto.validate_chain import validate_log_chain, _chain_hash
-from openai import OpenAI
+from crypto.validate_chain import _chain_hash, before_position
+from crypto.chain_head import locked_head
+from crypto.rechain import RechainBusy, create_job, latest_job, job_to_dict, run_job, start_job_thread
+from crypto.merkle import append_leaves, current_root, inclusion_proof, leaf_hash
+from crypto import bulk_decrypt
+from crypto.bulk_decrypt import decrypt_logs
+from crypto.chain_checkpoint import validate_incremental
+from models.rollups import update_rollups, snapshot, dashboard_summary
+from models.search import index_logs, unindex_logs, match_subquery, search_terms
+from models.patients import link_patients, find_patients, patient_filter
+from models.versions import VERSIONED_FIELDS, add_records, current_version, history, record_id, set_current
+from utils import answer_cache, llm_gate
+from utils.metrics import observe, span, timed
+from utils.fast_json import FastJSONResponse, dumps_line
+from openai import OpenAI, AsyncOpenAI
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from collections import Counter
+import asyncio
+import base64
 import datetime
+import json
 import os
+import time
 
 from dotenv import load_dotenv
 load_dotenv()
 
 OPENAI_KEY = os.getenv("OPENAI_API_KEY")
 client = OpenAI(api_key=OPENAI_KEY) if OPENAI_KEY else None
+aclient = AsyncOpenAI(api_key=OPENAI_KEY) if OPENAI_KEY else None
+CHAT_MODEL = "gpt-4o-mini"
 
 router = APIRouter()
 
 
 # ─── Add Log ─────────────────────────────────────────────────────────────────
 
-@router.post("/add-log")
-def add_log(entry: schemas.AuditLogCreate, db: Session = Depends(get_db)):
-    crypto = encrypt_log(entry.dict())
+MAX_BATCH_SIZE = int(os.getenv("AUDIT_MAX_BATCH_SIZE", "1000"))
+_encrypt_pool = ThreadPoolExecutor(max_workers=min(8, (os.cpu_count() or 1) + 4))
 
-    # Fetch the current tail of the chain so we can link to it
-    prev_log = (
-        db.query(tables.AuditLog)
-        .order_by(tables.AuditLog.timestamp.desc(), tables.AuditLog.id.desc())
-        .first()
-    )
 
-    new_log = tables.AuditLog(
+def _new_audit_log(entry: schemas.AuditLogCreate, crypto: dict, timestamp) -> tables.AuditLog:
+    return tables.AuditLog(
         user_id=entry.user_id,
         patient_id=entry.patient_id,
         patient_name=entry.patient_name,
@@ -51,33 +66,119 @@ def add_log(entry: schemas.AuditLogCreate, db: Session = Depends(get_db)):
         encrypted_aes_key=crypto["encrypted_aes_key"],
         nonce=crypto["nonce"],
         tag=crypto["tag"],
-        # Genesis record gets a fixed sentinel hash; every other record stores
-        # the chain-hash of its predecessor so validate_log_chain passes.
-        record_hash=(
-            hashlib.sha256(b"GENESIS").hexdigest()
-            if prev_log is None
-            else _chain_hash(prev_log)
-        ),
+        enc_version=crypto.get("enc_version"),
+        data_key_id=crypto.get("data_key_id"),
         signature=crypto.get("signature", "N/A"),
-        timestamp=datetime.datetime.utcnow(),
+        timestamp=timestamp,
     )
-    db.add(new_log)
-    db.commit()
+
+
+@router.post("/add-log")
+def add_log(entry: schemas.AuditLogCreate, db: Session = Depends(get_db)):
+    crypto = encrypt_log(entry.dict())
+
+    # Link to the current tail under the append lock so concurrent writers
+    # can't both chain from the same record
+    with locked_head(db) as head:
+        new_log = _new_audit_log(entry, crypto, head.next_timestamp())
+        link_patients(db, [new_log])
+        # Genesis record gets a fixed sentinel hash; every other record stores
+        # the chain-hash of its predecessor so validate_log_chain passes.
+        head.link(new_log)
+        db.add(new_log)
+        db.flush()
+        head.advance(new_log)
+        add_records(db, [new_log])
+        append_leaves(db, [new_log])
+        update_rollups(db, added=[new_log])
+        index_logs(db, [new_log])
     return {"message": "Log securely encrypted and saved"}
 
 
+@router.post("/add-logs")
+def add_logs(entries: List[schemas.AuditLogCreate], db: Session = Depends(get_db)):
+    """
+    Bulk variant of /add-log for replaying a batch of records.
+    The chain tail is read once, the new records are linked to each other in
+    memory and everything is inserted in a single transaction.
+    """
+    if len(entries) > MAX_BATCH_SIZE:
+        raise HTTPException(413, f"Batch too large — at most {MAX_BATCH_SIZE} records per request")
+
+    # Encryption is independent per record, so fan it out
+    def _encrypt(entry):
+        try:
+            return encrypt_log(entry.dict()), None
+        except Exception as e:
+            return None, str(e)
+
+    encrypted = list(_encrypt_pool.map(_encrypt, entries))
+
+    results = []
+    created = []   # (result, AuditLog) pairs, in chain order
+    for i, (entry, (crypto, error)) in enumerate(zip(entries, encrypted)):
+        if error:
+            results.append({"index": i, "status": "error", "detail": f"Encryption failed: {error}"})
+            continue
+        result = {"index": i, "status": "created"}
+        results.append(result)
+        created.append((result, _new_audit_log(entry, crypto, None)))
+
+    new_logs = [log for _, log in created]
+
+    if new_logs:
+        with locked_head(db) as head:
+            # One timestamp for the batch — (timestamp, id) order still follows insert order
+            now = head.next_timestamp()
+            for log in new_logs:
+                log.timestamp = now
+            link_patients(db, new_logs)
+            head.link(new_logs[0])
+            db.add_all(new_logs)
+            db.flush()  # assigns ids, which the chain hash covers
+            for prev, curr in zip(new_logs, new_logs[1:]):
+                curr.record_hash = _chain_hash(prev)
+            head.advance(new_logs[-1])
+            add_records(db, new_logs)
+            append_leaves(db, new_logs)
+            update_rollups(db, added=new_logs)
+            index_logs(db, new_logs)
+        for result, log in created:
+            result["id"] = log.id
+
+    return {
+        "message": f"{len(new_logs)} of {len(entries)} log(s) securely encrypted and saved",
+        "created": len(new_logs),
+        "failed": len(entries) - len(new_logs),
+        "results": results,
+    }
+
+
 # ─── Get Logs ─────────────────────────────────────────────────────────────────
 
-@router.get("/logs")
-def get_logs(
-    role: str = Query(..., description="doctor | patient | auditor"),
-    user_id: Optional[str] = None,
-    patient_id: Optional[str] = None,
-    patient_name: Optional[str] = None,
-    db: Session = Depends(get_db),
-):
-    q = db.query(tables.AuditLog).order_by(tables.AuditLog.timestamp.desc())
+MAX_PAGE_SIZE = 1000
+_NDJSON_CHUNK_SIZE = 500
+# Enough rows per batch to give every decrypt worker a full chunk
+_DECRYPT_BATCH_SIZE = bulk_decrypt.CHUNK_SIZE * max(bulk_decrypt.DECRYPT_WORKERS, 1)
+
+
+def _patients(db, patient_id=None, patient_name=None):
+    """AuditLog criterion for the patients matching an id and/or a name."""
+    return patient_filter(p.id for p in find_patients(db, patient_id, patient_name))
+
+
+def _scoped_logs_query(db, role, user_id, patient_id, patient_name, patient_ref=None):
+    """AuditLog query restricted to what `role` may see, newest first."""
+    # Only the current version of each live record
+    q = (
+        db.query(tables.AuditLog)
+        .join(tables.CurrentRecord, tables.CurrentRecord.log_id == tables.AuditLog.id)
+        .order_by(tables.AuditLog.timestamp.desc(), tables.AuditLog.id.desc())
+    )
     role = role.lower()
+    if patient_ref is not None:
+        # Already resolved (GET /patients/{patient_id})
+        q = q.filter(tables.AuditLog.patient_ref == patient_ref)
 
     if role == "auditor":
         pass  # sees everything
@@ -85,124 +186,539 @@ def get_logs(
         if not user_id:
             raise HTTPException(400, "user_id required for doctor role")
         q = q.filter(tables.AuditLog.user_id == user_id)
-        if patient_id:
-            q = q.filter(tables.AuditLog.patient_id == patient_id)
+        if patient_id and patient_ref is None:
+            q = q.filter(_patients(db, patient_id=patient_id))
     elif role == "patient":
-        if patient_id:
-            q = q.filter(tables.AuditLog.patient_id == patient_id)
+        if patient_ref is not None:
+            pass
+        elif patient_id:
+            q = q.filter(_patients(db, patient_id=patient_id))
         elif patient_name:
-            q = q.filter(
-                func.lower(tables.AuditLog.patient_name) == patient_name.lower()
-            )
+            q = q.filter(_patients(db, patient_name=patient_name))
         elif user_id:
-            # Patient logged in: match their user_id against both patient_id
-            # and patient_name so records created under either field are visible.
-            q = q.filter(
-                (tables.AuditLog.patient_id == user_id)
-                | (func.lower(tables.AuditLog.patient_name) == user_id.lower())
-            )
+            # Patient logged in: their user_id may be the patient id or a name
+            # the records were created under
+            q = q.filter(_patients(db, user_id, user_id))
         else:
             raise HTTPException(400, "patient_id, patient_name, or user_id required for patient role")
     else:
         raise HTTPException(400, "Invalid role")
+    return q
+
+
+# What list reads return; selecting just these keeps the ciphertext blobs
+# and ORM identity-map bookkeeping out of every listing
+LIST_COLUMNS = (
+    tables.AuditLog.id,
+    tables.AuditLog.timestamp,
+    tables.AuditLog.user_id,
+    tables.AuditLog.patient_id,
+    tables.AuditLog.patient_name,
+    tables.AuditLog.age,
+    tables.AuditLog.gender,
+    tables.AuditLog.diagnosis,
+    tables.AuditLog.medication,
+    tables.AuditLog.notes,
+    tables.AuditLog.visit_date,
+    tables.AuditLog.vitals,
+    tables.AuditLog.action,
+    tables.AuditLog.original_id,
+)
+# Extra columns decrypt_logs needs
+PAYLOAD_COLUMNS = (
+    tables.AuditLog.enc_version,
+    tables.AuditLog.data_key_id,
+    tables.AuditLog.encrypted_data,
+    tables.AuditLog.encrypted_aes_key,
+    tables.AuditLog.nonce,
+    tables.AuditLog.tag,
+)
+
+
+def _project(q, decrypt=False):
+    """Narrow a _scoped_logs_query to the listed columns (plus payload to decrypt)."""
+    return q.with_entities(*LIST_COLUMNS, *(PAYLOAD_COLUMNS if decrypt else ()))
+
+
+def _log_to_dict(log):
+    return {
+        "id": log.id,
+        "timestamp": log.timestamp.isoformat(),
+        "user_id": log.user_id,
+        "patient_id": log.patient_id,
+        "patient_name": log.patient_name,
+        "age": log.age,
+        "gender": log.gender,
+        "diagnosis": log.diagnosis,
+        "medication": log.medication,
+        "notes": log.notes,
+        "visit_date": log.visit_date,
+        "vitals": log.vitals,
+        "action": log.action,
+        "record_id": record_id(log),
+    }
+
+
+def _with_decrypted(logs):
+    """Row dicts with the decrypted payload inline; failures carry decrypt_error."""
+    results = decrypt_logs(logs)
+    out = []
+    for log in logs:
+        row = _log_to_dict(log)
+        payload, error = results[log.id]
+        row["decrypted"] = payload
+        if error:
+            row["decrypt_error"] = error
+        out.append(row)
+    return out
+
+
+def _encode_cursor(log) -> str:
+    raw = json.dumps([log.timestamp.isoformat(), log.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts, log_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.datetime.fromisoformat(ts), int(log_id)
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+
+
+def _page(q, limit, cursor):
+    """Apply (timestamp, id) keyset paging to a newest-first query."""
+    if cursor:
+        q = q.filter(before_position(*_decode_cursor(cursor)))
+    if limit:
+        # One extra row tells us whether there is a next page without a COUNT
+        q = q.limit(limit + 1)
+    return q
+
+
+@router.get("/logs")
+def get_logs(
+    role: str = Query(..., description="doctor | patient | auditor"),
+    user_id: Optional[str] = None,
+    patient_id: Optional[str] = None,
+    patient_name: Optional[str] = None,
+    patient_ref: Optional[int] = Query(None, description="Patient key from GET /patients/{patient_id}"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit for every row"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    decrypt: bool = Query(False, description="Include the decrypted, AEAD-verified payload of each row"),
+    db: Session = Depends(get_read_db),
+):
+    # Validate role/scope up front so errors surface before any streaming starts
+    q = _project(_page(_scoped_logs_query(db, role, user_id, patient_id, patient_name, patient_ref), limit, cursor), decrypt)
+
+    if format == "ndjson":
+        return StreamingResponse(
+            _stream_logs(role, user_id, patient_id, patient_name, limit, cursor, decrypt, patient_ref),
+            media_type="application/x-ndjson",
+        )
 
     logs = q.all()
+    next_cursor = None
+    if limit and len(logs) > limit:
+        logs = logs[:limit]
+        next_cursor = _encode_cursor(logs[-1])
+    rows = _with_decrypted(logs) if decrypt else [_log_to_dict(log) for log in logs]
+    return FastJSONResponse({"logs": rows, "next_cursor": next_cursor})
+
+
+@router.get("/export")
+def export_logs(
+    role: str = Query(..., description="doctor | patient | auditor"),
+    user_id: Optional[str] = None,
+    patient_id: Optional[str] = None,
+    patient_name: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
+    """Bulk export: every visible row, decrypted and verified, as NDJSON."""
+    _scoped_logs_query(db, role, user_id, patient_id, patient_name)
+    return StreamingResponse(
+        _stream_logs(role, user_id, patient_id, patient_name, None, None, decrypt=True),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="audit-export.ndjson"'},
+    )
+
+
+def _stream_logs(role, user_id, patient_id, patient_name, limit, cursor, decrypt=False, patient_ref=None):
+    """
+    One JSON object per line, written as rows come off the cursor. When paging,
+    a final {"next_cursor": ...} line carries the token for the next page.
+    With decrypt, rows are buffered into batches that the decrypt pool works
+    through in parallel.
+    """
+    # The request-scoped session is closed before a streaming body is sent,
+    # so the stream owns its own session
+    db = read_session()
+    batch_size = _DECRYPT_BATCH_SIZE if decrypt else 1
+    try:
+        q = _project(_page(_scoped_logs_query(db, role, user_id, patient_id, patient_name, patient_ref), limit, cursor), decrypt)
+        sent = 0
+        last = None
+        more = False
+        batch = []
+        for log in q.yield_per(_NDJSON_CHUNK_SIZE):
+            if limit and sent == limit:
+                more = True
+                break
+            batch.append(log)
+            sent += 1
+            last = log
+            if len(batch) >= batch_size:
+                yield _ndjson_lines(batch, decrypt)
+                batch = []
+        if batch:
+            yield _ndjson_lines(batch, decrypt)
+        if more:
+            yield dumps_line({"next_cursor": _encode_cursor(last)})
+    finally:
+        db.close()
+
+
+def _ndjson_lines(logs, decrypt):
+    rows = _with_decrypted(logs) if decrypt else [_log_to_dict(log) for log in logs]
+    return b"".join(dumps_line(row) for row in rows)
+
+
+# ─── Patients ─────────────────────────────────────────────────────────────────
+
+@router.get("/patients/{patient_id}")
+def get_patient(patient_id: str, db: Session = Depends(get_read_db)):
+    """
+    Resolve a patient id to its key and recorded names. Pass `id` to /logs as
+    patient_ref to read the patient's records by that key.
+    """
+    patient = db.query(tables.Patient).filter(tables.Patient.patient_id == patient_id).first()
+    if not patient:
+        raise HTTPException(404, "Patient not found")
+    aliases = (
+        db.query(tables.PatientAlias.alias)
+        .filter(tables.PatientAlias.patient_ref == patient.id)
+        .order_by(tables.PatientAlias.alias)
+    )
     return {
-        "logs": [
-            {
-                "id": log.id,
-                "timestamp": log.timestamp.isoformat(),
-                "user_id": log.user_id,
-                "patient_id": log.patient_id,
-                "patient_name": log.patient_name,
-                "age": log.age,
-                "gender": log.gender,
-                "diagnosis": log.diagnosis,
-                "medication": log.medication,
-                "notes": log.notes,
-                "visit_date": log.visit_date,
-                "vitals": log.vitals,
-                "action": log.action,
-            }
-            for log in logs
-        ]
+        "id": patient.id,
+        "patient_id": patient.patient_id,
+        "name": patient.name,
+        "aliases": [a for (a,) in aliases],
     }
 
 
+# ─── Full-text search ─────────────────────────────────────────────────────────
+
+@router.get("/search")
+def search_logs(
+    q: str = Query(..., min_length=1, description="Words to find in notes, diagnosis, medication or vitals"),
+    role: str = Query(..., description="doctor | patient | auditor"),
+    user_id: Optional[str] = None,
+    patient_id: Optional[str] = None,
+    patient_name: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10_000),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Ranked full-text search (FTS5 on SQLite, tsvector + GIN on Postgres),
+    restricted to the records `role` may see. Every word must match; the
+    last one also matches as a prefix. The newest SEARCH_MAX_CANDIDATES
+    matches are ranked. Page with `offset`/`next_offset`.
+    """
+    terms = search_terms(q)
+    if not terms:
+        raise HTTPException(400, "Search query has no searchable words")
+
+    scoped = _scoped_logs_query(db, role, user_id, patient_id, patient_name)
+    with span("search.query"):
+        matches = match_subquery(db, scoped, terms)
+        rows = (
+            db.query(*LIST_COLUMNS, matches.c.score)
+            .join(matches, matches.c.log_id == tables.AuditLog.id)
+            .order_by(matches.c.score.desc(), tables.AuditLog.timestamp.desc(), tables.AuditLog.id.desc())
+            .offset(offset)
+            .limit(limit + 1)
+            .all()
+        )
+
+    more = len(rows) > limit
+    results = []
+    for row in rows[:limit]:
+        item = _log_to_dict(row)
+        item["score"] = row.score
+        results.append(item)
+    return FastJSONResponse({
+        "results": results,
+        "terms": terms,
+        "next_offset": offset + limit if more else None,
+    })
+
+
+# ─── Dashboard ────────────────────────────────────────────────────────────────
+
+def _dashboard_scopes(db, role, user_id):
+    """Rollup scopes matching what _scoped_logs_query lets `role` see."""
+    role = role.lower()
+    if role == "auditor":
+        return ["all"], []
+    if not user_id:
+        raise HTTPException(400, f"user_id required for {role} role")
+    if role == "doctor":
+        return [f"doctor:{user_id}"], []
+    if role == "patient":
+        # Same patients _scoped_logs_query resolves; each record belongs to one
+        return [f"patient:{p.patient_id}" for p in find_patients(db, user_id, user_id)], []
+    raise HTTPException(400, "Invalid role")
+
+
+@router.get("/dashboard")
+def dashboard(
+    role: str = Query(..., description="doctor | patient | auditor"),
+    user_id: Optional[str] = None,
+    top: int = Query(5, ge=1, le=20),
+    db: Session = Depends(get_db),
+):
+    """
+    Everything Dashboard.js draws, read from the rollup counters instead of
+    downloading every log — cost doesn't grow with history.
+    """
+    plus, minus = _dashboard_scopes(db, role, user_id)
+    summary = dashboard_summary(db, plus, minus, top=top)
+
+    recent = _project(_scoped_logs_query(db, role, user_id, None, None)).limit(5).all()
+    summary["recent"] = [
+        {
+            "id": log.id,
+            "timestamp": log.timestamp.isoformat(),
+            "user_id": log.user_id,
+            "patient_id": log.patient_id,
+            "patient_name": log.patient_name,
+            "diagnosis": log.diagnosis,
+            "action": log.action,
+        }
+        for log in recent
+    ]
+
+    # Only records since the last checkpoint get hashed
+    chain = validate_incremental(db)
+    summary["chain"] = {
+        "status": "valid" if chain["valid"] else "broken",
+        "invalid_count": chain["invalid_count"],
+    }
+    return summary
+
+
 # ─── Validate Chain ───────────────────────────────────────────────────────────
 
 @router.get("/validate")
-def validate_chain(db: Session = Depends(get_db)):
-    logs = db.query(tables.AuditLog).order_by(tables.AuditLog.timestamp).all()
-    is_valid, broken_ids = validate_log_chain(logs)
-    if is_valid:
-        return {"status": "valid", "message": "Audit chain is valid", "total_records": len(logs)}
+def validate_chain(
+    full: bool = Query(False, description="Ignore the checkpoint and re-scan from genesis"),
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db),
+):
+    # Only records appended since the last verified checkpoint are re-hashed;
+    # the rows are read from the replica when it is caught up
+    result = validate_incremental(db, full=full, read_db=read_db)
+    if result["valid"]:
+        return {
+            "status": "valid",
+            "message": "Audit chain is valid",
+            "total_records": result["total_records"],
+        }
     return {
         "status": "broken",
         "message": "Audit chain integrity broken",
-        "invalid_log_ids": broken_ids,
-        "total_records": len(logs),
+        "invalid_log_ids": result["invalid_log_ids"],
+        "invalid_count": result["invalid_count"],
+        "total_records": result["total_records"],
     }
 
 
 # ─── Rebuild chain ────────────────────────────────────────────────────────────
 
 @router.post("/rechain")
-def rechain(db: Session = Depends(get_db)):
+def rechain(
+    from_id: Optional[int] = Query(None, description="Repair from this record instead of genesis"),
+    resume: bool = Query(False, description="Continue the last unfinished run"),
+    background: bool = Query(False, description="Return at once; poll /rechain/status"),
+    db: Session = Depends(get_db),
+):
     """
-    Rebuild the SHA-256 hash chain for every record in chronological order.
-    Call this once to fix chains that were written before the correct chaining
-    logic was in place, or after any manual database migration.
+    Rebuild the SHA-256 hash chain in chronological order, from genesis or
+    from `from_id`. Call this to fix chains that were written before the
+    correct chaining logic was in place, or after any manual database
+    migration. Work is committed chunk by chunk, so an interrupted run can
+    be picked up again with ?resume=true.
     """
-    logs = (
-        db.query(tables.AuditLog)
-        .order_by(tables.AuditLog.timestamp, tables.AuditLog.id)
-        .all()
-    )
-    if not logs:
-        return {"message": "No records found — nothing to rechain.", "rechained": 0}
-
-    # Genesis record gets a fixed sentinel
-    logs[0].record_hash = hashlib.sha256(b"GENESIS").hexdigest()
-
-    # Each subsequent record stores the chain-hash of its predecessor
-    for i in range(1, len(logs)):
-        logs[i].record_hash = _chain_hash(logs[i - 1])
+    if resume:
+        job = latest_job(db, unfinished=True)
+        if job is None:
+            raise HTTPException(404, "No unfinished rechain to resume")
+    else:
+        try:
+            job = create_job(db, from_id)
+        except LookupError as e:
+            raise HTTPException(404, str(e))
 
-    db.commit()
+    try:
+        if background:
+            start_job_thread(job.id)
+            return {"message": "Rechain started", "job": job_to_dict(job)}
+        result = run_job(job.id)
+    except RechainBusy:
+        raise HTTPException(409, "A rechain is already running")
+
+    if result["processed"] == 0:
+        return {"message": "No records found — nothing to rechain.", "rechained": 0, "job": result}
     return {
-        "message": f"Chain rebuilt successfully across {len(logs)} record(s).",
-        "rechained": len(logs),
+        "message": f"Chain rebuilt successfully across {result['processed']} record(s).",
+        "rechained": result["processed"],
+        "rewritten": result["rewritten"],
+        "job": result,
     }
 
 
+@router.get("/rechain/status")
+def rechain_status(db: Session = Depends(get_db)):
+    job = latest_job(db)
+    if job is None:
+        return {"status": "none"}
+    return job_to_dict(job)
+
+
+# ─── Merkle Proofs ────────────────────────────────────────────────────────────
+
+@router.get("/root")
+def merkle_root(db: Session = Depends(get_db)):
+    """Current Merkle root over every appended record, for publishing."""
+    return current_root(db)
+
+
+@router.get("/proof/{log_id}")
+def merkle_proof(log_id: int, db: Session = Depends(get_db)):
+    """
+    Inclusion proof for one record: O(log n) hashes from its leaf to the
+    root. record_matches is False when the record no longer hashes to the
+    leaf that was committed for it.
+    """
+    log = db.query(tables.AuditLog).filter(tables.AuditLog.id == log_id).first()
+    if not log:
+        raise HTTPException(404, "Log not found")
+    proof = inclusion_proof(db, log_id)
+    if proof is None:
+        raise HTTPException(404, "No Merkle leaf for this log")
+    return {"log_id": log_id, "record_matches": leaf_hash(log) == proof["leaf_hash"], **proof}
+
+
 # ─── Modify / Delete ──────────────────────────────────────────────────────────
 
+def _version_entry(prev, action: str, fields: dict) -> tables.AuditLog:
+    """
+    Unlinked MODIFY/DELETE entry for the record `prev` is the current version
+    of. The payload is encrypted for the record's doctor, like the original.
+    """
+    rid = record_id(prev)
+    crypto = encrypt_log({
+        "user_id": prev.user_id,
+        "patient_id": prev.patient_id,
+        "action": action,
+        "record_id": rid,
+        "data": fields.get("notes"),
+        **fields,
+    })
+    return tables.AuditLog(
+        user_id=prev.user_id,
+        patient_id=prev.patient_id,
+        original_id=rid,
+        action=action,
+        encrypted_data=crypto["encrypted_data"],
+        encrypted_aes_key=crypto["encrypted_aes_key"],
+        nonce=crypto["nonce"],
+        tag=crypto["tag"],
+        enc_version=crypto.get("enc_version"),
+        data_key_id=crypto.get("data_key_id"),
+        signature=crypto.get("signature", "N/A"),
+        **fields,
+    )
+
+
+def _append_version(db, prev, entry: tables.AuditLog):
+    """
+    Append `entry` to the chain and make it the record's current state.
+    Earlier entries are never touched, so the chain stays valid and no
+    checkpoint or Merkle leaf has to be rewound.
+    """
+    rid = record_id(prev)
+    with locked_head(db) as head:
+        current = (
+            db.query(tables.CurrentRecord.log_id)
+            .filter(tables.CurrentRecord.record_id == rid)
+            .scalar()
+        )
+        if current != prev.id:
+            raise HTTPException(409, "Record changed while saving — retry")
+        entry.timestamp = head.next_timestamp()
+        link_patients(db, [entry])
+        head.link(entry)
+        db.add(entry)
+        db.flush()
+        head.advance(entry)
+        set_current(db, rid, entry)
+        append_leaves(db, [entry])
+        unindex_logs(db, [prev.id])
+        if entry.action == "DELETE":
+            update_rollups(db, removed=[snapshot(prev)])
+        else:
+            update_rollups(db, added=[entry], removed=[snapshot(prev)])
+            index_logs(db, [entry])
+
+
 @router.put("/modify-log/{log_id}")
 def modify_log(
     log_id: int, updated: schemas.ModifyAuditLog, db: Session = Depends(get_db)
 ):
-    log = db.query(tables.AuditLog).filter(tables.AuditLog.id == log_id).first()
-    if not log:
+    """Append a MODIFY entry carrying the record's new state."""
+    prev = current_version(db, log_id)
+    if prev is None:
         raise HTTPException(404, "Log not found")
 
-    # Only update fields that were explicitly sent
-    for field, value in updated.dict(exclude_unset=True).items():
-        setattr(log, field, value)
-
-    log.timestamp = datetime.datetime.utcnow()
-    db.commit()
-    return {"message": "Record updated successfully"}
+    # Fields that weren't sent carry over from the current version
+    fields = {f: getattr(prev, f) for f in VERSIONED_FIELDS}
+    fields.update(updated.dict(exclude_unset=True))
+    entry = _version_entry(prev, "MODIFY", fields)
+    _append_version(db, prev, entry)
+    return {"message": "Record updated successfully", "id": entry.id, "record_id": record_id(prev)}
 
 
 @router.delete("/delete-log/{log_id}")
 def delete_log(log_id: int, db: Session = Depends(get_db)):
-    log = db.query(tables.AuditLog).filter(tables.AuditLog.id == log_id).first()
-    if not log:
+    """Append a DELETE entry; the record's earlier entries stay in the chain."""
+    prev = current_version(db, log_id)
+    if prev is None:
         raise HTTPException(404, "Log not found")
-    db.delete(log)
-    db.commit()
-    return {"message": "Record deleted successfully"}
+
+    entry = _version_entry(prev, "DELETE", {"patient_name": prev.patient_name})
+    _append_version(db, prev, entry)
+    return {"message": "Record deleted successfully", "id": entry.id, "record_id": record_id(prev)}
+
+
+@router.get("/history/{log_id}")
+def record_history(log_id: int, db: Session = Depends(get_read_db)):
+    """Every entry of the record `log_id` belongs to, oldest first."""
+    log = db.get(tables.AuditLog, log_id)
+    if log is None:
+        raise HTTPException(404, "Log not found")
+    rid = record_id(log)
+    current = db.get(tables.CurrentRecord, rid)
+    return {
+        "record_id": rid,
+        "current_id": current.log_id if current else None,
+        "deleted": current is None,
+        "versions": [_log_to_dict(v) for v in history(db, rid)],
+    }
 
 
 # ─── Chatbot helpers ──────────────────────────────────────────────────────────
@@ -216,30 +732,28 @@ class ChatReq(BaseModel):
     limit: int = 20
 
 
+@timed("chat.fetch_logs")
 def _fetch_logs(db, user_id, role, patient_id, patient_name, limit):
-    q = db.query(tables.AuditLog).order_by(tables.AuditLog.timestamp.desc())
+    q = (
+        db.query(*LIST_COLUMNS)
+        .join(tables.CurrentRecord, tables.CurrentRecord.log_id == tables.AuditLog.id)
+        .order_by(tables.AuditLog.timestamp.desc())
+    )
     role = (role or "").lower()
 
     if role == "doctor":
         q = q.filter(tables.AuditLog.user_id == user_id)
         if patient_id:
-            q = q.filter(tables.AuditLog.patient_id == patient_id)
+            q = q.filter(_patients(db, patient_id=patient_id))
         elif patient_name:
-            q = q.filter(
-                func.lower(tables.AuditLog.patient_name) == patient_name.lower()
-            )
+            q = q.filter(_patients(db, patient_name=patient_name))
     elif role == "patient":
         if patient_id:
-            q = q.filter(tables.AuditLog.patient_id == patient_id)
+            q = q.filter(_patients(db, patient_id=patient_id))
         elif patient_name:
-            q = q.filter(
-                func.lower(tables.AuditLog.patient_name) == patient_name.lower()
-            )
+            q = q.filter(_patients(db, patient_name=patient_name))
         else:
-            q = q.filter(
-                (tables.AuditLog.patient_id == user_id)
-                | (func.lower(tables.AuditLog.patient_name) == user_id.lower())
-            )
+            q = q.filter(_patients(db, user_id, user_id))
 
     return q.limit(min(max(limit, 1), 50)).all()
 
@@ -311,61 +825,54 @@ def _row_to_dict(r):
 
 # ─── Chatbot endpoint ─────────────────────────────────────────────────────────
 
-@router.post("/chat")
-def chat(req: ChatReq, db: Session = Depends(get_db)):
-    rows = _fetch_logs(
-        db, req.user_id, req.role, req.patient_id, req.patient_name, req.limit
+def _chat_messages(question, context, stats):
+    system = (
+        "You are a warm, knowledgeable clinical assistant for SecureEHR — a medical records platform. "
+        "Your job is to help doctors, auditors, and patients understand encrypted audit records in plain English. "
+        "Use ONLY the record data provided — never invent diagnoses, medications, or clinical details. "
+        "Speak naturally and professionally, like a helpful colleague. "
+        "Format dates as 'Month Day, Year' (e.g. March 25, 2026). "
+        "When listing multiple items, use bullet points. For single answers, write a short paragraph. "
+        "If a field is missing or empty, say 'not recorded' rather than showing dashes or None. "
+        "Keep answers concise but complete — 2 to 6 sentences for summaries."
     )
-    stats = _build_stats(rows)
-    context = _rows_to_context(rows)
-    rows_json = [_row_to_dict(r) for r in rows]
+    user_prompt = (
+        f"The user asked: \"{question}\"\n\n"
+        f"Here are the relevant patient records (most recent first):\n{context}\n\n"
+        f"Summary stats: {stats['total_logs']} total records, "
+        f"top diagnoses: {[d for d, _ in stats['top_diagnoses'][:3]]}, "
+        f"top medications: {[m for m, _ in stats['top_medications'][:3]]}, "
+        f"last visit: {stats['last_visit']}.\n\n"
+        "Please answer the user's question naturally and helpfully based only on the above data."
+    )
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user_prompt},
+    ]
 
-    if client:
-        system = (
-            "You are a warm, knowledgeable clinical assistant for SecureEHR — a medical records platform. "
-            "Your job is to help doctors, auditors, and patients understand encrypted audit records in plain English. "
-            "Use ONLY the record data provided — never invent diagnoses, medications, or clinical details. "
-            "Speak naturally and professionally, like a helpful colleague. "
-            "Format dates as 'Month Day, Year' (e.g. March 25, 2026). "
-            "When listing multiple items, use bullet points. For single answers, write a short paragraph. "
-            "If a field is missing or empty, say 'not recorded' rather than showing dashes or None. "
-            "Keep answers concise but complete — 2 to 6 sentences for summaries."
-        )
-        user_prompt = (
-            f"The user asked: \"{req.question}\"\n\n"
-            f"Here are the relevant patient records (most recent first):\n{context}\n\n"
-            f"Summary stats: {stats['total_logs']} total records, "
-            f"top diagnoses: {[d for d, _ in stats['top_diagnoses'][:3]]}, "
-            f"top medications: {[m for m, _ in stats['top_medications'][:3]]}, "
-            f"last visit: {stats['last_visit']}.\n\n"
-            "Please answer the user's question naturally and helpfully based only on the above data."
-        )
-        try:
+
+def _llm_answer(question, context, stats):
+    """Answer from gpt-4o-mini, or None if the call fails."""
+    try:
+        with span("openai.chat"):
             resp = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system},
-                    {"role": "user", "content": user_prompt},
-                ],
+                model=CHAT_MODEL,
+                messages=_chat_messages(question, context, stats),
                 temperature=0.2,
+                timeout=llm_gate.DEADLINE_SECONDS,
             )
-            return {
-                "answer": resp.choices[0].message.content,
-                "stats": stats,
-                "rows": rows_json,
-            }
-        except Exception as e:
-            print("OpenAI error:", e)
+        return resp.choices[0].message.content
+    except Exception as e:
+        print("OpenAI error:", e)
+        return None
 
-    # ── Human-friendly fallback when OpenAI key is absent ──────────────────────
+
+def _fallback_answer(question, rows, stats):
+    """Human-friendly keyword answer for when OpenAI is absent or failing."""
     if not rows:
-        return {
-            "answer": "I don't see any records matching your query. Try adjusting the patient ID filter, or check that records have been added to the system.",
-            "stats": stats,
-            "rows": rows_json,
-        }
+        return "I don't see any records matching your query. Try adjusting the patient ID filter, or check that records have been added to the system."
 
-    q        = (req.question or "").strip().lower()
+    q        = (question or "").strip().lower()
     first    = rows[0]
     total    = stats["total_logs"]
     top_dx   = stats["top_diagnoses"]
@@ -453,9 +960,145 @@ def chat(req: ChatReq, db: Session = Depends(get_db)):
             f"Feel free to ask me something more specific — like 'show last visit', 'list all diagnoses', or 'summarize recent visits'."
         )
 
+    return answer
+
+
+def _chat_scope(req):
+    role = (req.role or "").lower()
+    owner = req.user_id if role in ("doctor", "patient") else ""
+    return (owner, req.patient_id or "", (req.patient_name or "").lower(), min(max(req.limit, 1), 50))
+
+
+@router.post("/chat")
+def chat(req: ChatReq, db: Session = Depends(get_read_db)):
+    rows = _fetch_logs(
+        db, req.user_id, req.role, req.patient_id, req.patient_name, req.limit
+    )
+    stats = _build_stats(rows)
+    rows_json = [_row_to_dict(r) for r in rows]
+
+    # Same question over the same records → same answer
+    key = answer_cache.make_key(req.question, req.role, _chat_scope(req), rows, "llm" if client else "keyword")
+    answer = answer_cache.get(key)
+    if answer is not None:
+        return {"answer": answer, "stats": stats, "rows": rows_json}
+
+    if client:
+        answer = _llm_answer(req.question, _rows_to_context(rows), stats)
+        if answer is not None:
+            answer_cache.put(key, answer)
+            return {"answer": answer, "stats": stats, "rows": rows_json}
+        # A failed call isn't cached, so the next request retries OpenAI
+        return {"answer": _fallback_answer(req.question, rows, stats), "stats": stats, "rows": rows_json}
+
+    answer = _fallback_answer(req.question, rows, stats)
+    answer_cache.put(key, answer)
     return {"answer": answer, "stats": stats, "rows": rows_json}
 
 
+@router.post("/chat/stream")
+async def chat_stream(req: ChatReq, db: Session = Depends(get_read_db)):
+    """
+    Server-Sent Events version of /chat. Emits `meta` (stats and rows), then
+    `token` events as the model streams, then `done` with the full answer and
+    its source. If the LLM misses the deadline or fails, `done` carries the
+    keyword answer instead and the client replaces any partial text.
+    """
+    rows = await run_in_threadpool(
+        _fetch_logs, db, req.user_id, req.role, req.patient_id, req.patient_name, req.limit
+    )
+    stats = _build_stats(rows)
+    rows_json = [_row_to_dict(r) for r in rows]
+    # Everything the stream needs is computed now: the request session is
+    # closed before the body is sent
+    key = answer_cache.make_key(req.question, req.role, _chat_scope(req), rows, "llm" if aclient else "keyword")
+    fallback = _fallback_answer(req.question, rows, stats)
+    context = _rows_to_context(rows)
+    return StreamingResponse(
+        _chat_events(req.question, context, stats, rows_json, key, fallback),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _chat_events(question, context, stats, rows_json, key, fallback):
+    llm_gate.count("requests")
+    yield _sse("meta", {"stats": stats, "rows": rows_json})
+
+    cached = answer_cache.get(key)
+    if cached is not None:
+        llm_gate.count("cache_hits")
+        yield _sse("token", {"text": cached})
+        yield _sse("done", {"answer": cached, "source": "cache"})
+        return
+
+    if aclient is None:
+        llm_gate.count("keyword_only")
+        answer_cache.put(key, fallback)
+        yield _sse("token", {"text": fallback})
+        yield _sse("done", {"answer": fallback, "source": "keyword"})
+        return
+
+    parts = []
+    reason = None
+    # One deadline over queue wait and the whole stream. It is applied to
+    # each await on its own, never around a yield: a timeout scope open
+    # while the response is stuck sending to a slow client would cancel the
+    # response task itself, and the client would get no `done`
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + llm_gate.DEADLINE_SECONDS
+
+    def remaining():
+        return max(deadline - loop.time(), 0)
+
+    try:
+        async with llm_gate.slot(remaining()):
+            with span("openai.chat_stream"):
+                started = time.perf_counter()
+                stream = await asyncio.wait_for(
+                    aclient.chat.completions.create(
+                        model=CHAT_MODEL,
+                        messages=_chat_messages(question, context, stats),
+                        temperature=0.2,
+                        stream=True,
+                    ),
+                    remaining(),
+                )
+                async with stream:
+                    chunks = stream.__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), remaining())
+                        except StopAsyncIteration:
+                            break
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if not delta:
+                            continue
+                        if not parts:
+                            observe("chat.ttft", time.perf_counter() - started)
+                        parts.append(delta)
+                        yield _sse("token", {"text": delta})
+    except TimeoutError:
+        reason = "deadline"
+    except Exception as e:
+        print("OpenAI error:", e)
+        reason = "error"
+
+    if reason is None and parts:
+        answer = "".join(parts)
+        answer_cache.put(key, answer)
+        llm_gate.count("completed")
+        yield _sse("done", {"answer": answer, "source": "llm"})
+        return
+
+    llm_gate.count("deadline_fallbacks" if reason == "deadline" else "error_fallbacks")
+    yield _sse("done", {"answer": fallback, "source": "keyword", "reason": reason or "empty"})
+
+
 # ─── FAQ Query (parameterized — no SQL injection) ─────────────────────────────
 
 class FAQReq(BaseModel):
@@ -463,8 +1106,12 @@ class FAQReq(BaseModel):
     patient_id: Optional[str] = None
 
 
+# Current versions of live records only
+_CURRENT = "FROM audit_logs JOIN current_records ON current_records.log_id = audit_logs.id"
+
+
 @router.post("/faq-query")
-def faq_query(req: FAQReq, db: Session = Depends(get_db)):
+def faq_query(req: FAQReq, db: Session = Depends(get_read_db)):
     """
     Structured FAQ endpoint. Accepts a JSON body — no asyncio.run() needed.
     All SQL uses bound parameters to prevent injection.
@@ -474,18 +1121,18 @@ def faq_query(req: FAQReq, db: Session = Depends(get_db)):
     try:
         if "how many patients" in q:
             result = db.execute(
-                text("SELECT COUNT(DISTINCT patient_id) FROM audit_logs")
+                text(f"SELECT COUNT(DISTINCT patient_id) {_CURRENT}")
             ).scalar()
             return {"reply": f"There are {result} unique patients in the system."}
 
         elif "how many records" in q:
-            result = db.execute(text("SELECT COUNT(*) FROM audit_logs")).scalar()
+            result = db.execute(text("SELECT COUNT(*) FROM current_records")).scalar()
             return {"reply": f"There are {result} audit records logged."}
 
         elif "most common diagnosis" in q:
-            row = db.execute(text("""
+            row = db.execute(text(f"""
                 SELECT diagnosis, COUNT(*) AS cnt
-                FROM audit_logs
+                {_CURRENT}
                 WHERE diagnosis IS NOT NULL AND diagnosis != ''
                 GROUP BY diagnosis ORDER BY cnt DESC LIMIT 1
             """)).fetchone()
@@ -494,12 +1141,13 @@ def faq_query(req: FAQReq, db: Session = Depends(get_db)):
             return {"reply": f"Most common diagnosis: '{row[0]}' ({row[1]} entries)."}
 
         elif "patient summary" in q and req.patient_id:
-            # Parameterized — no f-string interpolation into SQL
+            # Parameterized — only the _CURRENT constant is interpolated into SQL
             row = db.execute(
-                text("""
+                text(f"""
                     SELECT patient_id, patient_name, age, gender, diagnosis,
                            medication, visit_date, vitals, notes
-                    FROM audit_logs WHERE patient_id = :pid
+                    {_CURRENT}
+                    WHERE patient_ref = (SELECT id FROM patients WHERE patient_id = :pid)
                     ORDER BY timestamp DESC LIMIT 1
                 """),
                 {"pid": req.patient_id},
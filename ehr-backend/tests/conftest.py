@@ -0,0 +1,55 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app reads DATABASE_URL and friends at import time, so the scratch
+# database and keystore are set up before anything from the backend loads
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_TMPDIR = tempfile.mkdtemp(prefix="ehr-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMPDIR, 'test.db')}"
+os.environ["KEYSTORE_PATH"] = os.path.join(_TMPDIR, "keystore.db")
+os.environ["OPENAI_API_KEY"] = ""   # never the real API; tests install stubs
+os.environ.pop("DATABASE_REPLICA_URL", None)
+
+
+def entry(i: int = 0, **overrides) -> dict:
+    """An /add-log body; override any field."""
+    body = {
+        "user_id": "doc-test",
+        "patient_id": f"pat-{i % 3}",
+        "patient_name": f"Patient {i % 3}",
+        "action": "CREATE",
+        "data": f"test record {i}",
+        "age": 40,
+        "gender": "F",
+        "diagnosis": "Flu",
+        "medication": "Tamiflu",
+    }
+    body.update(overrides)
+    return body
+
+
+@pytest.fixture(scope="session")
+def app():
+    import main
+    return main.app
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    from fastapi.testclient import TestClient
+    return TestClient(app)
+
+
+@pytest.fixture
+def db():
+    from models.database import SessionLocal
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
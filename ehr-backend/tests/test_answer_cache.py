@@ -0,0 +1,122 @@
+"""/api/audit/chat answer caching, against a stub in place of the OpenAI client."""
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import entry
+from routers import audit
+from utils import answer_cache
+
+DOCTOR = "doc-cache"
+QUESTION = "Summarize recent visits"
+
+
+class StubOpenAI:
+    """Just enough of OpenAI().chat.completions.create for _llm_answer."""
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("stubbed upstream failure")
+        content = f"stub answer {self.calls}"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    stub = StubOpenAI()
+    monkeypatch.setattr(audit, "client", stub)
+    answer_cache.clear()
+    yield stub
+    answer_cache.clear()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def records(client):
+    logs = [entry(i, user_id=DOCTOR) for i in range(4)]
+    assert client.post("/api/audit/add-logs", json=logs).status_code == 200
+
+
+def _ask(client, question=QUESTION, **scope):
+    body = {"user_id": DOCTOR, "role": "doctor", "question": question, **scope}
+    resp = client.post("/api/audit/chat", json=body)
+    assert resp.status_code == 200
+    return resp.json()["answer"]
+
+
+def _newest_id(client):
+    logs = client.get("/api/audit/logs", params={"role": "doctor", "user_id": DOCTOR, "limit": 1}).json()["logs"]
+    return logs[0]["id"]
+
+
+def test_repeated_and_renormalized_questions_hit(client, llm):
+    first = _ask(client)
+    assert _ask(client) == first
+    assert _ask(client, "  summarize   RECENT visits?! ") == first
+    assert llm.calls == 1
+
+
+@pytest.mark.parametrize("write", ["add", "modify", "delete"])
+def test_write_in_scope_changes_fingerprint(client, llm, write):
+    before = _ask(client)
+    if write == "add":
+        resp = client.post("/api/audit/add-log", json=entry(99, user_id=DOCTOR))
+    elif write == "modify":
+        resp = client.put(f"/api/audit/modify-log/{_newest_id(client)}", json={"diagnosis": "Gout"})
+    else:
+        resp = client.delete(f"/api/audit/delete-log/{_newest_id(client)}")
+    assert resp.status_code == 200
+
+    after = _ask(client)
+    assert llm.calls == 2
+    assert after != before
+
+
+def test_scope_change_misses(client, llm):
+    _ask(client)
+    _ask(client, limit=2)
+    _ask(client, patient_id="pat-1")
+    assert llm.calls == 3
+
+
+def test_entries_expire_after_ttl(client, llm, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    _ask(client)
+    now[0] += answer_cache.TTL_SECONDS - 1
+    _ask(client)
+    assert llm.calls == 1
+    now[0] += 2
+    _ask(client)
+    assert llm.calls == 2
+    assert answer_cache.stats()["expired"] >= 1
+
+
+def test_least_recently_used_is_evicted(client, llm, monkeypatch):
+    monkeypatch.setattr(answer_cache, "MAX_ENTRIES", 2)
+    _ask(client, "first question")
+    _ask(client, "second question")
+    _ask(client, "first question")    # hit; second is now the oldest
+    _ask(client, "third question")    # evicts second
+    assert llm.calls == 3
+    _ask(client, "first question")
+    assert llm.calls == 3
+    _ask(client, "second question")
+    assert llm.calls == 4
+
+
+def test_failed_call_is_not_cached(client, llm):
+    llm.fail = True
+    fallback = _ask(client)
+    assert not fallback.startswith("stub answer")
+    assert answer_cache.stats()["size"] == 0
+
+    llm.fail = False
+    assert _ask(client) == "stub answer 2"
+    assert _ask(client) == "stub answer 2"
+    assert llm.calls == 2
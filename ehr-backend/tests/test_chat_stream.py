@@ -0,0 +1,169 @@
+"""/api/audit/chat/stream deadlines and fallbacks."""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from routers import audit
+from utils import answer_cache, llm_gate, metrics
+
+STATS = {"total_logs": 0, "top_diagnoses": [], "top_medications": [], "last_visit": None}
+
+
+def _events(raw):
+    """(event, data) pairs from SSE text or a list of SSE frames."""
+    text = raw if isinstance(raw, str) else "".join(raw)
+    out = []
+    for frame in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+def _stage_seconds(stage):
+    """Sum of a stage histogram as scraped from /metrics."""
+    prefix = f'{metrics.PREFIX}_stage_duration_seconds_sum{{stage="{stage}"}} '
+    lines = [line for line in metrics.render().splitlines() if line.startswith(prefix)]
+    return float(lines[0][len(prefix):]) if lines else 0.0
+
+
+class _StubStream:
+    def __init__(self, words, delay):
+        self.words, self.delay = words, delay
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for word in self.words:
+            await asyncio.sleep(self.delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))])
+
+
+def _stub_aclient(words, delay=0.0):
+    async def create(**kwargs):
+        return _StubStream(words, delay)
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+def test_deadline_while_the_client_is_slow_still_sends_done(monkeypatch):
+    monkeypatch.setattr(audit, "aclient", _stub_aclient(["one", " two", " three"]))
+    monkeypatch.setattr(llm_gate, "DEADLINE_SECONDS", 0.2)
+    answer_cache.clear()
+
+    async def slow_client():
+        frames = []
+        gen = audit._chat_events("q", "", STATS, [], ("slow-client",), "keyword answer")
+        async for frame in gen:
+            frames.append(frame)
+            if frame.startswith("event: token"):
+                # The response is stuck in send() past the whole deadline
+                await asyncio.sleep(0.4)
+        return frames
+
+    events = _events(asyncio.run(slow_client()))
+    assert events[-1] == ("done", {"answer": "keyword answer", "source": "keyword", "reason": "deadline"})
+
+
+# ─── Against benchmarks/fake_openai.py ───────────────────────────────────────
+
+@pytest.fixture(scope="module")
+def fake_openai():
+    """The fake OpenAI-compatible server on a free local port; yields its base URL."""
+    import threading
+    import time
+    import uvicorn
+    from benchmarks.fake_openai import app as fake_app
+
+    server = uvicorn.Server(uvicorn.Config(fake_app, host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    for _ in range(200):
+        if server.started:
+            break
+        time.sleep(0.025)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}/v1"
+    server.should_exit = True
+    thread.join(5)
+
+
+@pytest.fixture
+def stream_chat(app, fake_openai, monkeypatch):
+    """Run concurrent /chat/stream requests against the fake; returns [(events, seconds)]."""
+    import time
+    import httpx
+    from openai import AsyncOpenAI
+
+    monkeypatch.setenv("FAKE_OPENAI_TTFT", "0.01")
+    monkeypatch.setenv("FAKE_OPENAI_TOKEN_DELAY", "0.001")
+    monkeypatch.delenv("FAKE_OPENAI_FAIL", raising=False)
+    answer_cache.clear()
+
+    def run(*questions):
+        async def one(http, question):
+            started = time.perf_counter()
+            body = {"user_id": "doc-stream", "role": "doctor", "question": question}
+            resp = await http.post("/api/audit/chat/stream", json=body)
+            assert resp.status_code == 200
+            return _events(resp.text), time.perf_counter() - started
+
+        async def main():
+            # Loop-bound objects are created inside the loop that uses them
+            monkeypatch.setattr(audit, "aclient", AsyncOpenAI(api_key="fake", base_url=fake_openai, max_retries=0))
+            monkeypatch.setattr(llm_gate, "_semaphore", asyncio.Semaphore(llm_gate.MAX_CONCURRENCY))
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                return await asyncio.gather(*(one(http, q) for q in questions))
+
+        return asyncio.run(main())
+
+    return run
+
+
+def test_tokens_stream_from_the_model(stream_chat):
+    from benchmarks.fake_openai import ANSWER
+
+    [(events, _)] = stream_chat("what changed recently")
+    names = [name for name, _ in events]
+    assert names[0] == "meta" and names[-1] == "done"
+    tokens = [data["text"] for name, data in events if name == "token"]
+    assert len(tokens) > 1
+    assert "".join(tokens) == ANSWER
+    assert events[-1][1] == {"answer": ANSWER, "source": "llm"}
+
+
+def test_slow_first_token_falls_back_at_the_deadline(stream_chat, monkeypatch):
+    monkeypatch.setenv("FAKE_OPENAI_TTFT", "2")
+    monkeypatch.setattr(llm_gate, "DEADLINE_SECONDS", 0.3)
+    [(events, seconds)] = stream_chat("anything slow")
+    assert not [e for e in events if e[0] == "token"]
+    assert events[-1][1]["source"] == "keyword"
+    assert events[-1][1]["reason"] == "deadline"
+    assert seconds < 1.5
+
+
+def test_upstream_error_falls_back(stream_chat, monkeypatch):
+    monkeypatch.setenv("FAKE_OPENAI_FAIL", "1")
+    [(events, _)] = stream_chat("will it fail")
+    assert events[-1][1]["source"] == "keyword"
+    assert events[-1][1]["reason"] == "error"
+
+
+def test_requests_queue_behind_the_concurrency_cap(stream_chat, monkeypatch):
+    monkeypatch.setenv("FAKE_OPENAI_TTFT", "0.3")
+    monkeypatch.setattr(llm_gate, "MAX_CONCURRENCY", 1)
+    waited_before = _stage_seconds("chat.llm_queue_wait")
+
+    results = stream_chat("first in line", "second in line")
+    assert all(events[-1][1]["source"] == "llm" for events, _ in results)
+    # The second call only starts once the first has released the slot
+    assert max(seconds for _, seconds in results) >= 0.6
+    assert _stage_seconds("chat.llm_queue_wait") - waited_before >= 0.25
@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+from Crypto.PublicKey import RSA
+
+from crypto import data_keys
+
+
+@pytest.fixture(scope="module")
+def public_key(app):   # app: the tables data_keys writes to exist
+    return RSA.generate(1024).publickey()
+
+
+def test_rotation_does_not_block_other_recipients(public_key, monkeypatch):
+    data_keys.rotate()
+    building, release = threading.Event(), threading.Event()
+    new_epoch = data_keys._new_epoch
+
+    def slow_new_epoch(recipient, key):
+        if recipient == "dk-slow":
+            building.set()
+            assert release.wait(10)
+        return new_epoch(recipient, key)
+
+    monkeypatch.setattr(data_keys, "_new_epoch", slow_new_epoch)
+    slow = threading.Thread(target=data_keys.current_data_key, args=("dk-slow", public_key))
+    slow.start()
+    try:
+        assert building.wait(10)
+        done = []
+        other = threading.Thread(target=lambda: done.append(data_keys.current_data_key("dk-other", public_key)))
+        other.start()
+        other.join(5)
+        assert done, "another recipient waited on dk-slow's epoch"
+        data_key_id, key = done[0]
+        assert data_keys.unwrap_data_key(data_key_id, "dk-other") == key
+    finally:
+        release.set()
+        slow.join(10)
+
+
+def test_concurrent_rotation_starts_one_epoch(public_key, monkeypatch):
+    data_keys.rotate("dk-shared")
+    calls = []
+    new_epoch = data_keys._new_epoch
+
+    def counting_new_epoch(recipient, key):
+        calls.append(recipient)
+        return new_epoch(recipient, key)
+
+    monkeypatch.setattr(data_keys, "_new_epoch", counting_new_epoch)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(data_keys.current_data_key("dk-shared", public_key)))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert calls == ["dk-shared"]
+    assert len(set(results)) == 1 and len(results) == 8
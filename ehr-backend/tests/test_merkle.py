@@ -0,0 +1,110 @@
+import datetime
+import hashlib
+import pytest
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from conftest import entry
+from crypto import merkle
+from crypto.validate_chain import chain_order
+from models.tables import AuditLog, Base, MerkleNode
+
+
+@pytest.fixture
+def tree_db(tmp_path):
+    """An empty database of its own, so sizes and roots are exact."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'merkle.db'}")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _add_logs(db, count):
+    start = datetime.datetime(2024, 1, 1)
+    db.add_all(
+        AuditLog(user_id="doc-test", patient_id=f"pat-{i % 3}", action="CREATE",
+                 timestamp=start + datetime.timedelta(seconds=i))
+        for i in range(count)
+    )
+    db.flush()
+    return db.query(AuditLog).order_by(*chain_order()).all()
+
+
+def _reference_root(leaves):
+    """Root recomputed from scratch: perfect subtrees, largest first, bagged right to left."""
+    def subtree(hashes):
+        if len(hashes) == 1:
+            return hashes[0]
+        half = len(hashes) // 2
+        return merkle.node_hash(subtree(hashes[:half]), subtree(hashes[half:]))
+
+    peaks = []
+    while leaves:
+        width = 1 << (len(leaves).bit_length() - 1)
+        peaks.append(subtree(leaves[:width]))
+        leaves = leaves[width:]
+    return merkle.bag_peaks(peaks)
+
+
+def test_empty_root_is_hash_of_nothing(tree_db):
+    assert merkle.EMPTY_ROOT == hashlib.sha256(b"").hexdigest()
+    assert merkle.current_root(tree_db) == {"root": merkle.EMPTY_ROOT, "size": 0}
+
+
+def test_proof_from_api_verifies_against_published_root(client, db):
+    assert client.post("/api/audit/add-logs", json=[entry(0)]).status_code == 200
+    log_id = db.query(func.max(AuditLog.id)).scalar()
+
+    proof = client.get(f"/api/audit/proof/{log_id}").json()
+    root = client.get("/api/audit/root").json()
+    assert proof["record_matches"]
+    assert proof["root"] == root["root"] and proof["size"] == root["size"]
+    assert merkle.verify_proof(proof["leaf_hash"], proof)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 6, 7, 11, 13])
+def test_appends_match_reference_root_and_every_proof_verifies(tree_db, size):
+    logs = _add_logs(tree_db, size)
+    for i, log in enumerate(logs):
+        merkle.append_leaves(tree_db, [log])
+        tree_db.flush()
+        expected = _reference_root([merkle.leaf_hash(l) for l in logs[:i + 1]])
+        assert merkle.current_root(tree_db) == {"root": expected, "size": i + 1}
+
+    for log in logs:
+        proof = merkle.inclusion_proof(tree_db, log.id)
+        assert proof["root"] == expected
+        assert merkle.verify_proof(merkle.leaf_hash(log), proof)
+
+
+def test_ensure_tree_backfills_existing_table_once(tree_db):
+    logs = _add_logs(tree_db, 11)
+    tree_db.commit()
+    expected = _reference_root([merkle.leaf_hash(l) for l in logs])
+
+    merkle.ensure_tree(tree_db)
+    assert merkle.current_root(tree_db) == {"root": expected, "size": 11}
+    nodes = tree_db.query(MerkleNode).count()
+
+    merkle.ensure_tree(tree_db)
+    assert tree_db.query(MerkleNode).count() == nodes
+
+    merkle.rebuild_tree(tree_db)
+    assert merkle.current_root(tree_db)["root"] == expected
+    assert tree_db.query(MerkleNode).count() == nodes
+
+
+def test_tampered_leaf_fails_verification(tree_db):
+    logs = _add_logs(tree_db, 6)
+    merkle.append_leaves(tree_db, logs)
+    tree_db.flush()
+    target = logs[4]
+    proof = merkle.inclusion_proof(tree_db, target.id)
+    assert merkle.verify_proof(merkle.leaf_hash(target), proof)
+
+    target.action = "DELETE"
+    assert not merkle.verify_proof(merkle.leaf_hash(target), proof)
+
+    forged = dict(proof, path=[dict(proof["path"][0], hash="0" * 64)] + proof["path"][1:])
+    assert not merkle.verify_proof(proof["leaf_hash"], forged)
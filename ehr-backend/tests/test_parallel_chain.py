@@ -0,0 +1,44 @@
+import pytest
+from conftest import entry
+from crypto import parallel_chain
+from crypto.validate_chain import chain_order, validate_log_chain
+from models.tables import AuditLog
+
+SEGMENT = 4
+
+
+@pytest.fixture
+def broken_chain(client, db):
+    """
+    At least five segments of SEGMENT records, with record_hash corrupted on
+    the first and last record of a segment and on two neighbours across a
+    boundary. The original hashes are put back afterwards.
+    """
+    have = db.query(AuditLog).count()
+    if have < 5 * SEGMENT:
+        resp = client.post("/api/audit/add-logs", json=[entry(i) for i in range(5 * SEGMENT - have)])
+        assert resp.status_code == 200
+
+    logs = db.query(AuditLog).order_by(*chain_order()).all()
+    positions = [SEGMENT, 2 * SEGMENT - 1, 3 * SEGMENT - 1, 3 * SEGMENT, len(logs) - 1]
+    saved = {logs[p].id: logs[p].record_hash for p in positions}
+    for p in positions:
+        logs[p].record_hash = "0" * 64
+    db.commit()
+    yield sorted(saved)
+
+    for log_id, record_hash in saved.items():
+        db.get(AuditLog, log_id).record_hash = record_hash
+    db.commit()
+
+
+@pytest.mark.parametrize("workers", [1, 2, 3])
+def test_parallel_scan_matches_sequential_validation(db, broken_chain, workers):
+    valid, broken = validate_log_chain(db.query(AuditLog).all())
+    assert not valid
+    assert set(broken_chain) <= set(broken)
+
+    scan = parallel_chain.scan_chain(db, workers=workers, segment_size=SEGMENT)
+    assert scan.broken_ids == broken
+    assert scan.broken_count == len(broken)
+    assert scan.count == db.query(AuditLog).count()
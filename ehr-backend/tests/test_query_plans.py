@@ -0,0 +1,57 @@
+"""The hot audit_logs reads must be served by their indexes, never a table scan."""
+import pytest
+from sqlalchemy import text
+
+from conftest import entry
+from models import tables
+from routers.audit import _project, _scoped_logs_query
+
+
+@pytest.fixture(scope="module", autouse=True)
+def seeded(client):
+    logs = [entry(i, user_id="doc-plan", patient_id="pat-plan", patient_name="Plan Patient") for i in range(5)]
+    assert client.post("/api/audit/add-logs", json=logs).status_code == 200
+
+
+def _plan(db, query):
+    sql = str(query.statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True}))
+    return [row[3] for row in db.execute(text("EXPLAIN QUERY PLAN " + sql))]
+
+
+def _assert_uses(plan, index):
+    assert any(f"audit_logs USING INDEX {index}" in step for step in plan), plan
+    assert not any(step.startswith("SCAN audit_logs") and "USING" not in step for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+@pytest.mark.parametrize("role, user_id, patient_id, patient_name, index", [
+    ("doctor", "doc-plan", None, None, "ix_audit_logs_user_id_timestamp"),
+    ("patient", None, "pat-plan", None, "ix_audit_logs_patient_ref_timestamp"),
+    ("patient", None, None, "plan patient", "ix_audit_logs_patient_ref_timestamp"),
+    ("patient", "pat-plan", None, None, "ix_audit_logs_patient_ref_timestamp"),
+])
+def test_scoped_list_uses_index(db, role, user_id, patient_id, patient_name, index):
+    query = _project(_scoped_logs_query(db, role, user_id, patient_id, patient_name)).limit(100)
+    _assert_uses(_plan(db, query), index)
+
+
+def test_chain_tail_uses_index(db):
+    # HeadState.reload: the newest record in (timestamp, id) order
+    query = (
+        db.query(tables.AuditLog)
+        .order_by(tables.AuditLog.timestamp.desc(), tables.AuditLog.id.desc())
+        .limit(1)
+    )
+    _assert_uses(_plan(db, query), "ix_audit_logs_timestamp_id")
+
+
+def test_upgrade_drops_retired_indexes(db):
+    from models.migrations import RETIRED_INDEXES, upgrade
+
+    engine = db.get_bind()
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_audit_logs_patient_name_lower ON audit_logs (lower(patient_name))"))
+    upgrade(engine)
+    with engine.connect() as conn:
+        names = {r[0] for r in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+    assert not names & set(RETIRED_INDEXES["audit_logs"])
@@ -0,0 +1,29 @@
+from conftest import entry
+from crypto.rechain import create_job
+from models.tables import RechainJob
+
+
+def _failed_job(db):
+    job = create_job(db)
+    job.status, job.error = "failed", "interrupted"
+    db.commit()
+    return job.id
+
+
+def test_resume_continues_the_newest_unfinished_run(client, db):
+    assert client.post("/api/audit/add-logs", json=[entry(i) for i in range(3)]).status_code == 200
+    job_id = _failed_job(db)
+
+    resp = client.post("/api/audit/rechain", params={"resume": True})
+    assert resp.status_code == 200
+    assert resp.json()["job"]["id"] == job_id
+    assert db.get(RechainJob, job_id, populate_existing=True).status == "completed"
+
+
+def test_resume_ignores_a_failed_run_superseded_by_a_later_one(client, db):
+    stale = _failed_job(db)
+    assert client.post("/api/audit/rechain").status_code == 200
+
+    resp = client.post("/api/audit/rechain", params={"resume": True})
+    assert resp.status_code == 404
+    assert db.get(RechainJob, stale, populate_existing=True).status == "failed"
@@ -0,0 +1,66 @@
+from sqlalchemy import func
+from conftest import entry
+from models.tables import AuditLog
+from routers import audit
+
+
+def _create(client, db, **overrides):
+    assert client.post("/api/audit/add-log", json=entry(**overrides)).status_code == 200
+    return db.query(func.max(AuditLog.id)).scalar()
+
+
+def _assert_chain_valid(client):
+    body = client.get("/api/audit/validate", params={"full": True}).json()
+    assert body["status"] == "valid", body
+
+
+def test_modify_and_delete_keep_the_chain_valid(client, db):
+    rid = _create(client, db, patient_id="pat-versions")
+
+    resp = client.put(f"/api/audit/modify-log/{rid}", json={"diagnosis": "Cold"})
+    assert resp.status_code == 200
+    assert resp.json()["record_id"] == rid
+    _assert_chain_valid(client)
+
+    assert client.delete(f"/api/audit/delete-log/{rid}").status_code == 200
+    _assert_chain_valid(client)
+
+    history = client.get(f"/api/audit/history/{rid}").json()
+    assert history["deleted"] and history["current_id"] is None
+    assert [v["action"] for v in history["versions"]] == ["CREATE", "MODIFY", "DELETE"]
+
+
+def test_modify_through_an_old_id_targets_the_current_version(client, db):
+    rid = _create(client, db)
+
+    first = client.put(f"/api/audit/modify-log/{rid}", json={"diagnosis": "Cold"}).json()
+    second = client.put(f"/api/audit/modify-log/{rid}", json={"medication": "Rest"}).json()
+    assert second["record_id"] == rid
+
+    history = client.get(f"/api/audit/history/{first['id']}").json()
+    assert history["current_id"] == second["id"]
+    assert [v["id"] for v in history["versions"]] == [rid, first["id"], second["id"]]
+    # The second edit carried forward the first one's diagnosis
+    latest = db.get(AuditLog, second["id"])
+    assert (latest.diagnosis, latest.medication) == ("Cold", "Rest")
+
+
+def test_modifying_a_deleted_record_is_not_found(client, db):
+    rid = _create(client, db)
+    assert client.delete(f"/api/audit/delete-log/{rid}").status_code == 200
+
+    assert client.put(f"/api/audit/modify-log/{rid}", json={"diagnosis": "Cold"}).status_code == 404
+    assert client.delete(f"/api/audit/delete-log/{rid}").status_code == 404
+
+
+def test_stale_version_is_rejected_under_the_lock(client, db, monkeypatch):
+    rid = _create(client, db)
+    # Another writer moves the record on between the handler's read and the append
+    monkeypatch.setattr(audit, "current_version", lambda session, log_id: session.get(AuditLog, rid))
+    assert client.put(f"/api/audit/modify-log/{rid}", json={"diagnosis": "Cold"}).status_code == 200
+    before = db.query(func.count(AuditLog.id)).scalar()
+
+    resp = client.put(f"/api/audit/modify-log/{rid}", json={"diagnosis": "Flu"})
+    assert resp.status_code == 409
+    assert db.query(func.count(AuditLog.id)).scalar() == before
+    _assert_chain_valid(client)
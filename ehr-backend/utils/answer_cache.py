@@ -0,0 +1,82 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Chat answers are cached per (question, role, scope, record fingerprint).
+# The fingerprint covers the id and timestamp of every row the answer was
+# built from, and those rows are the current entries of live records (read
+# through current_records). Adds, modifies and deletes append a new entry
+# that joins, replaces or leaves that set, so a write in scope changes the
+# key and a stale answer is never looked up again — the TTL only bounds how
+# long unreachable entries linger.
+MAX_ENTRIES = int(os.getenv("CHAT_CACHE_SIZE", "512"))
+TTL_SECONDS = float(os.getenv("CHAT_CACHE_TTL_SECONDS", "300"))
+
+_lock = threading.Lock()
+_cache = OrderedDict()   # key -> (expires_at, answer)
+_stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "stores": 0}
+
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    q = _SPACE.sub(" ", (question or "").strip().lower())
+    return q.rstrip("?!. ")
+
+
+def fingerprint(rows) -> str:
+    """Digest of the (id, timestamp) of every row, in order."""
+    h = hashlib.sha256()
+    for r in rows:
+        h.update(f"{r.id}|{r.timestamp.isoformat() if r.timestamp else ''};".encode())
+    return f"{len(rows)}:{h.hexdigest()}"
+
+
+def make_key(question, role, scope, rows, mode) -> tuple:
+    """mode keeps LLM and keyword-fallback answers apart."""
+    return (normalize_question(question), (role or "").lower(), scope, fingerprint(rows), mode)
+
+
+def get(key):
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                _cache.move_to_end(key)
+                _stats["hits"] += 1
+                return entry[1]
+            del _cache[key]
+            _stats["expired"] += 1
+        _stats["misses"] += 1
+    return None
+
+
+def put(key, answer):
+    with _lock:
+        _cache[key] = (time.monotonic() + TTL_SECONDS, answer)
+        _cache.move_to_end(key)
+        _stats["stores"] += 1
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+
+
+def stats() -> dict:
+    with _lock:
+        total = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "size": len(_cache),
+            "max_size": MAX_ENTRIES,
+            "ttl_seconds": TTL_SECONDS,
+            "hit_ratio": round(_stats["hits"] / total, 4) if total else 0.0,
+        }
@@ -1,9 +1,12 @@
 from passlib.context import CryptContext
 from Crypto.Cipher import AES, PKCS1_OAEP
-from Crypto.PublicKey import RSA
 from Crypto.Random import get_random_bytes
 from Crypto.Hash import SHA256
 from Crypto.Signature import pkcs1_15
+from crypto import key_cache
+from crypto.keystore import KeyNotFound
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
 import base64
 import os
 
@@ -16,23 +19,73 @@ def hash_password(password: str) -> str:
 def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
 
-# --- Load RSA Keys ---
-def load_keys(user_id: str):
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    keys_dir = os.path.join(base_dir, "..", "keys")
+# bcrypt is deliberately slow. Async handlers run it in a dedicated process
+# pool so a login burst uses real cores and can't exhaust the threadpool
+# every other endpoint shares. Requests beyond the pending limit are refused.
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", "64"))
+
+_password_executor = None
+_password_stats = {"in_flight": 0, "completed": 0, "failed": 0, "rejected": 0}
+
+
+class PasswordPoolBusy(RuntimeError):
+    """Raised when too many password hashes are already queued."""
+
+
+def _get_password_executor():
+    global _password_executor
+    if _password_executor is None:
+        _password_executor = ProcessPoolExecutor(max_workers=PASSWORD_WORKERS)
+    return _password_executor
 
-    pub_path = os.path.join(keys_dir, f"{user_id}_public.pem")
-    priv_path = os.path.join(keys_dir, f"{user_id}_private.pem")
 
-    if not os.path.exists(pub_path) or not os.path.exists(priv_path):
-        raise FileNotFoundError(f"Key files for {user_id} not found.")
+async def _run_password_job(fn, *args):
+    # Only touched from the event loop thread, so no lock is needed
+    if _password_stats["in_flight"] >= PASSWORD_MAX_PENDING:
+        _password_stats["rejected"] += 1
+        raise PasswordPoolBusy("Too many password operations in progress")
+    _password_stats["in_flight"] += 1
+    try:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(_get_password_executor(), fn, *args)
+    except Exception:
+        _password_stats["failed"] += 1
+        raise
+    finally:
+        # A cancelled await (client gone) counts as neither
+        _password_stats["in_flight"] -= 1
+    _password_stats["completed"] += 1
+    return result
 
-    with open(pub_path, "rb") as f:
-        public_key = RSA.import_key(f.read())
-    with open(priv_path, "rb") as f:
-        private_key = RSA.import_key(f.read())
 
-    return public_key, private_key
+async def hash_password_async(password: str) -> str:
+    return await _run_password_job(hash_password, password)
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    return await _run_password_job(verify_password, plain, hashed)
+
+def shutdown_password_pool():
+    global _password_executor
+    if _password_executor is not None:
+        _password_executor.shutdown(wait=False, cancel_futures=True)
+        _password_executor = None
+
+def password_pool_stats() -> dict:
+    in_flight = _password_stats["in_flight"]
+    return {
+        **_password_stats,
+        "queue_depth": max(0, in_flight - PASSWORD_WORKERS),
+        "workers": PASSWORD_WORKERS,
+        "max_pending": PASSWORD_MAX_PENDING,
+    }
+
+# --- Load RSA Keys ---
+def load_keys(user_id: str):
+    try:
+        return key_cache.get_public_key(user_id), key_cache.get_private_key(user_id)
+    except KeyNotFound:
+        raise KeyNotFound(f"Keys for {user_id} not found.")
 
 # --- Encryption ---
 def encrypt_data(plaintext: str, user_id: str):
@@ -0,0 +1,45 @@
+import datetime
+import json
+from fastapi.responses import Response
+
+# List endpoints serialize thousands of plain dicts; orjson does that several
+# times faster than FastAPI's jsonable_encoder + json.dumps. The stdlib path
+# is kept so a missing wheel degrades speed, not correctness.
+try:
+    import orjson
+except ImportError:   # pragma: no cover - depends on the platform wheel
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj, default=_default)
+
+    loads = orjson.loads
+else:
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_default).encode()
+
+    loads = json.loads
+
+
+def dumps_line(obj) -> bytes:
+    """One NDJSON line."""
+    return dumps(obj) + b"\n"
+
+
+class FastJSONResponse(Response):
+    """JSONResponse that skips jsonable_encoder; content must be plain JSON types."""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
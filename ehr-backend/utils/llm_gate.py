@@ -0,0 +1,60 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from utils import metrics
+
+# Admission control for streaming LLM calls: a global semaphore caps how many
+# are in flight, and the caller bounds queue wait + stream by a deadline so a
+# slow upstream degrades to the keyword answer instead of piling up.
+MAX_CONCURRENCY = int(os.getenv("CHAT_LLM_MAX_CONCURRENCY", "8"))
+DEADLINE_SECONDS = float(os.getenv("CHAT_LLM_DEADLINE_SECONDS", "20"))
+
+_semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+_lock = threading.Lock()
+_in_flight = 0
+_counters = {
+    "requests": 0,
+    "completed": 0,
+    "cache_hits": 0,
+    "deadline_fallbacks": 0,
+    "error_fallbacks": 0,
+    "keyword_only": 0,     # no OpenAI key configured
+}
+
+
+def count(name: str):
+    with _lock:
+        _counters[name] += 1
+
+
+@asynccontextmanager
+async def slot(timeout: float = None):
+    """
+    Hold one of the MAX_CONCURRENCY LLM slots; the queue wait is recorded
+    as the "chat.llm_queue_wait" stage.
+    Raises TimeoutError if none frees up within `timeout` seconds.
+    """
+    global _in_flight
+    started = time.perf_counter()
+    await asyncio.wait_for(_semaphore.acquire(), timeout)
+    metrics.observe("chat.llm_queue_wait", time.perf_counter() - started)
+    with _lock:
+        _in_flight += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _in_flight -= 1
+        _semaphore.release()
+
+
+def stats() -> dict:
+    with _lock:
+        return {
+            **_counters,
+            "in_flight": _in_flight,
+            "max_concurrency": MAX_CONCURRENCY,
+            "deadline_seconds": DEADLINE_SECONDS,
+        }
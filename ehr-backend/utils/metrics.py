@@ -0,0 +1,278 @@
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+# In-process metrics in the Prometheus text format, served at /metrics.
+# Everything here is a perf_counter() pair plus one short lock per
+# observation, so it stays on in production: route latency from the ASGI
+# middleware, per-stage spans in the crypto / chain / chat paths, and query
+# count and time from SQLAlchemy event hooks. The stats() dicts the other
+# modules already keep are exported as gauges at scrape time.
+PREFIX = "ehr"
+
+# Seconds; covers a cached key lookup up to a slow LLM answer
+DEFAULT_BUCKETS = tuple(
+    float(b) for b in os.getenv(
+        "METRICS_BUCKETS",
+        "0.0005,0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30",
+    ).split(",")
+)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+
+class Histogram:
+    """A labelled Prometheus histogram; observe() is O(log buckets)."""
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}   # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *label_values):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = sorted((k, list(v)) for k, v in self._series.items())
+        for label_values, series in snapshot:
+            base = list(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                yield f"{self.name}_bucket{_labels(base + [('le', _num(bound))])} {cumulative}"
+            yield f"{self.name}_bucket{_labels(base + [('le', '+Inf')])} {series[-1]}"
+            yield f"{self.name}_sum{_labels(base)} {_num(series[-2])}"
+            yield f"{self.name}_count{_labels(base)} {series[-1]}"
+
+
+REQUEST_SECONDS = Histogram(
+    f"{PREFIX}_http_request_duration_seconds",
+    "HTTP request latency by route template, until the last body byte is sent.",
+    ("method", "route", "status"),
+)
+REQUEST_QUERIES = Histogram(
+    f"{PREFIX}_http_request_db_queries",
+    "SQL statements executed while serving one request.",
+    ("method", "route"),
+    COUNT_BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    f"{PREFIX}_stage_duration_seconds",
+    "Time spent in one stage of a request (encrypt, key parse, commit, LLM call, ...).",
+    ("stage",),
+)
+QUERY_SECONDS = Histogram(
+    f"{PREFIX}_db_query_duration_seconds",
+    "SQL statement execution time by statement type.",
+    ("operation",),
+)
+
+_histograms = [REQUEST_SECONDS, REQUEST_QUERIES, STAGE_SECONDS, QUERY_SECONDS]
+_collectors = {}   # component -> zero-arg callable returning a stats() dict
+
+# Per-request query counter; run_in_threadpool copies the context, so sync
+# handlers and their DB calls see the middleware's list
+_request_queries = ContextVar("request_queries", default=None)
+
+
+# ─── Spans ───────────────────────────────────────────────────────────────────
+
+@contextmanager
+def span(stage: str):
+    """Time the enclosed block as `stage` (recorded even if it raises)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage)
+
+
+def timed(stage: str):
+    """Decorator form of span() for whole functions."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage)
+        return wrapper
+    return decorator
+
+
+def observe(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage)
+
+
+# ─── HTTP middleware ─────────────────────────────────────────────────────────
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (no BaseHTTPMiddleware) so streaming responses are
+    passed through untouched and timed until their final chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        queries = [0]
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_queries.reset(token)
+            # The matched route's template keeps label cardinality bounded
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            REQUEST_SECONDS.observe(elapsed, method, path, str(status[0]))
+            REQUEST_QUERIES.observe(queries[0], method, path)
+
+
+# ─── SQLAlchemy hooks ────────────────────────────────────────────────────────
+
+_OPERATION = re.compile(r"\s*(\w+)")
+_OPERATIONS = {"select", "insert", "update", "delete", "with"}
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get("metrics_started")
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+    match = _OPERATION.match(statement)
+    operation = match.group(1).lower() if match else "other"
+    QUERY_SECONDS.observe(elapsed, operation if operation in _OPERATIONS else "other")
+    queries = _request_queries.get()
+    if queries is not None:
+        queries[0] += 1
+
+
+def _error_execute(context):
+    if context.connection is None:
+        return
+    stack = context.connection.info.get("metrics_started")
+    if stack:
+        stack.pop()
+
+
+def _before_commit(session):
+    session.info["metrics_commit_started"] = time.perf_counter()
+
+
+def _after_commit(session):
+    started = session.info.pop("metrics_commit_started", None)
+    if started is not None:
+        STAGE_SECONDS.observe(time.perf_counter() - started, "db.commit")
+
+
+def instrument_engine(engine):
+    """Record query count/time for every statement run through `engine`."""
+    from sqlalchemy import event
+    if event.contains(engine, "before_cursor_execute", _before_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+    event.listen(engine, "handle_error", _error_execute)
+
+
+def instrument_sessions(session_class):
+    """Time commits (including the final flush) of sessions of this class."""
+    from sqlalchemy import event
+    if event.contains(session_class, "before_commit", _before_commit):
+        return
+    event.listen(session_class, "before_commit", _before_commit)
+    event.listen(session_class, "after_commit", _after_commit)
+
+
+# ─── Exported stats() gauges ─────────────────────────────────────────────────
+
+def register_collector(component: str, stats_fn):
+    """Export a module's stats() dict as ehr_<component>_<key> gauges."""
+    _collectors[component] = stats_fn
+
+
+def _flatten(prefix: str, value):
+    if isinstance(value, bool):
+        yield prefix, int(value)
+    elif isinstance(value, (int, float)):
+        yield prefix, value
+    elif isinstance(value, dict):
+        for key, inner in value.items():
+            yield from _flatten(f"{prefix}_{_NAME.sub('_', str(key))}", inner)
+
+
+def _render_collectors():
+    for component, stats_fn in sorted(_collectors.items()):
+        try:
+            values = stats_fn()
+        except Exception as e:
+            print(f"[!] metrics: {component} stats failed: {e}")
+            continue
+        for name, value in _flatten(f"{PREFIX}_{component}", values):
+            yield f"# TYPE {name} gauge"
+            yield f"{name} {_num(value)}"
+
+
+# ─── Exposition ──────────────────────────────────────────────────────────────
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+_NAME = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _num(value) -> str:
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render() -> str:
+    lines = []
+    for histogram in _histograms:
+        lines.extend(histogram.render())
+    lines.extend(_render_collectors())
+    return "\n".join(lines) + "\n"
@@ -1,5 +1,5 @@
 import React, { useState, useRef, useEffect } from "react";
-import api from "../services/api";
+import api, { API_BASE } from "../services/api";
 
 /* ── Role-specific quick suggestions ─────────────────────────────────────── */
 const ROLE_SUGGESTIONS = {
@@ -76,6 +76,36 @@ function fmtDate(ts) {
   catch { return ts; }
 }
 
+/* ── Server-Sent Events over fetch (EventSource can't POST) ─────────────── */
+async function streamChat(body, onEvent) {
+  const res = await fetch(`${API_BASE}/api/audit/chat/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+  });
+  if (!res.ok || !res.body) throw new Error(`Chat stream failed (${res.status})`);
+
+  const reader  = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let end;
+    while ((end = buffer.indexOf("\n\n")) !== -1) {
+      const raw = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      let event = "message", data = "";
+      raw.split("\n").forEach(line => {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      });
+      if (data) onEvent(event, JSON.parse(data));
+    }
+  }
+}
+
 /* ── Role badge ───────────────────────────────────────────────────────────── */
 function RoleBadge({ role }) {
   const colors = { doctor: "#0052CC", auditor: "#006D6D", patient: "#1A6B3C" };
@@ -123,25 +153,62 @@ export default function AuditChatbot() {
     setInput("");
     setMessages(m => [...m, { role: "user", text: q }]);
     setThinking(true);
+    const body = {
+      user_id:    userId,
+      role,
+      question:   q,
+      patient_id: patientId || undefined,
+      limit:      20,
+    };
+    // Tokens are appended to the last message as they arrive
+    const updateLast = patch => setMessages(m => {
+      const copy = [...m];
+      const last = copy[copy.length - 1];
+      copy[copy.length - 1] = { ...last, ...(typeof patch === "function" ? patch(last) : patch) };
+      return copy;
+    });
+    let started = false;
+    let stats = {};
+    // Keep the thinking dots up until the first token
+    const startReply = () => {
+      if (started) return;
+      started = true;
+      setThinking(false);
+      setMessages(m => [...m, { role: "bot", text: "", stats }]);
+    };
     try {
-      const res = await api.post("/api/audit/chat", {
-        user_id:    userId,
-        role,
-        question:   q,
-        patient_id: patientId || undefined,
-        limit:      20,
+      await streamChat(body, (event, data) => {
+        if (event === "meta") {
+          stats = data.stats || {};
+        } else if (event === "token") {
+          startReply();
+          updateLast(last => ({ text: (last.text || "") + data.text }));
+        } else if (event === "done") {
+          startReply();
+          // A deadline fallback replaces any partial text
+          updateLast({ text: data.answer || "I couldn't find an answer to that." });
+        }
       });
-      const data  = res.data;
-      setMessages(m => [...m, {
-        role:   "bot",
-        text:   data.answer || "I couldn't find an answer to that.",
-        stats:  data.stats || {},
-      }]);
     } catch {
-      setMessages(m => [...m, {
-        role: "bot",
-        text: "Sorry, I couldn't reach the AI service right now. Please check your connection and try again.",
-      }]);
+      if (started) {
+        updateLast(last => ({ text: last.text || "The answer was interrupted. Please try again." }));
+      } else {
+        // Streaming unavailable — fall back to the one-shot endpoint
+        try {
+          const res = await api.post("/api/audit/chat", body);
+          const data  = res.data;
+          setMessages(m => [...m, {
+            role:   "bot",
+            text:   data.answer || "I couldn't find an answer to that.",
+            stats:  data.stats || {},
+          }]);
+        } catch {
+          setMessages(m => [...m, {
+            role: "bot",
+            text: "Sorry, I couldn't reach the AI service right now. Please check your connection and try again.",
+          }]);
+        }
+      }
     } finally { setThinking(false); }
   }
 
@@ -6,21 +6,15 @@ import AuditChatbot from "./AuditChatbot";
 
 const ACTION_COLOR = { CREATE: "green", MODIFY: "blue", DELETE: "red" };
 
-function WeekChart({ logs }) {
-  const weeks = useMemo(() => {
-    const now = new Date();
-    const cols = [];
-    for (let w = 7; w >= 0; w--) {
-      const d = new Date(now);
-      d.setDate(d.getDate() - w * 7);
-      const label = ["8w","7w","6w","5w","4w","3w","2w","This"][7 - w];
-      const weekStart = new Date(d); weekStart.setDate(d.getDate() - d.getDay());
-      const weekEnd   = new Date(weekStart); weekEnd.setDate(weekStart.getDate() + 7);
-      const count = logs.filter(l => { const t = new Date(l.timestamp); return t >= weekStart && t < weekEnd; }).length;
-      cols.push({ label, count, isCurrent: w === 0 });
-    }
-    return cols;
-  }, [logs]);
+const WEEK_LABELS = ["8w","7w","6w","5w","4w","3w","2w","This"];
+
+function WeekChart({ weekly }) {
+  // Server sends the last 8 week buckets oldest → newest
+  const weeks = useMemo(() => weekly.map((w, i) => ({
+    label: WEEK_LABELS[i + WEEK_LABELS.length - weekly.length] || w.week_start,
+    count: w.count,
+    isCurrent: i === weekly.length - 1,
+  })), [weekly]);
 
   const max = Math.max(...weeks.map(w => w.count), 1);
   return (
@@ -60,38 +54,28 @@ export default function Dashboard() {
   const userId    = localStorage.getItem("user_id");
   const role      = localStorage.getItem("role");
 
-  const [logs, setLogs]           = useState([]);
+  const [summary, setSummary]     = useState(null);
   const [chainOk, setChainOk]     = useState(null);
   const [loading, setLoading]     = useState(true);
   const [loadError, setLoadError] = useState("");
 
   useEffect(() => {
     if (!userId) { navigate("/"); return; }
-    Promise.all([
-      api.get("/api/audit/logs", { params: { role, user_id: userId } }),
-      api.get("/api/audit/validate"),
-    ]).then(([logsRes, valRes]) => {
-      setLogs(logsRes.data.logs || []);
-      setChainOk(valRes.data.status === "valid");
+    // One small rollup-backed payload instead of every log + a full chain scan
+    api.get("/api/audit/dashboard", { params: { role, user_id: userId } }).then(res => {
+      setSummary(res.data);
+      setChainOk(res.data.chain?.status === "valid");
     }).catch(err => {
       setLoadError(err.response?.data?.detail || "Failed to load dashboard data.");
     }).finally(() => setLoading(false));
   }, [navigate, userId, role]);
 
-  const uniquePatients = useMemo(() => new Set(logs.map(l => l.patient_id)).size, [logs]);
-  const recent         = useMemo(() => [...logs].sort((a,b) => new Date(b.timestamp)-new Date(a.timestamp)).slice(0,5), [logs]);
-
-  const topDiagnoses = useMemo(() => {
-    const counts = {};
-    logs.forEach(l => { if (l.diagnosis) counts[l.diagnosis] = (counts[l.diagnosis]||0)+1; });
-    return Object.entries(counts).sort((a,b)=>b[1]-a[1]).slice(0,5).map(([label,count])=>({label,count}));
-  }, [logs]);
-
-  const topMeds = useMemo(() => {
-    const counts = {};
-    logs.forEach(l => { if (l.medication) counts[l.medication] = (counts[l.medication]||0)+1; });
-    return Object.entries(counts).sort((a,b)=>b[1]-a[1]).slice(0,5).map(([label,count])=>({label,count}));
-  }, [logs]);
+  const totalRecords   = summary?.total_records ?? 0;
+  const uniquePatients = summary?.unique_patients ?? 0;
+  const recent         = summary?.recent || [];
+  const weekly         = summary?.weekly || [];
+  const topDiagnoses   = summary?.top_diagnoses || [];
+  const topMeds        = summary?.top_medications || [];
 
   const ACTION_CARDS = [
     { key:"logs",     label:"Audit Logs",     sub:"Browse and search all encrypted records", icon:"bi-journal-text",      iconBg:"var(--blue-light)",  iconColor:"var(--blue)",  path:"/logs" },
@@ -137,7 +121,7 @@ export default function Dashboard() {
           <div className="ehr-grid-3" style={{ marginBottom:24 }}>
             <div className="ehr-stat-tile">
               <div className="ehr-stat-label">Total Records</div>
-              <div className="ehr-stat-value">{loading ? "—" : logs.length}</div>
+              <div className="ehr-stat-value">{loading ? "—" : totalRecords}</div>
               <div className="ehr-stat-sub">All encrypted audit entries</div>
               <div className="ehr-stat-icon" style={{ background:"var(--blue-light)", color:"var(--blue)" }}>
                 <i className="bi bi-journal-medical" />
@@ -184,7 +168,7 @@ export default function Dashboard() {
                 <span className="ehr-card-title">Visit Volume (8 weeks)</span>
               </div>
               <div className="ehr-card-body">
-                {loading ? <div style={{ color:"var(--text-muted)", fontSize:14 }}>Loading…</div> : <WeekChart logs={logs} />}
+                {loading ? <div style={{ color:"var(--text-muted)", fontSize:14 }}>Loading…</div> : <WeekChart weekly={weekly} />}
               </div>
             </div>
 
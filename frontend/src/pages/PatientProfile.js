@@ -12,18 +12,31 @@ export default function PatientProfile() {
   const userId     = localStorage.getItem("user_id");
   const role       = localStorage.getItem("role");
 
+  const [patient, setPatient] = useState(null);
   const [logs, setLogs]       = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError]     = useState("");
 
   useEffect(() => {
     if (!userId) { navigate("/"); return; }
-    api.get("/api/audit/logs", { params: { role, user_id: userId, patient_id: patientId } })
+    setLoading(true);
+    // Resolve the id once, then read the records by the patient's key
+    api.get(`/api/audit/patients/${encodeURIComponent(patientId)}`)
+      .then(r => {
+        setPatient(r.data);
+        return api.get("/api/audit/logs", { params: { role, user_id: userId, patient_ref: r.data.id } });
+      })
       .then(r => setLogs(r.data.logs || []))
-      .catch(() => setError("Failed to load patient records."))
+      .catch(err => {
+        setLogs([]);
+        if (err.response?.status !== 404) setError("Failed to load patient records.");
+      })
       .finally(() => setLoading(false));
   }, [userId, role, patientId, navigate]);
 
+  const displayName = patient?.name || patientId;
+  const otherNames = (patient?.aliases || []).filter(a => a !== (patient?.name || "").trim().toLowerCase());
+
   const sorted = useMemo(() =>
     [...logs].sort((a,b) => new Date(b.timestamp) - new Date(a.timestamp)), [logs]);
 
@@ -80,17 +93,22 @@ export default function PatientProfile() {
               <div style={{ display:"flex", alignItems:"flex-start", justifyContent:"space-between", marginBottom:28 }}>
                 <div style={{ display:"flex", gap:18, alignItems:"center" }}>
                   <div style={{ width:64, height:64, borderRadius:"50%", background:"var(--blue)", color:"#fff", display:"flex", alignItems:"center", justifyContent:"center", fontSize:24, fontWeight:700, flexShrink:0 }}>
-                    {(summary.latest.patient_name || patientId).slice(0,2).toUpperCase()}
+                    {displayName.slice(0,2).toUpperCase()}
                   </div>
                   <div>
                     <div style={{ fontSize:22, fontWeight:700, color:"var(--text-primary)", letterSpacing:"-0.02em" }}>
-                      {summary.latest.patient_name || patientId}
+                      {displayName}
                     </div>
                     <div style={{ fontSize:14, color:"var(--text-muted)", marginTop:2 }}>
                       ID: <span style={{ fontFamily:"var(--font-mono)" }}>{patientId}</span>
                       {summary.latest.age && <> · Age {summary.latest.age}</>}
                       {summary.latest.gender && <> · {summary.latest.gender}</>}
                     </div>
+                    {otherNames.length > 0 && (
+                      <div style={{ fontSize:13, color:"var(--text-muted)", marginTop:2 }}>
+                        Also recorded as: {otherNames.join(", ")}
+                      </div>
+                    )}
                   </div>
                 </div>
                 {role === "doctor" && (
@@ -30,7 +30,9 @@ export default function ValidateChain() {
   async function handleRebuild() {
     setRebuilding(true); setRebuildMsg(""); setError("");
     try {
-      const res = await api.post("/api/audit/rechain");
+      // Repair from the first broken record rather than re-hashing from genesis
+      const params = broken.length ? { from_id: broken[0] } : {};
+      const res = await api.post("/api/audit/rechain", null, { params });
       setRebuildMsg(res.data.message || "Chain rebuilt successfully.");
       // Re-validate so the banner updates
       runValidation();